@@ -0,0 +1,73 @@
+"""
+History search benchmark: FTS5 trigram index vs LIKE scan.
+
+Seeds a history database with synthetic commands (once; the file is reused
+on later runs) and reports the latency of HistoryManager.search for common,
+rare and missing substrings, with and without the FTS index.
+
+Usage: python benchmarks/bench_history_search.py [--rows 1000000] [--db /tmp/bench_history.db] [--runs 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.history import HistoryManager
+
+WORDS = [
+    "git status", "git commit -m", "ls -la", "cd src", "docker compose up", "kubectl get pods",
+    "python -m pytest", "grep -rn TODO", "make build", "npm run dev", "tail -f /var/log/syslog",
+    "ssh deploy@host", "vim main.py", "cat README.md", "curl -s http://localhost:8080/health",
+]
+QUERIES = ["git", "pytest -q", "zz-rare-token", "no-such-command"]
+
+
+def seed(manager: HistoryManager, rows: int) -> None:
+    existing = manager.get_recent(limit=1)
+    have = existing[0][0] if existing else 0
+    if have >= rows:
+        return
+    rng = random.Random(0)
+    print(f"seeding {rows - have} rows...")
+    for i in range(have, rows):
+        command = f"{rng.choice(WORDS)} {rng.randrange(100000)}"
+        if i == rows // 2:
+            command = "echo zz-rare-token"
+        manager.add_entry(command, rng.choice((0, 0, 0, 1)), "")
+    manager.flush()
+
+
+def bench(manager: HistoryManager, query: str, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        manager.search(query)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/bench_history.db")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    manager = HistoryManager(db_path=args.db)
+    seed(manager, args.rows)
+
+    for query in QUERIES:
+        manager.fts_enabled = True
+        fts = bench(manager, query, args.runs)
+        manager.fts_enabled = False
+        like = bench(manager, query, args.runs)
+        print(f"{query!r:<20} fts {fts * 1000:9.2f} ms   like {like * 1000:9.2f} ms")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Keyword matching benchmark for LogAnalyzer.
+
+Generates a log file (once; it is reused on later runs) with a single error
+line in the middle, then times finding the last error line:
+
+  legacy   per line: line.lower(), then every keyword lowercased again
+  matcher  forward block scan with the compiled KeywordMatcher
+  reverse  backward block scan from EOF (what /analyze uses without a query)
+
+Usage: python benchmarks/bench_keywords.py [--size-mb 1024] [--path /tmp/bench_keywords.log] [--skip-legacy]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.log_analyzer import LogAnalyzer
+
+LINE = b"2026-01-01 12:00:00.123 INFO  [worker-3] request handled in 12ms path=/api/v1/items user=42\n"
+ERROR = b"2026-01-01 12:00:01.456 ERROR [worker-7] database connection lost\n"
+
+
+def generate(path: str, size: int) -> None:
+    if os.path.exists(path) and os.path.getsize(path) >= size:
+        return
+    print(f"generating {size // (1024 * 1024)} MB log at {path}...")
+    block = LINE * (1024 * 1024 // len(LINE))
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            if written < size // 2 <= written + len(block):
+                f.write(ERROR)
+            f.write(block)
+            written += len(block)
+
+
+def legacy(path: str) -> bytes:
+    last = b""
+    with open(path, "rb") as f:
+        for line in f:
+            lowered = line.lower()
+            if any(keyword.lower().encode() in lowered for keyword in LogAnalyzer.ERROR_KEYWORDS):
+                last = line
+    return last
+
+
+def timed(name: str, size: int, func) -> None:
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    found = "ERROR [worker-7]" in (result.decode() if isinstance(result, bytes) else result)
+    print(f"{name:<8} {elapsed:8.2f} s  {size / elapsed / 1e6:8.1f} MB/s  found={found}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--path", default="/tmp/bench_keywords.log")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    generate(args.path, args.size_mb * 1024 * 1024)
+    size = os.path.getsize(args.path)
+    analyzer = LogAnalyzer()
+
+    if not args.skip_legacy:
+        timed("legacy", size, lambda: legacy(args.path))
+
+    def forward():
+        with open(args.path, "rb") as f:
+            return analyzer._extract_relevant_chunk(analyzer._iter_blocks(f), None)[0]
+
+    def reverse():
+        with open(args.path, "rb") as f:
+            return analyzer._extract_last_error(f)[0]
+
+    timed("matcher", size, forward)
+    timed("reverse", size, reverse)
+
+
+if __name__ == "__main__":
+    main()
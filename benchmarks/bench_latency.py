@@ -0,0 +1,56 @@
+"""
+Output latency benchmark: pipe vs PTY execution backend.
+
+Runs a child that prints a timestamped line and keeps working for a while
+(like a test runner printing progress). Reports the time between the child's
+write and the first byte reaching the output callback.
+
+With pipes, the child's stdout is block-buffered, so the line only shows up
+when the buffer fills or the child exits. On a PTY it is line-buffered.
+
+Usage: python benchmarks/bench_latency.py [--runs 5] [--work 1.0]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.commander import execute_command
+
+CHILD = "import time; print(repr(time.time())); time.sleep({work})"
+
+
+async def first_byte_latency(use_pty: bool, work: float) -> float:
+    latency = None
+
+    async def callback(text: str) -> None:
+        nonlocal latency
+        if latency is None:
+            received = time.time()
+            written = float(text.split()[0])
+            latency = received - written
+
+    # PYTHONUNBUFFERED would hide the stdio buffering this benchmark is about
+    command = f"env -u PYTHONUNBUFFERED {sys.executable} -c '{CHILD.format(work=work)}'"
+    await execute_command(command, callback, use_pty=use_pty)
+    return latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--work", type=float, default=1.0, help="seconds the child keeps running after its write")
+    args = parser.parse_args()
+
+    for name, use_pty in (("pipe", False), ("pty", True)):
+        samples = [asyncio.run(first_byte_latency(use_pty, args.work)) for _ in range(args.runs)]
+        print(f"{name:<5} write -> first byte: median {statistics.median(samples) * 1000:9.2f} ms  "
+              f"max {max(samples) * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Parallel log scanning benchmark.
+
+Times a full scan of a large log (a query that never matches, so every byte
+is searched) serially and with the process pool at increasing worker
+counts. Speedup should be close to linear up to the number of cores.
+
+Reuses the file generated by bench_keywords.py.
+
+Usage: python benchmarks/bench_parallel.py [--size-mb 1024] [--path /tmp/bench_keywords.log] [--workers 2,4,8]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_keywords import generate
+from utils.log_analyzer import LogAnalyzer
+
+QUERY = "no-such-token"
+
+
+def timed(analyzer: LogAnalyzer, path: str) -> float:
+    start = time.perf_counter()
+    analyzer.analyze_file(path, QUERY)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--path", default="/tmp/bench_keywords.log")
+    parser.add_argument("--workers", default=",".join(str(n) for n in (2, 4, 8, 16) if n <= max(cores, 2)))
+    args = parser.parse_args()
+
+    generate(args.path, args.size_mb * 1024 * 1024)
+    size = os.path.getsize(args.path)
+    print(f"{size / 1e6:.0f} MB, {cores} cores")
+
+    serial = timed(LogAnalyzer(parallel_threshold=None), args.path)
+    print(f"serial      {serial:8.2f} s  {size / serial / 1e6:8.1f} MB/s")
+    for workers in (int(n) for n in args.workers.split(",")):
+        analyzer = LogAnalyzer(parallel_threshold=0, workers=workers)
+        elapsed = timed(analyzer, args.path)
+        print(f"workers={workers:<3} {elapsed:8.2f} s  {size / elapsed / 1e6:8.1f} MB/s  speedup {serial / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Output rendering throughput benchmark.
+
+Streams N lines through the command output path of a headless Textual app and
+reports rendered lines/sec for:
+
+  legacy    - Static.update of the whole accumulated text + scroll_end per line
+  scheduled - RenderScheduler coalescing into the virtualized OutputLog per frame
+
+Usage: python benchmarks/bench_render.py [--lines 20000] [--fps 60] [--mode legacy|scheduled]
+
+The legacy path is quadratic in output size; keep --lines small when running it.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textual.app import App, ComposeResult
+from textual.containers import VerticalScroll
+from textual.widgets import Static
+
+from tui.render import RenderScheduler
+from tui.widgets import OutputLog
+
+
+class BenchApp(App):
+    def __init__(self, mode: str, lines: int, fps: int):
+        super().__init__()
+        self.mode = mode
+        self.lines = lines
+        self.fps = fps
+
+    def compose(self) -> ComposeResult:
+        if self.mode == "legacy":
+            yield VerticalScroll(id="output-container")
+        else:
+            yield OutputLog(id="output-container")
+
+    async def stream(self) -> None:
+        if self.mode == "legacy":
+            container = self.query_one("#output-container", VerticalScroll)
+            widget = Static("")
+            widget.user_text = ""
+            await container.mount(widget)
+
+            def on_text(text: str) -> None:
+                widget.user_text += text
+                widget.update(widget.user_text)
+                container.scroll_end(animate=False)
+            flush = lambda: None
+        else:
+            output_log = self.query_one("#output-container", OutputLog)
+            scheduler = RenderScheduler(self, output_log.write, fps=self.fps)
+            on_text = scheduler.write
+            flush = scheduler.flush
+
+        for i in range(self.lines):
+            on_text(f"line {i:06d} building target module_{i % 97}.o ... ok\n")
+            # Let the event loop run (and repaint) regularly, like a real subprocess reader would
+            if i % 50 == 0:
+                await asyncio.sleep(0)
+        flush()
+
+
+async def run(mode: str, lines: int, fps: int) -> float:
+    app = BenchApp(mode, lines, fps)
+    async with app.run_test(size=(120, 40)) as pilot:
+        start = time.perf_counter()
+        await app.stream()
+        await pilot.pause()
+        elapsed = time.perf_counter() - start
+    return lines / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--mode", choices=("legacy", "scheduled"), action="append")
+    args = parser.parse_args()
+
+    for mode in args.mode or ("legacy", "scheduled"):
+        rate = asyncio.run(run(mode, args.lines, args.fps))
+        print(f"{mode:<10} {args.lines} lines  {rate:12,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
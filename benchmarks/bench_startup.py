@@ -0,0 +1,69 @@
+"""
+Startup benchmark: time to import main, from python -X importtime.
+
+Imports main in fresh interpreters (from an empty directory, so no
+config.yaml is read) and reports the median total import time and the
+modules that take longest. Exits with status 1 if the median exceeds
+--budget milliseconds.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 10] [--budget 500]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str = "main") -> Dict[str, float]:
+    """Cumulative import time in seconds of module and every module it imports, in a fresh interpreter."""
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); import {module}"
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        )
+    times = {}
+    # Lines look like "import time:   self [us] |  cumulative | imported package", indented by
+    # nesting depth, with each module listed after the ones it imports
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        times[name] = max(times.get(name, 0.0), int(fields[1]) / 1e6)
+        # A finished top-level import other than module was done by the interpreter (site, encodings)
+        if fields[2] == f" {name}" and name != module:
+            times.clear()
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to list")
+    parser.add_argument("--budget", type=float, default=None, help="maximum median import time of main in ms")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    total = statistics.median(run["main"] for run in runs)
+    print(f"import main: median {total * 1000:8.1f} ms over {args.runs} run(s)")
+    last = runs[-1]
+    # Top-level packages only, their submodules are included in them
+    top_level = {name: t for name, t in last.items() if "." not in name and name != "main"}
+    for name, t in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {name:<30} {t * 1000:8.1f} ms")
+
+    if args.budget is not None and total * 1000 > args.budget:
+        print(f"over budget of {args.budget:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
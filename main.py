@@ -1,19 +1,30 @@
 from textual.app import App, ComposeResult
 from textual.widgets import Header, Footer, Static
-from tui.widgets import HistoryInput
-from textual.containers import VerticalScroll
+from tui.widgets import HistoryInput, OutputLog
+from tui.render import RenderScheduler
+from textual.containers import Horizontal, Vertical
 from textual import work
+from textual.worker import get_current_worker
 from textual.binding import Binding
+from rich.markup import escape
 from utils.commander import execute_command
-from utils.ai import get_provider
-from utils.history import HistoryManager
-from utils.history import HistoryManager
+from utils.capture import MAX_SPILL_BYTES, OutputCapture
+from utils.ai import AIProvider, get_provider
+from utils.ai_cache import CachedProvider, ResponseCache
+from utils.history import HistoryManager, HistoryCache
 from utils.config import ConfigManager
 from utils.logger import setup_logging, get_logger
 from utils.context import ContextManager
-from utils.log_analyzer import LogAnalyzer
-import pyperclip
+from utils.log_analyzer import LogAnalyzer, expand_log_paths
+from utils.log_index import LogIndex
+from utils.log_follower import LogFollower
+import asyncio
+import atexit
 import os
+import shutil
+import tempfile
+from concurrent.futures import Future
+from typing import AsyncIterator, Iterable, Optional
 
 logger = get_logger("main")
 
@@ -25,11 +36,20 @@ class TerminalApp(App):
     BINDINGS = [
         Binding("ctrl+f", "fix_last_error", "Fix Error"),
         Binding("ctrl+e", "explain_last_command", "Explain Command"),
+        Binding("escape", "cancel_ai", "Cancel AI", show=False),
     ]
 
     def compose(self) -> ComposeResult:
+        # Config is needed to size the scrollback before on_mount runs
+        self.config_manager = ConfigManager()
         yield Header()
-        yield VerticalScroll(id="output-container")
+        yield OutputLog(
+            max_lines=self.config_manager.get("scrollback_lines", 10000),
+            max_bytes=self.config_manager.get("scrollback_bytes", 8 * 1024 * 1024),
+            overscan=self.config_manager.get("scrollback_overscan", 50),
+            id="output-container",
+        )
+        yield Vertical(id="handoff-panel", classes="handoff-container")
         yield HistoryInput(placeholder="Type your command here... (Start with ? for AI)", id="command-input")
         yield Footer()
 
@@ -40,38 +60,153 @@ class TerminalApp(App):
         self.title = "AI Terminal (Phase 2)"
         
         # Initialize managers
-        self.config_manager = ConfigManager()
         self.history_manager = HistoryManager(
-            db_path=self.config_manager.get("history_file")
+            db_path=self.config_manager.get("history_file"),
+            max_entries=self.config_manager.get("history_max_entries"),
+            max_output_bytes=self.config_manager.get("history_max_output_bytes")
         )
+        self.history_cache = HistoryCache(self.history_manager)
         self.context_manager = ContextManager()
-        self.log_analyzer = LogAnalyzer()
-        
-        # Initialize AI Provider
-        self.ai_provider = get_provider(self.config_manager.get("ai_provider", "gemini"))
+        # The latest ? query's worker; it owns the disabled input until it finishes
+        self._ai_query = None
+        parallel_threshold = self.config_manager.get("log_parallel_threshold")
+        parallel_workers = self.config_manager.get("log_parallel_workers")
+        # Output that outgrows the in-memory buffer is spilled here so /analyze sees all of it
+        self.spill_dir = tempfile.mkdtemp(prefix="imartty-")
+        atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+
+        index_dir = self.config_manager.get("log_index_dir")
+        # Spill files are deleted after the next command, so they aren't indexed
+        log_index = LogIndex(os.path.expanduser(index_dir), exclude_dirs=[self.spill_dir]) if index_dir else None
+
+        # The AI provider (and its SDK) is built in the background after the first paint
+        self._ai_provider: Future = Future()
+        self.ai_cache = None
+        prompt_budget = self._prompt_budget(self.config_manager.get("ai_provider", "gemini"))
+
+        try:
+            self.log_analyzer = LogAnalyzer(
+                keywords=self.config_manager.get("log_keywords"),
+                parallel_threshold=parallel_threshold,
+                workers=parallel_workers,
+                index=log_index,
+                prompt_budget=prompt_budget,
+            )
+        except ValueError as e:
+            logger.error(f"Invalid log_keywords in config, using defaults: {e}")
+            self.log_analyzer = LogAnalyzer(
+                parallel_threshold=parallel_threshold, workers=parallel_workers, index=log_index, prompt_budget=prompt_budget
+            )
         
         self.last_command = ""
         self.last_error = ""
         self.last_command_output = ""
         self.last_exit_code = 0
+        self.last_capture = None
+        self.log_follower = None
+
+        # Coalesce streamed output into at most one scrollback write per frame
+        self.output_log = self.query_one("#output-container", OutputLog)
+        self.output_scheduler = RenderScheduler(
+            self, self.output_log.write, fps=self.config_manager.get("render_fps", 60)
+        )
         
         # Load initial history
         self.update_history_widget()
+        self.query_one(HistoryInput).search_provider = self.search_history
         
         self.query_one(HistoryInput).focus()
+        self.call_after_refresh(self.build_ai_provider)
+
+    @work(thread=True, group="ai-init")
+    def build_ai_provider(self) -> None:
+        """
+        Imports the provider's SDK and builds it (wrapped in the response
+        cache), then loads the model if ai_warm_up is set.
+        """
+        try:
+            provider_name = self.config_manager.get("ai_provider", "gemini")
+            provider = get_provider(provider_name, self._provider_options(provider_name))
+            if self.config_manager.get("ai_cache_enabled", True):
+                cache_file = self.config_manager.get("ai_cache_file")
+                self.ai_cache = ResponseCache(
+                    db_path=os.path.expanduser(cache_file) if cache_file else None,
+                    max_memory_entries=self.config_manager.get("ai_cache_memory_entries", 256),
+                    max_bytes=self.config_manager.get("ai_cache_max_bytes", 16 * 1024 * 1024),
+                    ttls=self.config_manager.get("ai_cache_ttl"),
+                )
+                provider = CachedProvider(provider, self.ai_cache, provider_name.lower())
+        except Exception as e:
+            logger.error(f"Could not set up the AI provider: {e}")
+            # Fail requests waiting for it instead of leaving them blocked;
+            # the rest of the terminal keeps working without AI
+            self._ai_provider.set_exception(e)
+            self.call_from_thread(self.notify_ai_unavailable, e)
+            return
+        self._ai_provider.set_result(provider)
+        if self.config_manager.get("ai_warm_up", True):
+            provider.warm_up()
+
+    def wait_for_ai_provider(self) -> Optional[AIProvider]:
+        """
+        The AI provider, once built, or None (after telling the user) if it
+        could not be set up. Blocks until then, so only use it from worker threads.
+        """
+        try:
+            return self._ai_provider.result()
+        except Exception as e:
+            self.call_from_thread(self.notify_ai_unavailable, e)
+            return None
+
+    async def get_ai_provider(self) -> Optional[AIProvider]:
+        """wait_for_ai_provider for async workers."""
+        try:
+            return await asyncio.wrap_future(self._ai_provider)
+        except Exception as e:
+            self.notify_ai_unavailable(e)
+            return None
+
+    def notify_ai_unavailable(self, error: Exception) -> None:
+        """Tells the user the AI provider could not be set up."""
+        self.notify(f"AI is unavailable: {error}", title="AI provider", severity="error")
+
+    def _provider_options(self, provider_name: str) -> dict:
+        """Constructor arguments of the configured provider."""
+        if provider_name.lower() == "ollama":
+            return {
+                "model_name": self.config_manager.get("ollama_model", "llama3"),
+                "base_url": self.config_manager.get("ollama_url", "http://localhost:11434"),
+                "connect_timeout": self.config_manager.get("ollama_connect_timeout", 3.05),
+                "read_timeout": self.config_manager.get("ollama_read_timeout", 120.0),
+                "retries": self.config_manager.get("ollama_retries", 2),
+                "keep_alive": self.config_manager.get("ollama_keep_alive", "10m"),
+            }
+        return {"model_name": self.config_manager.get("gemini_model", "gemini-flash-latest")}
+
+    def _prompt_budget(self, provider_name: str):
+        """Token budget for /analyze prompts to this provider: by "provider/model", then provider, then "default"."""
+        budgets = self.config_manager.get("prompt_token_budget")
+        if not budgets:
+            return None
+        model_name = self._provider_options(provider_name)["model_name"]
+        provider_name = provider_name.lower()
+        for key in (f"{provider_name}/{model_name}", provider_name, "default"):
+            if key in budgets:
+                return budgets[key]
+        return None
 
     def update_history_widget(self):
-        """Load recent commands into the input widget."""
-        recent = self.history_manager.get_recent(limit=50)
-        # get_recent returns (id, command, timestamp, exit_code)
-        # We just want the command strings
-        commands = [row[1] for row in recent]
-        self.query_one(HistoryInput).set_history(commands)
+        """Point the input widget at the history cache and reset its navigation."""
+        self.query_one(HistoryInput).set_history(self.history_cache)
+
+    def search_history(self, query: str) -> list[str]:
+        """Commands matching query for the input's reverse search, newest first."""
+        rows = self.history_manager.search(query, limit=HistoryInput.SEARCH_LIMIT)
+        return [row[1] for row in rows]
 
     async def on_input_submitted(self, event: HistoryInput.Submitted) -> None:
         command = event.value
         input_widget = self.query_one("#command-input", HistoryInput)
-        output_container = self.query_one("#output-container", VerticalScroll)
 
         if not command.strip():
             return
@@ -84,7 +219,7 @@ class TerminalApp(App):
             if query:
                 input_widget.value = "Thinking..."
                 input_widget.disabled = True
-                self.run_ai_query(query)
+                self._ai_query = self.run_ai_query(query)
             return
 
         # Handle /history command
@@ -96,9 +231,32 @@ class TerminalApp(App):
         # Handle /analyze command
         if command.startswith("/analyze"):
             parts = command.split(" ", 2)
+
+            # /analyze --follow <file> and /analyze --stop: live tail mode
+            if len(parts) > 1 and parts[1] == "--stop":
+                input_widget.value = ""
+                if not self.stop_log_follow():
+                    self.notify("Not following any log.")
+                return
+            if len(parts) > 1 and parts[1] == "--follow":
+                if len(parts) < 3 or not parts[2].strip():
+                    self.notify("Usage: /analyze --follow <file>")
+                    return
+                input_widget.value = ""
+                self.start_log_follow(parts[2].strip())
+                return
             
             # Case 1: /analyze (no args) -> Analyze last command output
             if len(parts) == 1:
+                # Output too big for memory was spilled to disk; scan the complete file
+                if self.last_capture and self.last_capture.spilled:
+                    input_widget.value = "Analyzing last command..."
+                    input_widget.disabled = True
+                    self.run_log_analysis(
+                        self.last_capture.spill_path, "", source_name="Last Command Output"
+                    )
+                    return
+
                 content_to_analyze = self.last_error if self.last_error else self.last_command_output
                 if not content_to_analyze:
                     self.notify("No recent command output to analyze.")
@@ -109,7 +267,18 @@ class TerminalApp(App):
                 self.run_string_analysis(content_to_analyze, "Last Command Output")
                 return
 
-            # Case 2: /analyze <file> [query]
+            # /analyze --rotated <file> [query]: the log and its rotated generations as one stream
+            if len(parts) > 1 and parts[1] == "--rotated":
+                args = parts[2].split(" ", 1) if len(parts) > 2 else []
+                if not args or not args[0]:
+                    self.notify("Usage: /analyze --rotated <file> [query]")
+                    return
+                input_widget.value = "Analyzing logs..."
+                input_widget.disabled = True
+                self.run_log_analysis(args[0], args[1] if len(args) > 1 else "", rotated=True)
+                return
+
+            # Case 2: /analyze <file|glob|dir> [query]
             file_path = parts[1]
             query = parts[2] if len(parts) > 2 else ""
             
@@ -122,21 +291,36 @@ class TerminalApp(App):
         input_widget.value = ""
 
         cwd = os.getcwd()
-        prompt = f"\n[bold green]{cwd}[/bold green] $ [bold]{command}[/bold]\n"
-        output_container.mount(Static(prompt, classes="output-line"))
-        
-        # Scroll to end
-        output_container.scroll_end(animate=False)
+        self.write_output(f"[bold green]{cwd}[/bold green] $ [bold]{escape(command)}[/bold]")
 
         # Run command
         self.run_command(command)
 
-    @work(exclusive=True, thread=True)
-    def run_ai_query(self, query: str) -> None:
-        """Runs the AI query in a background thread worker."""
+    # AI requests run as async workers in the "ai" group: a new one (or Escape)
+    # cancels the one in flight, which drops its connection.
+
+    @work(exclusive=True, group="ai")
+    async def run_ai_query(self, query: str) -> None:
+        """Runs the AI query on the event loop."""
         context = self.context_manager.get_project_context(os.getcwd())
-        suggestion = self.ai_provider.get_command_suggestion(query, context)
-        self.call_from_thread(self.update_input_with_suggestion, suggestion)
+        try:
+            ai_provider = await self.get_ai_provider()
+            if ai_provider is None:
+                self.update_input_with_suggestion(query)
+                return
+            suggestion = await ai_provider.aget_command_suggestion(query, context)
+        except asyncio.CancelledError:
+            # Give the query back for editing, unless a newer ? query now owns the input
+            if self._ai_query is get_current_worker():
+                self.update_input_with_suggestion(query)
+            raise
+        self.update_input_with_suggestion(suggestion)
+
+    def action_cancel_ai(self) -> None:
+        """Cancels the AI request in flight, if any."""
+        if any(worker.group == "ai" and worker.is_running for worker in self.workers):
+            self.workers.cancel_group(self, "ai")
+            self.notify("AI request cancelled.")
 
     def update_input_with_suggestion(self, command: str) -> None:
         """Updates the input widget with the AI's suggestion."""
@@ -148,19 +332,34 @@ class TerminalApp(App):
     @work(exclusive=True)
     async def run_command(self, command: str) -> None:
         """Runs the command in an async worker (main thread)."""
-        output_container = self.query_one("#output-container", VerticalScroll)
-        
-        output_widget = Static("", classes="output-line")
-        output_widget.user_text = ""  # Custom attribute to track content
-        await output_container.mount(output_widget)
-        
         async def update_output(text: str) -> None:
-            self.append_text(output_widget, text, output_container)
-
-        exit_code, full_output = await execute_command(command, update_output)
+            self.output_scheduler.write(text)
+
+        # Only the last command's output is kept for /analyze
+        if self.last_capture:
+            self.last_capture.cleanup()
+        capture = OutputCapture(
+            max_bytes=self.config_manager.get("output_buffer_size", 1024 * 1024),
+            spill_dir=self.spill_dir if self.config_manager.get("spill_output", True) else None,
+            max_spill_bytes=self.config_manager.get("spill_max_bytes", MAX_SPILL_BYTES),
+            compress=self.config_manager.get("spill_compress", False),
+        )
+        self.last_capture = capture
+
+        try:
+            exit_code, full_output = await execute_command(
+                command,
+                update_output,
+                use_pty=self.config_manager.get("execution_backend") == "pty",
+                capture=capture,
+            )
+        finally:
+            capture.close()
+        self.output_scheduler.flush()
         
         # Save to history
         self.history_manager.add_entry(command, exit_code, full_output)
+        self.history_cache.push(command)
         self.update_history_widget()
         
         logger.info(f"Command executed: {command}, Exit Code: {exit_code}")
@@ -171,31 +370,28 @@ class TerminalApp(App):
         self.last_error = full_output if exit_code != 0 else ""
 
         if exit_code != 0:
-            error_msg = f"Command failed with exit code {exit_code}"
-            output_container.mount(Static(error_msg, classes="error-widget"))
-            output_container.scroll_end(animate=False)
+            self.write_output(f"[bold red]Command failed with exit code {exit_code}[/bold red]")
 
-    def append_text(self, widget: Static, text: str, container: VerticalScroll) -> None:
-        """Appends text to the widget and scrolls."""
-        widget.user_text += text
-        widget.update(widget.user_text)
-        container.scroll_end(animate=False)
+    def write_output(self, markup: str) -> None:
+        """Writes a markup block, separated by a blank line, after any pending command output."""
+        self.output_scheduler.flush()
+        self.output_log.write_markup("\n" + markup)
 
     def show_history(self):
         """Display history in the output."""
-        output_container = self.query_one("#output-container", VerticalScroll)
         recent = self.history_manager.get_recent(limit=20)
         
         history_text = "[bold blue]Recent History:[/bold blue]\n"
         for row in reversed(recent):
             # row: (id, command, timestamp, exit_code)
             status = "[green]✓[/green]" if row[3] == 0 else "[red]✗[/red]"
-            history_text += f"{status} {row[1]}\n"
+            history_text += f"{status} {escape(row[1])}\n"
             
-        output_container.mount(Static(history_text, classes="output-line"))
-        output_container.scroll_end(animate=False)
+        self.write_output(history_text)
+
+    # The actions check there is something to ask about before starting a
+    # worker, so a no-op key press doesn't cancel the request in flight.
 
-    @work(exclusive=True, thread=True)
     def action_fix_last_error(self) -> None:
         """Ask AI to fix the last error."""
         if self.last_exit_code == 0 or not self.last_error:
@@ -203,11 +399,18 @@ class TerminalApp(App):
             return
 
         self.notify("Asking AI for a fix...")
+        self.run_ai_fix(self.last_command, self.last_error)
+
+    @work(exclusive=True, group="ai")
+    async def run_ai_fix(self, command: str, error: str) -> None:
+        """Asks the AI for a fixed command on the event loop."""
         context = self.context_manager.get_project_context(os.getcwd())
-        suggestion = self.ai_provider.fix_command(self.last_command, self.last_error, context)
-        self.call_from_thread(self.update_input_with_suggestion, suggestion)
+        ai_provider = await self.get_ai_provider()
+        if ai_provider is None:
+            return
+        suggestion = await ai_provider.afix_command(command, error, context)
+        self.update_input_with_suggestion(suggestion)
 
-    @work(exclusive=True, thread=True)
     def action_explain_last_command(self) -> None:
         """Ask AI to explain the last command."""
         if not self.last_command:
@@ -215,94 +418,196 @@ class TerminalApp(App):
             return
 
         self.notify("Asking AI for explanation...")
+        self.run_ai_explain(self.last_command)
+
+    @work(exclusive=True, group="ai")
+    async def run_ai_explain(self, command: str) -> None:
+        """Streams the AI's explanation of command on the event loop."""
         context = self.context_manager.get_project_context(os.getcwd())
-        explanation = self.ai_provider.explain_command(self.last_command, context)
-        
-        self.call_from_thread(self.show_explanation, explanation)
+        ai_provider = await self.get_ai_provider()
+        if ai_provider is None:
+            return
+        await self.astream_output(
+            "[bold yellow]AI Explanation:[/bold yellow]", ai_provider.astream_explain_command(command, context)
+        )
 
-    def show_explanation(self, explanation: str) -> None:
-        """Show explanation in the output."""
-        output_container = self.query_one("#output-container", VerticalScroll)
-        panel = f"[bold yellow]AI Explanation:[/bold yellow]\n{explanation}\n"
-        output_container.mount(Static(panel, classes="output-line"))
-        output_container.scroll_end(animate=False)
+    async def astream_output(self, header: str, chunks: AsyncIterator[str]) -> str:
+        """stream_output for async workers on the event loop. A cancelled stream is marked as such."""
+        self.write_output(header)
+        received = []
+        try:
+            async for chunk in chunks:
+                received.append(chunk)
+                self.output_scheduler.write(chunk)
+        except asyncio.CancelledError:
+            self.output_scheduler.write(" [cancelled]")
+            raise
+        finally:
+            self.output_scheduler.flush()
+        return "".join(received)
+
+    def stream_output(self, header: str, chunks: Iterable[str]) -> str:
+        """
+        Writes the header markup, then each chunk of an AI response as it
+        arrives (as plain text, coalesced per frame). Called from a worker
+        thread; returns the whole response.
+        """
+        self.call_from_thread(self.write_output, header)
+        received = []
+        for chunk in chunks:
+            received.append(chunk)
+            self.call_from_thread(self.output_scheduler.write, chunk)
+        self.call_from_thread(self.output_scheduler.flush)
+        return "".join(received)
 
     @work(exclusive=True, thread=True)
-    def run_log_analysis(self, file_path: str, query: str) -> None:
+    def run_log_analysis(self, file_path: str, query: str, source_name: str = None, rotated: bool = False) -> None:
         """Runs the log analysis in background."""
-        summary, handoff_prompt = self.log_analyzer.analyze_file(file_path, query)
-        
-        # If we have a handoff prompt, ask AI to summarize the chunk too
-        ai_summary = ""
-        if handoff_prompt:
-            # Extract the chunk from the prompt for the AI to analyze
-            # This is a bit of a hack, ideally LogAnalyzer returns the chunk directly
-            chunk_start = handoff_prompt.find("```text") + 7
-            chunk_end = handoff_prompt.find("```", chunk_start)
-            if chunk_start > 6 and chunk_end > chunk_start:
-                chunk = handoff_prompt[chunk_start:chunk_end]
-                ai_summary = self.ai_provider.analyze_log(chunk, query)
-
-        self.call_from_thread(self.show_analysis_result, summary, ai_summary, handoff_prompt)
+        digest = self.config_manager.get("analyze_digest", True)
+        if rotated:
+            # Finds the rotated generations itself, so the path isn't expanded here
+            report = self.log_analyzer.analyze_rotated(file_path, query, digest=digest)
+        else:
+            paths = expand_log_paths(file_path)
+            if paths != [file_path]:
+                # A glob or directory: every file is scanned, then summarized in one AI request
+                report = self.log_analyzer.analyze_many(paths, query, source_name or file_path, digest=digest)
+            else:
+                report = self.log_analyzer.analyze(file_path, query, source_name, digest=digest)
+
+        self.call_from_thread(self.show_analysis_result, report.summary, report.prompt)
+        # If we have a handoff prompt, ask AI to summarize the digest and chunk too
+        ai_provider = self.wait_for_ai_provider() if report.prompt else None
+        if ai_provider is not None:
+            self.stream_output("[bold yellow]AI Insight:[/bold yellow]", ai_provider.stream_analyze_log(report.log_excerpt, query))
+        self.call_from_thread(self.update_input_with_suggestion, "")
 
     @work(exclusive=True, thread=True)
     def run_string_analysis(self, content: str, source_name: str) -> None:
         """Runs string analysis in background."""
-        summary, handoff_prompt = self.log_analyzer.analyze_string(content, source_name)
-        
-        # AI Summary logic (duplicated for now, could be refactored)
-        ai_summary = ""
-        if handoff_prompt:
-            chunk_start = handoff_prompt.find("```text") + 7
-            chunk_end = handoff_prompt.find("```", chunk_start)
-            if chunk_start > 6 and chunk_end > chunk_start:
-                chunk = handoff_prompt[chunk_start:chunk_end]
-                ai_summary = self.ai_provider.analyze_log(chunk)
+        digest = self.config_manager.get("analyze_digest", True)
+        report = self.log_analyzer.analyze_text(content, source_name, digest=digest)
 
-        self.call_from_thread(self.show_analysis_result, summary, ai_summary, handoff_prompt)
+        self.call_from_thread(self.show_analysis_result, report.summary, report.prompt)
+        ai_provider = self.wait_for_ai_provider() if report.prompt else None
+        if ai_provider is not None:
+            self.stream_output("[bold yellow]AI Insight:[/bold yellow]", ai_provider.stream_analyze_log(report.log_excerpt))
+        self.call_from_thread(self.update_input_with_suggestion, "")
 
-    def show_analysis_result(self, summary: str, ai_summary: str, handoff_prompt: str) -> None:
-        """Displays the analysis result and copy button."""
-        input_widget = self.query_one("#command-input", HistoryInput)
-        input_widget.disabled = False
-        input_widget.value = ""
-        input_widget.focus()
-        
-        output_container = self.query_one("#output-container", VerticalScroll)
-        
+    def start_log_follow(self, file_path: str) -> None:
+        """Starts tailing file_path for /analyze --follow, replacing any previous one."""
+        self.stop_log_follow()
+
+        def on_incidents(clusters, repeats: int) -> None:
+            if follower.stopped:
+                return
+            lines = [
+                f"[bold red]Incident[/bold red] {escape(f'[{cluster.severity}]')} line {cluster.first_line}: {escape(cluster.sample)}"
+                for cluster in clusters
+            ]
+            if repeats:
+                lines.append(f"[dim]+{repeats} repeat(s) of known errors in {escape(file_path)}[/dim]")
+            self.call_from_thread(self.write_output, "\n".join(lines))
+
+        def on_summary(digest: str, excerpt: str) -> None:
+            ai_provider = self.wait_for_ai_provider()
+            if ai_provider is None:
+                return
+            ai_summary = ai_provider.analyze_log(f"[Error Digest]\n{digest}\n\n[Log Excerpt]\n{excerpt}")
+            if not follower.stopped:
+                self.call_from_thread(
+                    self.write_output, f"[bold yellow]AI Insight ({escape(file_path)}):[/bold yellow]\n{escape(ai_summary)}"
+                )
+
+        def on_notice(message: str) -> None:
+            if not follower.stopped:
+                self.call_from_thread(self.write_output, f"[dim]{escape(message)}[/dim]")
+
+        follower = LogFollower(
+            file_path,
+            self.log_analyzer,
+            on_incidents,
+            on_summary=on_summary,
+            on_notice=on_notice,
+            debounce=self.config_manager.get("follow_debounce", 2.0),
+            max_delay=self.config_manager.get("follow_max_delay", 10.0),
+            poll_interval=self.config_manager.get("follow_poll_interval", 1.0),
+        )
+        self.log_follower = follower
+        self.write_output(f"[bold blue]Following {escape(file_path)}[/bold blue] (/analyze --stop to stop)")
+        self.run_log_follow(follower)
+
+    @work(thread=True, group="follow")
+    def run_log_follow(self, follower: LogFollower) -> None:
+        """Runs the follower in the background until it is stopped."""
+        try:
+            follower.run()
+        except Exception as e:
+            logger.error(f"Following {follower.path} failed: {e}")
+            follower.stop()
+            self.call_from_thread(
+                self.write_output, f"[bold red]Stopped following {escape(follower.path)}:[/bold red] {escape(str(e))}"
+            )
+
+    def stop_log_follow(self) -> bool:
+        """Stops the live tail started by /analyze --follow. Returns False if there was none."""
+        if self.log_follower is None or self.log_follower.stopped:
+            return False
+        self.log_follower.stop()
+        self.write_output(f"[bold blue]Stopped following {escape(self.log_follower.path)}[/bold blue]")
+        return True
+
+    def show_analysis_result(self, summary: str, handoff_prompt: str) -> None:
+        """
+        Displays the analysis result and copy button. The AI insight is
+        streamed in below it afterwards, and the input stays disabled until then.
+        """
         # 1. Show System Summary
-        output_container.mount(Static(f"[bold blue]Log Analysis:[/bold blue] {summary}", classes="output-line"))
-        
-        # 2. Show AI Insight (if available)
-        if ai_summary:
-            output_container.mount(Static(f"[bold yellow]AI Insight:[/bold yellow]\n{ai_summary}", classes="output-line"))
+        self.write_output(f"[bold blue]Log Analysis:[/bold blue] {escape(summary)}")
 
-        # 3. Show Copyable Handoff Prompt
+        # 2. Show Copyable Handoff Prompt
+        # Interactive widgets can't live in the virtualized scrollback, so the latest
+        # prompt gets a single docked panel that is replaced on every analysis.
         if handoff_prompt:
-            container = Static(classes="handoff-container")
-            # Mount the container to the output FIRST
-            output_container.mount(container)
+            panel = self.query_one("#handoff-panel", Vertical)
+            panel.remove_children()
             
-            # Then mount children TO the container
-            container.mount(Static("[bold]Agent Handoff Prompt (Copy this):[/bold]", classes="handoff-header"))
-            
-            # The prompt text
-            prompt_widget = Static(handoff_prompt, classes="handoff-content")
-            container.mount(prompt_widget)
-            
-            # Copy Button
             from textual.widgets import Button
             btn = Button("Copy to Clipboard", variant="primary", id="copy-btn")
             btn.prompt_text = handoff_prompt 
-            container.mount(btn)
-        
-        output_container.scroll_end(animate=False)
+            panel.mount(
+                Static("[bold]Agent Handoff Prompt (Copy this):[/bold]", classes="handoff-header"),
+                Static(handoff_prompt, classes="handoff-content", markup=False),
+                Horizontal(btn, Button("Dismiss", id="dismiss-btn"), classes="handoff-buttons"),
+            )
+            panel.display = True
+
+    async def on_unmount(self) -> None:
+        """Flush history and remove spilled command output."""
+        # A query cancelled on the way out has no input to go back to
+        self._ai_query = None
+        if self.log_follower is not None:
+            self.log_follower.stop()
+        self.history_manager.close()
+        if self._ai_provider.done() and self._ai_provider.exception() is None:
+            await self._ai_provider.result().aclose()
+        if self.ai_cache is not None:
+            self.ai_cache.close()
+        if self.last_capture:
+            self.last_capture.cleanup()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
 
     def on_button_pressed(self, event: "Button.Pressed") -> None:
-        if event.button.id == "copy-btn":
+        if event.button.id == "dismiss-btn":
+            panel = self.query_one("#handoff-panel", Vertical)
+            panel.remove_children()
+            panel.display = False
+        elif event.button.id == "copy-btn":
             text = getattr(event.button, "prompt_text", "")
             if text:
                 try:
+                    # Imported on first use, it probes for clipboard tools
+                    import pyperclip
                     pyperclip.copy(text)
                     self.notify("Copied to clipboard!")
                 except Exception as e:
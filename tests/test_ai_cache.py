@@ -0,0 +1,128 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils.ai_cache import CachedProvider, ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+def make_provider(response="df -h"):
+    provider = MagicMock()
+    provider.model_name = "test-model"
+    provider.get_command_suggestion.return_value = response
+    provider.explain_command.return_value = "Shows pods"
+    return provider
+
+
+def test_repeated_request_is_served_from_memory(cache):
+    provider = make_provider()
+    cached = CachedProvider(provider, cache, "gemini")
+    assert cached.get_command_suggestion("show disk usage", "Path: /srv") == "df -h"
+    # Whitespace differences hit the same entry
+    assert cached.get_command_suggestion("  show   disk usage ", "Path: /srv") == "df -h"
+    assert provider.get_command_suggestion.call_count == 1
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+
+    # Another context or method is another entry
+    cached.get_command_suggestion("show disk usage", "Path: /home")
+    cached.explain_command("show disk usage", "Path: /srv")
+    assert provider.get_command_suggestion.call_count == 2
+    assert cache.misses == 3
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    provider = make_provider()
+    first = ResponseCache(db_path=db_path)
+    CachedProvider(provider, first, "ollama").explain_command("kubectl get pods -A")
+    first.close()
+
+    second = ResponseCache(db_path=db_path)
+    assert CachedProvider(provider, second, "ollama").explain_command("kubectl get pods -A") == "Shows pods"
+    assert provider.explain_command.call_count == 1
+    assert second.disk_hits == 1
+    # Now in memory too
+    CachedProvider(provider, second, "ollama").explain_command("kubectl get pods -A")
+    assert second.memory_hits == 1
+    second.close()
+
+
+def test_errors_are_not_cached(cache):
+    provider = make_provider("Error calling Gemini API: timeout")
+    cached = CachedProvider(provider, cache, "gemini")
+    cached.get_command_suggestion("list files")
+    cached.get_command_suggestion("list files")
+    assert provider.get_command_suggestion.call_count == 2
+
+
+def test_ttl_expires_entries(tmp_path, monkeypatch):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"), ttls={"fix_command": 60, "explain_command": None})
+    key = cache.make_key("gemini", "m", "fix_command", "ls /nope")
+    forever = cache.make_key("gemini", "m", "explain_command", "ls")
+    cache.put(key, "fix_command", "ls /tmp")
+    cache.put(forever, "explain_command", "lists files")
+    assert cache.get(key, "fix_command") == "ls /tmp"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get(key, "fix_command") is None
+    assert cache.get(forever, "explain_command") == "lists files"
+    assert cache._conn.execute("SELECT COUNT(*) FROM responses WHERE method = 'fix_command'").fetchone()[0] == 0
+    cache.close()
+
+
+def test_size_and_memory_limits(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"), max_memory_entries=2, max_bytes=2500)
+    keys = [cache.make_key("gemini", "m", "explain_command", f"cmd {i}") for i in range(5)]
+    for key in keys:
+        cache.put(key, "explain_command", "x" * 1000)
+    assert len(cache._memory) == 2
+    # Only the two most recent rows fit in max_bytes
+    stored = {row[0] for row in cache._conn.execute("SELECT key FROM responses")}
+    assert stored == set(keys[3:])
+    assert cache.get(keys[0], "explain_command") is None
+    cache.close()
+
+
+def test_streamed_response_is_cached_once_complete(cache):
+    provider = make_provider()
+    provider.stream_analyze_log.side_effect = lambda log, query="": iter(["Disk ", "full "])
+    cached = CachedProvider(provider, cache, "ollama")
+    assert list(cached.stream_analyze_log("Error: no space")) == ["Disk ", "full "]
+    assert list(cached.stream_analyze_log("Error: no space")) == ["Disk full"]
+    assert provider.stream_analyze_log.call_count == 1
+
+    provider.stream_explain_command.side_effect = lambda command, context="": iter(["Lists", "Error calling Ollama: reset"])
+    list(cached.stream_explain_command("ls"))
+    list(cached.stream_explain_command("ls"))
+    assert provider.stream_explain_command.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_requests_use_the_cache(cache):
+    from unittest.mock import AsyncMock
+    provider = make_provider()
+    provider.aget_command_suggestion = AsyncMock(return_value="df -h")
+
+    async def stream(command, context=""):
+        for chunk in ("Lists ", "pods"):
+            yield chunk
+    provider.astream_explain_command = MagicMock(side_effect=stream)
+
+    cached = CachedProvider(provider, cache, "ollama")
+    assert await cached.aget_command_suggestion("show disk usage") == "df -h"
+    # Shared with the blocking methods
+    assert cached.get_command_suggestion("show disk usage") == "df -h"
+    assert provider.aget_command_suggestion.await_count == 1
+    assert provider.get_command_suggestion.call_count == 0
+
+    assert [chunk async for chunk in cached.astream_explain_command("kubectl get pods")] == ["Lists ", "pods"]
+    assert [chunk async for chunk in cached.astream_explain_command("kubectl get pods")] == ["Lists pods"]
+    assert provider.astream_explain_command.call_count == 1
@@ -1,3 +1,5 @@
+import threading
+
 import pytest
 from unittest.mock import MagicMock, patch
 from utils.ai import GeminiProvider, OllamaProvider, get_provider
@@ -41,14 +43,316 @@ def test_ollama_get_suggestion(mock_requests):
     mock_response = MagicMock()
     mock_response.status_code = 200
     mock_response.json.return_value = {"response": "ls -la"}
-    mock_requests.post.return_value = mock_response
+    mock_requests.Session.return_value.post.return_value = mock_response
     
     result = provider.get_command_suggestion("list files")
     assert result == "ls -la"
-    mock_requests.post.assert_called_once()
+    mock_requests.Session.return_value.post.assert_called_once()
 
 def test_get_provider(mock_env, mock_genai):
     assert isinstance(get_provider("gemini"), GeminiProvider)
     assert isinstance(get_provider("ollama"), OllamaProvider)
     # Default
     assert isinstance(get_provider("unknown"), GeminiProvider)
+
+def test_gemini_stream_explain(mock_env, mock_genai):
+    provider = GeminiProvider()
+    chunks = [MagicMock(text="Lists "), MagicMock(text="all files")]
+    provider.model.generate_content.return_value = iter(chunks)
+
+    assert list(provider.stream_explain_command("ls -la")) == ["Lists ", "all files"]
+    assert provider.model.generate_content.call_args.kwargs == {"stream": True}
+    assert provider.last_ttft is not None
+
+def test_ollama_stream_analyze_log(mock_requests):
+    provider = OllamaProvider()
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.iter_lines.return_value = [
+        b'{"response": "Disk ", "done": false}',
+        b'',
+        b'{"response": "full", "done": false}',
+        b'{"response": "", "done": true}',
+    ]
+    mock_requests.Session.return_value.post.return_value = mock_response
+
+    assert "".join(provider.stream_analyze_log("Error: no space left")) == "Disk full"
+    post = mock_requests.Session.return_value.post
+    assert post.call_args.kwargs["json"]["stream"] is True
+    assert post.call_args.kwargs["stream"] is True
+
+def test_ollama_stream_error_status(mock_requests):
+    provider = OllamaProvider()
+    mock_response = MagicMock()
+    mock_response.status_code = 404
+    mock_requests.Session.return_value.post.return_value = mock_response
+    assert list(provider.stream_explain_command("ls")) == ["Error: Ollama returned status 404"]
+
+def test_stream_falls_back_to_whole_response():
+    from utils.ai import AIProvider
+
+    class Plain(AIProvider):
+        def get_command_suggestion(self, query, context=""):
+            return ""
+        def fix_command(self, command, error_output, context=""):
+            return ""
+        def explain_command(self, command, context=""):
+            return f"explains {command}"
+        def analyze_log(self, log_content, query=""):
+            return ""
+
+    provider = Plain()
+    assert list(provider.stream_explain_command("ls")) == ["explains ls"]
+    assert provider.last_ttft is not None
+
+class StubOllama:
+    """A local HTTP server standing in for Ollama's /api/generate."""
+
+    def __init__(self):
+        import json
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.requests = []
+        self.ports = set()
+        # Statuses to answer before succeeding, and seconds to stall each response
+        self.fail_with = []
+        self.delay = 0.0
+        # If set, streamed responses send one word every chunk_delay seconds, chunked
+        self.chunk_delay = 0.0
+        # Set when a client hangs up before or in the middle of a streamed response
+        self.disconnected = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                import time
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append(body)
+                stub.ports.add(self.client_address[1])
+                if stub.fail_with:
+                    self._send(stub.fail_with.pop(0), b"{}")
+                    return
+                if not self._stall(stub.delay):
+                    stub.disconnected.set()
+                    return
+                reply = "Disk full" if body.get("prompt", "").startswith("Explain") else "df -h"
+                if not body.get("stream"):
+                    self._send(200, json.dumps({"response": reply, "done": True}).encode())
+                    return
+                words = reply.split(" ")
+                words = [word + " " for word in words[:-1]] + words[-1:]
+                if stub.chunk_delay:
+                    words = words * 100
+                lines = [json.dumps({"response": word, "done": False}).encode() + b"\n" for word in words]
+                lines.append(json.dumps({"response": "", "done": True}).encode() + b"\n")
+                if not stub.chunk_delay:
+                    self._send(200, b"".join(lines))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for line in lines + [b""]:
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                        time.sleep(stub.chunk_delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.disconnected.set()
+
+            def _stall(self, seconds):
+                """Waits before answering, like a loading model. False if the client hung up meanwhile."""
+                import select
+                import socket
+                import time
+                deadline = time.monotonic() + seconds
+                while time.monotonic() < deadline:
+                    if select.select([self.connection], [], [], 0.02)[0] and not self.connection.recv(1, socket.MSG_PEEK):
+                        return False
+                return True
+
+            def _send(self, status, data):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_ollama():
+    stub = StubOllama()
+    yield stub
+    stub.close()
+
+def test_ollama_reuses_connection(stub_ollama):
+    provider = OllamaProvider(base_url=stub_ollama.url, keep_alive="30m")
+    for _ in range(3):
+        assert provider.get_command_suggestion("show disk usage") == "df -h"
+    assert "".join(provider.stream_explain_command("df -h")) == "Disk full"
+    # One keep-alive connection for every request
+    assert len(stub_ollama.ports) == 1
+    assert all(request["keep_alive"] == "30m" for request in stub_ollama.requests)
+
+def test_ollama_retries_unavailable_server(stub_ollama):
+    stub_ollama.fail_with = [503, 503]
+    provider = OllamaProvider(base_url=stub_ollama.url, retries=2)
+    assert provider.get_command_suggestion("show disk usage") == "df -h"
+    assert len(stub_ollama.requests) == 3
+
+    stub_ollama.fail_with = [503, 503, 503]
+    assert provider.get_command_suggestion("show disk usage") == "Error: Ollama returned status 503"
+
+def test_ollama_read_timeout(stub_ollama):
+    import time
+    stub_ollama.delay = 1.0
+    provider = OllamaProvider(base_url=stub_ollama.url, read_timeout=0.2)
+    start = time.monotonic()
+    assert provider.get_command_suggestion("show disk usage").startswith("Error calling Ollama")
+    assert time.monotonic() - start < 1.0
+    # Not sent again after a read timeout
+    assert len(stub_ollama.requests) == 1
+
+def test_ollama_connect_failure_and_warm_up(stub_ollama):
+    provider = OllamaProvider(base_url=stub_ollama.url)
+    assert provider.warm_up()
+    assert stub_ollama.requests == [{"model": "llama3", "keep_alive": "10m", "stream": False}]
+
+    stub_ollama.close()
+    offline = OllamaProvider(base_url=stub_ollama.url, retries=0)
+    assert not offline.warm_up()
+    assert offline.explain_command("ls").startswith("Error calling Ollama")
+
+@pytest.mark.asyncio
+async def test_ollama_async_requests_share_connection(stub_ollama):
+    provider = OllamaProvider(base_url=stub_ollama.url, keep_alive="30m")
+    assert await provider.aget_command_suggestion("show disk usage") == "df -h"
+    assert [chunk async for chunk in provider.astream_explain_command("df -h")] == ["Disk ", "full"]
+    assert await provider.afix_command("df -x", "invalid option") == "df -h"
+    # One keep-alive connection serves every request
+    assert len(stub_ollama.ports) == 1
+    assert all(request["keep_alive"] == "30m" and request["stream"] for request in stub_ollama.requests)
+    await provider.aclose()
+
+@pytest.mark.asyncio
+async def test_ollama_async_cancel_closes_connection(stub_ollama):
+    import asyncio
+    import time
+    stub_ollama.chunk_delay = 0.05
+    provider = OllamaProvider(base_url=stub_ollama.url)
+    received = []
+
+    async def consume():
+        async for chunk in provider.astream_explain_command("ls"):
+            received.append(chunk)
+
+    task = asyncio.create_task(consume())
+    while not received:
+        await asyncio.sleep(0.01)
+    start = time.monotonic()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert time.monotonic() - start < 0.5
+    # The server saw the connection drop and stopped sending
+    assert await asyncio.to_thread(stub_ollama.disconnected.wait, 2.0)
+
+    stub_ollama.chunk_delay = 0.0
+    assert await provider.aget_command_suggestion("show disk usage") == "df -h"
+    await provider.aclose()
+
+@pytest.mark.asyncio
+async def test_ollama_async_cancel_before_response(stub_ollama):
+    import asyncio
+    import time
+    stub_ollama.delay = 5.0
+    provider = OllamaProvider(base_url=stub_ollama.url)
+    task = asyncio.create_task(provider.aget_command_suggestion("ls"))
+    while not stub_ollama.requests:
+        await asyncio.sleep(0.01)
+    start = time.monotonic()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert time.monotonic() - start < 0.5
+    # The connection is closed while the server is still stalling, not after it answers
+    assert await asyncio.to_thread(stub_ollama.disconnected.wait, 1.0)
+    await provider.aclose()
+
+@pytest.mark.asyncio
+async def test_ollama_async_cancel_unresponsive_server():
+    import asyncio
+    import socket
+    import time
+    # A listening socket that never accepts or answers
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    provider = OllamaProvider(base_url=f"http://127.0.0.1:{listener.getsockname()[1]}", connect_timeout=30)
+    task = asyncio.create_task(provider.aget_command_suggestion("ls"))
+    await asyncio.sleep(0.2)
+    start = time.monotonic()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert time.monotonic() - start < 0.5
+    await provider.aclose()
+    listener.close()
+
+@pytest.mark.asyncio
+async def test_ollama_async_errors(stub_ollama):
+    stub_ollama.fail_with = [404]
+    provider = OllamaProvider(base_url=stub_ollama.url)
+    assert await provider.aget_command_suggestion("ls") == "Error: Ollama returned status 404"
+    stub_ollama.fail_with = [503, 503]
+    assert await provider.aget_command_suggestion("ls") == "df -h"
+    await provider.aclose()
+
+    stub_ollama.close()
+    offline = OllamaProvider(base_url=stub_ollama.url, retries=0)
+    assert (await offline.aexplain_command("ls")).startswith("Error calling Ollama")
+
+@pytest.mark.asyncio
+async def test_gemini_async(mock_env, mock_genai):
+    from unittest.mock import AsyncMock
+    provider = GeminiProvider()
+    provider.model.generate_content_async = AsyncMock(return_value=MagicMock(text=" ls -la \n"))
+    assert await provider.aget_command_suggestion("list files") == "ls -la"
+
+    async def chunks():
+        for text in ("Lists ", "files"):
+            yield MagicMock(text=text)
+    provider.model.generate_content_async = AsyncMock(return_value=chunks())
+    assert [chunk async for chunk in provider.astream_explain_command("ls")] == ["Lists ", "files"]
+    assert provider.model.generate_content_async.call_args.kwargs == {"stream": True}
+
+@pytest.mark.asyncio
+async def test_async_falls_back_to_thread():
+    from utils.ai import AIProvider
+
+    class Plain(AIProvider):
+        def get_command_suggestion(self, query, context=""):
+            return f"echo {query}"
+        def fix_command(self, command, error_output, context=""):
+            return ""
+        def explain_command(self, command, context=""):
+            return f"explains {command}"
+        def analyze_log(self, log_content, query=""):
+            return ""
+
+    provider = Plain()
+    assert await provider.aget_command_suggestion("hi") == "echo hi"
+    assert [chunk async for chunk in provider.astream_explain_command("ls")] == ["explains ls"]
@@ -0,0 +1,94 @@
+import gzip
+import os
+import pytest
+from utils.capture import OutputCapture
+from utils.commander import execute_command
+from utils.log_analyzer import LogAnalyzer
+
+def test_no_spill_below_window(tmp_path):
+    capture = OutputCapture(max_bytes=100, spill_dir=str(tmp_path))
+    capture.append("small output\n")
+    capture.close()
+    assert not capture.spilled
+    assert os.listdir(tmp_path) == []
+
+def test_spill_keeps_complete_output(tmp_path):
+    capture = OutputCapture(max_bytes=16, spill_dir=str(tmp_path))
+    lines = [f"line {i}\n" for i in range(100)]
+    for line in lines:
+        capture.append(line)
+    capture.close()
+
+    assert capture.spilled
+    with open(capture.spill_path) as f:
+        assert f.read() == "".join(lines)
+    # Memory only holds the tail
+    assert capture.getvalue() == "".join(lines)[-16:]
+
+def test_spill_compressed(tmp_path):
+    capture = OutputCapture(max_bytes=8, spill_dir=str(tmp_path), compress=True)
+    capture.append("first error\n")
+    capture.append("more output\n")
+    capture.close()
+
+    assert capture.spill_path.endswith(".gz")
+    with gzip.open(capture.spill_path, "rt") as f:
+        assert f.read() == "first error\nmore output\n"
+
+def test_spill_size_cap(tmp_path):
+    capture = OutputCapture(max_bytes=4, spill_dir=str(tmp_path), max_spill_bytes=10)
+    capture.append("0123456789abcdef")
+    capture.append("ghij")
+    capture.close()
+
+    assert capture.spill_truncated
+    # The head up to the cap, then the in-memory tail
+    with open(capture.spill_path) as f:
+        assert f.read() == "0123456789\n... [6 bytes of output omitted] ...\nghij"
+
+def test_spill_cap_overlapping_tail(tmp_path):
+    capture = OutputCapture(max_bytes=8, spill_dir=str(tmp_path), max_spill_bytes=10)
+    capture.append("0123456789ab")
+    capture.close()
+    with open(capture.spill_path) as f:
+        assert f.read() == "0123456789ab"
+
+def test_cleanup_removes_file(tmp_path):
+    capture = OutputCapture(max_bytes=4, spill_dir=str(tmp_path))
+    capture.append("0123456789")
+    path = capture.spill_path
+    capture.cleanup()
+    assert not os.path.exists(path)
+    assert capture.spill_path is None
+
+@pytest.mark.asyncio
+async def test_execute_command_spills(tmp_path):
+    async def noop(text):
+        pass
+
+    capture = OutputCapture(max_bytes=1024, spill_dir=str(tmp_path))
+    cmd = "echo 'Error: root cause'; seq 1 5000"
+    exit_code, output = await execute_command(cmd, noop, capture=capture)
+    capture.close()
+
+    assert "root cause" not in output
+    # The first error is gone from memory but the spilled file still has it
+    summary, prompt = LogAnalyzer().analyze_file(capture.spill_path, source_name="Last Command Output")
+    assert "Error: root cause" in prompt
+    assert "Last Command Output" in prompt
+    capture.cleanup()
+
+@pytest.mark.asyncio
+async def test_capped_spill_keeps_final_error(tmp_path):
+    async def noop(text):
+        pass
+
+    capture = OutputCapture(max_bytes=1024, spill_dir=str(tmp_path), max_spill_bytes=4096)
+    cmd = "echo 'Error: early warning sign'; seq 1 5000; echo 'Fatal: build failed'"
+    await execute_command(cmd, noop, capture=capture)
+    capture.close()
+
+    report = LogAnalyzer().analyze(capture.spill_path, source_name="Last Command Output")
+    assert "Fatal: build failed" in report.chunk
+    assert "Error: early warning sign" in report.digest
+    capture.cleanup()
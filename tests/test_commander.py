@@ -1,6 +1,6 @@
 import pytest
 import os
-from utils.commander import execute_command
+from utils.commander import execute_command, AnsiStripper, StreamDecoder
 
 @pytest.mark.asyncio
 async def test_echo():
@@ -44,3 +44,99 @@ async def test_exit():
     exit_code, output = await execute_command("exit", callback)
     assert exit_code == 0
     assert "Exit command received" in output
+
+def test_stream_decoder_multibyte_split():
+    decoder = StreamDecoder()
+    data = "héllo €".encode("utf-8")
+    # Feed one byte at a time so every multibyte character is split
+    text = "".join(decoder.decode(data[i:i + 1]) for i in range(len(data)))
+    text += decoder.decode(b"", final=True)
+    assert text == "héllo €"
+    assert "�" not in text
+
+def test_stream_decoder_crlf_split():
+    decoder = StreamDecoder()
+    text = decoder.decode(b"line\r") + decoder.decode(b"\nnext\r") + decoder.decode(b"", final=True)
+    assert text == "line\nnext\r"
+
+@pytest.mark.asyncio
+async def test_chunked_callbacks():
+    chunks = []
+    async def callback(text):
+        chunks.append(text)
+
+    exit_code, full_output = await execute_command("seq 1 20000", callback)
+    assert exit_code == 0
+    assert full_output.splitlines()[-1] == "20000"
+    # Many lines per callback instead of one callback per line
+    assert len(chunks) < 20000 / 10
+
+@pytest.mark.asyncio
+async def test_carriage_return_passthrough():
+    chunks = []
+    async def callback(text):
+        chunks.append(text)
+
+    exit_code, full_output = await execute_command("printf '10%%\\r50%%\\r100%%\\r\\n'", callback)
+    assert exit_code == 0
+    assert full_output == "10%\r50%\r100%\n"
+
+@pytest.mark.asyncio
+async def test_huge_single_line():
+    async def callback(text):
+        pass
+
+    # Larger than the default StreamReader line limit (64 KiB)
+    exit_code, full_output = await execute_command("head -c 300000 /dev/zero | tr '\\0' 'x'", callback)
+    assert exit_code == 0
+    assert len(full_output) == 300000
+
+@pytest.mark.asyncio
+async def test_pty_backend():
+    async def callback(text):
+        pass
+
+    exit_code, output = await execute_command("[ -t 1 ] && echo tty || echo pipe", callback, use_pty=True)
+    assert exit_code == 0
+    assert output == "tty\n"
+
+    exit_code, output = await execute_command("[ -t 1 ] && echo tty || echo pipe", callback)
+    assert output == "pipe\n"
+
+@pytest.mark.asyncio
+async def test_pty_exit_code_and_stderr():
+    async def callback(text):
+        pass
+
+    exit_code, output = await execute_command("echo oops >&2; exit 3", callback, use_pty=True)
+    assert exit_code == 3
+    assert output == "oops\n"
+
+@pytest.mark.asyncio
+async def test_ansi_stripped_from_capture():
+    chunks = []
+    async def callback(text):
+        chunks.append(text)
+
+    exit_code, output = await execute_command("printf '\\033[31mred\\033[0m\\n'", callback, use_pty=True)
+    assert output == "red\n"
+    # The UI still receives the colors
+    assert "\x1b[31m" in "".join(chunks)
+
+def test_ansi_stripper_split_sequences():
+    data = "\x1b[31mred\x1b[0m \x1b]0;title\x1b\\done\x1b]2;t\x07\n"
+    stripper = AnsiStripper()
+    # Feed one character at a time so every sequence is split
+    text = "".join(stripper.strip(char) for char in data) + stripper.strip("", final=True)
+    assert text == "red done\n"
+
+@pytest.mark.asyncio
+async def test_ansi_split_across_reads_stripped_from_capture():
+    async def callback(text):
+        pass
+
+    exit_code, output = await execute_command(
+        "printf '\\033[31mred\\033[0m\\n'", callback, chunk_size=3
+    )
+    assert exit_code == 0
+    assert output == "red\n"
@@ -1,11 +1,16 @@
 import os
+import threading
+import time
+
 import pytest
-from utils.history import HistoryManager
+from utils.history import HistoryManager, HistoryCache
 
 @pytest.fixture
 def history_manager(tmp_path):
     db_path = tmp_path / "test_history.db"
-    return HistoryManager(db_path=str(db_path))
+    manager = HistoryManager(db_path=str(db_path))
+    yield manager
+    manager.close()
 
 def test_add_and_get_recent(history_manager):
     history_manager.add_entry("echo hello", 0, "hello\n")
@@ -25,3 +30,294 @@ def test_search(history_manager):
     assert len(results) == 2
     assert results[0][1] == "git commit"
     assert results[1][1] == "git status"
+
+def test_wal_mode(history_manager):
+    mode = history_manager._conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+def test_add_entry_does_not_block(history_manager):
+    for i in range(500):
+        history_manager.add_entry(f"echo {i}", 0, "")
+    history_manager.flush()
+    recent = history_manager.get_recent(limit=1000)
+    assert len(recent) == 500
+    assert recent[0][1] == "echo 499"
+
+def block_writer(manager, monkeypatch):
+    """Makes the writer thread wait on the returned event before storing anything."""
+    release = threading.Event()
+    store_output = manager._store_output
+
+    def slow_store_output(conn, output):
+        release.wait(5)
+        return store_output(conn, output)
+
+    monkeypatch.setattr(manager, "_store_output", slow_store_output)
+    return release
+
+def test_reads_do_not_wait_for_writer(history_manager, monkeypatch):
+    history_manager.add_entry("ls", 0, "")
+    history_manager.flush()
+    release = block_writer(history_manager, monkeypatch)
+    history_manager.add_entry("git status", 1, "fatal: not a git repository")
+    try:
+        start = time.monotonic()
+        recent = history_manager.get_recent()
+        found = history_manager.search("GIT")
+        assert time.monotonic() - start < 1.0
+        # Queued entries come first, without an id yet
+        assert [(row[0], row[1], row[3]) for row in recent[:1]] == [(None, "git status", 1)]
+        assert recent[1][1] == "ls"
+        assert [row[1] for row in found] == ["git status"]
+    finally:
+        release.set()
+    history_manager.flush()
+    recent = history_manager.get_recent()
+    # Written entries are reported once, with their id
+    assert [row[1] for row in recent] == ["git status", "ls"]
+    assert recent[0][0] is not None
+
+def test_history_cache_with_queued_entries(history_manager, monkeypatch):
+    for i in range(5):
+        history_manager.add_entry(f"cmd {i}", 0, "")
+    history_manager.flush()
+    release = block_writer(history_manager, monkeypatch)
+    for i in range(5, 8):
+        history_manager.add_entry(f"cmd {i}", 0, "")
+    try:
+        cache = HistoryCache(history_manager, page_size=2)
+    finally:
+        release.set()
+    history_manager.flush()
+    # Once written, the queued entries aren't paged in a second time
+    assert [cache[i] for i in range(8)] == [f"cmd {i}" for i in range(7, -1, -1)]
+    with pytest.raises(IndexError):
+        cache[8]
+
+def test_close_writes_pending(tmp_path):
+    db_path = str(tmp_path / "close.db")
+    manager = HistoryManager(db_path=db_path)
+    manager.add_entry("make build", 2, "error")
+    manager.close()
+
+    reopened = HistoryManager(db_path=db_path)
+    row = reopened.get_recent()[0]
+    assert row[1] == "make build"
+    assert row[3] == 2
+    reopened.close()
+
+def test_shared_database(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    first = HistoryManager(db_path=db_path)
+    second = HistoryManager(db_path=db_path)
+
+    first.add_entry("ls", 0, "")
+    second.add_entry("pwd", 0, "")
+    first.flush()
+    second.flush()
+
+    # Both instances see each other's writes (commit order between them isn't defined)
+    assert sorted(row[1] for row in first.get_recent()) == ["ls", "pwd"]
+    assert sorted(row[1] for row in second.get_recent()) == ["ls", "pwd"]
+    first.close()
+    second.close()
+
+def test_search_uses_fts_index(history_manager):
+    assert history_manager.fts_enabled
+    history_manager.add_entry("docker compose up", 0, "")
+    history_manager.add_entry("git log --oneline", 0, "")
+
+    # Substring match in the middle of a word, case-insensitive
+    results = history_manager.search("COMPOS")
+    assert [row[1] for row in results] == ["docker compose up"]
+
+def test_search_short_and_literal_queries(history_manager):
+    history_manager.add_entry("ls -la", 0, "")
+    history_manager.add_entry("echo 100%", 0, "")
+    history_manager.add_entry("echo a_b", 0, "")
+
+    assert [row[1] for row in history_manager.search("ls")] == ["ls -la"]
+    # LIKE wildcards in the query are matched literally
+    assert [row[1] for row in history_manager.search("%")] == ["echo 100%"]
+    assert [row[1] for row in history_manager.search("_")] == ["echo a_b"]
+    # Quotes can't break out of the FTS phrase
+    history_manager.add_entry('grep "foo bar" x', 0, "")
+    assert [row[1] for row in history_manager.search('"foo')] == ['grep "foo bar" x']
+
+def test_search_limit_newest_first(history_manager):
+    for i in range(30):
+        history_manager.add_entry(f"make target{i}", 0, "")
+
+    results = history_manager.search("make", limit=5)
+    assert [row[1] for row in results] == [f"make target{i}" for i in range(29, 24, -1)]
+
+def test_fts_backfills_existing_database(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            command TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            exit_code INTEGER,
+            output_snippet TEXT
+        )
+    """)
+    conn.execute("INSERT INTO history (command, exit_code) VALUES ('kubectl get pods', 0)")
+    conn.commit()
+    conn.close()
+
+    manager = HistoryManager(db_path=db_path)
+    assert [row[1] for row in manager.search("get pod")] == ["kubectl get pods"]
+    manager.close()
+
+def test_output_stored_compressed_and_deduplicated(history_manager):
+    output = "On branch main\nnothing to commit, working tree clean\n" * 100
+    history_manager.add_entry("git status", 0, output)
+    history_manager.add_entry("git status", 0, output)
+    history_manager.add_entry("true", 0, "")
+    history_manager.flush()
+
+    recent = history_manager.get_recent()
+    assert history_manager.get_output(recent[1][0]) == output
+    assert history_manager.get_output(recent[2][0]) == output
+    assert history_manager.get_output(recent[0][0]) is None
+
+    (count, stored), = history_manager._query("SELECT COUNT(*), SUM(LENGTH(data)) FROM outputs", ())
+    assert count == 1
+    assert stored < len(output)
+
+def test_legacy_inline_output_migrated(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            command TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            exit_code INTEGER,
+            output_snippet TEXT
+        )
+    """)
+    conn.execute("INSERT INTO history (command, exit_code, output_snippet) VALUES ('make', 2, 'error: boom')")
+    conn.commit()
+    conn.close()
+
+    manager = HistoryManager(db_path=db_path)
+    manager.add_entry("ls", 0, "")
+    manager.flush()
+    assert manager.get_output(1) == "error: boom"
+    assert manager._query("SELECT output_snippet FROM history WHERE id = 1", ()) == [(None,)]
+    assert manager._query("PRAGMA auto_vacuum", ()) == [(2,)]
+    manager.close()
+
+def test_retention_max_entries(tmp_path):
+    manager = HistoryManager(db_path=str(tmp_path / "h.db"), max_entries=5, retention_interval=1)
+    for i in range(12):
+        manager.add_entry(f"echo {i}", 0, f"output {i}")
+    manager.flush()
+
+    recent = manager.get_recent()
+    assert [row[1] for row in recent] == [f"echo {i}" for i in range(11, 6, -1)]
+    # Outputs of pruned entries are gone too
+    assert manager._query("SELECT COUNT(*) FROM outputs", ()) == [(5,)]
+    manager.close()
+
+def test_retention_output_budget(tmp_path):
+    manager = HistoryManager(db_path=str(tmp_path / "h.db"), max_output_bytes=64 * 1024, retention_interval=1)
+    for i in range(10):
+        manager.add_entry(f"cat blob{i}", 0, os.urandom(16 * 1024).hex())
+    manager.flush()
+
+    (stored,), = manager._query("SELECT SUM(LENGTH(data)) FROM outputs", ())
+    assert stored <= 64 * 1024
+    recent = manager.get_recent()
+    # Commands are kept; only the oldest outputs were dropped
+    assert len(recent) == 10
+    assert manager.get_output(recent[0][0]) is not None
+    assert manager.get_output(recent[-1][0]) is None
+    manager.close()
+
+def test_retention_runs_every_interval_and_on_close(tmp_path):
+    db_path = str(tmp_path / "h.db")
+    manager = HistoryManager(db_path=db_path, retention_interval=1000)
+    for i in range(6):
+        manager.add_entry(f"echo {i}", 0, "")
+    manager.close()
+
+    # Lowered limits apply on the first batch, then only every interval
+    manager = HistoryManager(db_path=db_path, max_entries=2, retention_interval=1000)
+    manager.add_entry("echo 6", 0, "")
+    manager.flush()
+    assert manager._query("SELECT COUNT(*) FROM history", ()) == [(2,)]
+    for i in range(7, 10):
+        manager.add_entry(f"echo {i}", 0, "")
+        manager.flush()
+    assert manager._query("SELECT COUNT(*) FROM history", ()) == [(5,)]
+    manager.close()
+
+    # And when the writer shuts down
+    reopened = HistoryManager(db_path=db_path)
+    assert [row[1] for row in reopened.get_recent()] == ["echo 9", "echo 8"]
+    reopened.close()
+
+def test_store_output_tolerates_concurrent_insert(history_manager):
+    class RacingConnection:
+        """Misses the stored output, as if another instance wrote it after the check."""
+        def __init__(self, conn):
+            self.conn = conn
+
+        def execute(self, sql, params=()):
+            if sql.startswith("SELECT 1 FROM outputs"):
+                return self.conn.execute("SELECT 1 WHERE 0")
+            return self.conn.execute(sql, params)
+
+    history_manager.add_entry("make", 2, "error: boom")
+    history_manager.flush()
+    conn = history_manager._connect()
+    digest = history_manager._store_output(RacingConnection(conn), "error: boom")
+    conn.commit()
+    conn.close()
+    assert history_manager._query("SELECT COUNT(*) FROM outputs WHERE hash = ?", (digest,)) == [(1,)]
+
+def test_get_before_keyset(history_manager):
+    for i in range(10):
+        history_manager.add_entry(f"cmd {i}", 0, "")
+    history_manager.flush()
+
+    first = history_manager.get_before(None, limit=4)
+    second = history_manager.get_before(first[-1][0], limit=4)
+    assert [row[1] for row in first] == ["cmd 9", "cmd 8", "cmd 7", "cmd 6"]
+    assert [row[1] for row in second] == ["cmd 5", "cmd 4", "cmd 3", "cmd 2"]
+
+def test_history_cache_pages_on_demand(history_manager):
+    for i in range(25):
+        history_manager.add_entry(f"cmd {i}", 0, "")
+    history_manager.flush()
+
+    cache = HistoryCache(history_manager, page_size=10)
+    assert len(cache) == 10
+    assert cache[0] == "cmd 24"
+    # Reaching past the loaded window pulls in older pages
+    assert cache[24] == "cmd 0"
+    assert cache.exhausted
+    with pytest.raises(IndexError):
+        cache[25]
+
+def test_history_cache_push_and_collapse(history_manager):
+    for command in ["ls", "make", "make", "ls"]:
+        history_manager.add_entry(command, 0, "")
+
+    cache = HistoryCache(history_manager, page_size=2)
+    assert [cache[i] for i in range(3)] == ["ls", "make", "ls"]
+
+    cache.push("ls")
+    cache.push("git status")
+    cache.push("git status")
+    history_manager.add_entry("git status", 0, "")
+
+    assert [cache[i] for i in range(4)] == ["git status", "ls", "make", "ls"]
+    with pytest.raises(IndexError):
+        cache[4]
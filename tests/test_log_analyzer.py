@@ -1,6 +1,6 @@
 import pytest
 import os
-from utils.log_analyzer import LogAnalyzer
+from utils.log_analyzer import LogAnalyzer, error_signature
 
 @pytest.fixture
 def analyzer():
@@ -11,7 +11,7 @@ def test_analyze_file_not_found(analyzer):
     assert "Error: File not found" in summary
     assert prompt == ""
 
-def test_analyze_file_too_large(analyzer, tmp_path):
+def test_analyze_file_no_size_limit(analyzer, tmp_path):
     # Create a dummy large file
     large_file = tmp_path / "large.log"
     with open(large_file, "wb") as f:
@@ -19,7 +19,8 @@ def test_analyze_file_too_large(analyzer, tmp_path):
         f.write(b"\0")
     
     summary, prompt = analyzer.analyze_file(str(large_file))
-    assert "Error: File too large" in summary
+    assert "No obvious errors" in summary
+    assert prompt == ""
 
 def test_extract_error_chunk(analyzer, tmp_path):
     log_file = tmp_path / "error.log"
@@ -63,3 +64,375 @@ def test_clean_log(analyzer, tmp_path):
     summary, prompt = analyzer.analyze_file(str(log_file))
     assert "No obvious errors" in summary
     assert prompt == ""
+
+def test_query_takes_first_match_with_context(analyzer, tmp_path):
+    log_file = tmp_path / "context.log"
+    lines = [f"line {i}\n" for i in range(100)]
+    lines[30] = "first Needle\n"
+    lines[60] = "second needle\n"
+    log_file.write_text("".join(lines))
+
+    summary, prompt = analyzer.analyze_file(str(log_file), query="NEEDLE")
+    chunk = prompt.split("```text\n")[1].split("\n```")[0]
+    # CONTEXT_LINES before the match through CONTEXT_LINES - 1 after it
+    assert chunk.splitlines() == [line.strip() for line in lines[10:50]]
+
+def test_keyword_takes_last_match(analyzer, tmp_path):
+    log_file = tmp_path / "keywords.log"
+    lines = [f"line {i}\n" for i in range(100)]
+    lines[20] = "Error: old\n"
+    lines[95] = "FATAL: recent\n"
+    log_file.write_text("".join(lines))
+
+    summary, prompt = analyzer.analyze_file(str(log_file), query="not present")
+    chunk = prompt.split("```text\n")[1].split("\n```")[0]
+    assert chunk.splitlines() == [line.strip() for line in lines[75:100]]
+
+def test_gzip_log(analyzer, tmp_path):
+    import gzip
+    log_file = tmp_path / "app.log.gz"
+    with gzip.open(log_file, "wt") as f:
+        f.write("INFO ok\n" * 1000 + "Exception: boom\n")
+
+    summary, prompt = analyzer.analyze_file(str(log_file))
+    assert "Exception: boom" in prompt
+
+def _reference_chunk(text, query, keywords):
+    # The original list-based algorithm
+    lines = text.splitlines(keepends=True)
+    target = -1
+    if query:
+        target = next((i for i, line in enumerate(lines) if query.lower() in line.lower()), -1)
+    if target == -1:
+        target = next((i for i in range(len(lines) - 1, -1, -1)
+                       if any(k.lower() in lines[i].lower() for k in keywords)), -1)
+    if target == -1:
+        return ""
+    return "".join(lines[max(0, target - 20):target + 20])
+
+def test_block_scans_match_reference(analyzer):
+    import io
+    import random
+    rng = random.Random(1)
+    words = ["info", "ok", "Error here", "done", "", "x" * 50, "ÉCHEC total", "FATAL crash", "needle"]
+    # A tiny block size puts lines across many block boundaries
+    analyzer.BLOCK_SIZE = 7
+    for _ in range(200):
+        text = "\n".join(rng.choice(words) for _ in range(rng.randrange(1, 80)))
+        if rng.random() < 0.5:
+            text += "\n"
+        data = text.encode()
+        expected = _reference_chunk(text, None, analyzer.ERROR_KEYWORDS)
+        assert analyzer._extract_last_error(io.BytesIO(data))[0] == expected
+        assert analyzer._extract_relevant_chunk(analyzer._iter_blocks(io.BytesIO(data)), None)[0] == expected
+        for query in ["NEEDLE", "échec", "missing"]:
+            expected = _reference_chunk(text, query, analyzer.ERROR_KEYWORDS)
+            assert analyzer._extract_relevant_chunk(analyzer._iter_blocks(io.BytesIO(data)), query)[0] == expected
+
+def test_custom_keywords_and_severity(tmp_path):
+    analyzer = LogAnalyzer(keywords={"OOMKilled": "critical", "retrying": "warning"})
+    log_file = tmp_path / "pod.log"
+    log_file.write_text("Error: ignored\nretrying in 5s\npod oomkilled\nok\n")
+
+    summary, prompt = analyzer.analyze_file(str(log_file))
+    assert "severity: critical" in summary
+    assert "pod oomkilled" in prompt
+
+    with pytest.raises(ValueError):
+        LogAnalyzer(keywords={"oops": "bad"})
+
+def test_error_far_from_end(analyzer, tmp_path):
+    log_file = tmp_path / "far.log"
+    with open(log_file, "w") as f:
+        f.write("INFO boot\n" * 1000)
+        f.write("Traceback (most recent call last):\n")
+        # 1.5 MB of clean output after the error
+        f.write(("INFO " + "y" * 95 + "\n") * 15 * 1024)
+
+    summary, prompt = analyzer.analyze_file(str(log_file))
+    assert "Traceback (most recent call last):" in prompt
+
+def test_parallel_scan_matches_serial(tmp_path):
+    import random
+    rng = random.Random(7)
+    lines = [f"INFO step {i} {'z' * rng.randrange(0, 40)}\n" for i in range(5000)]
+    lines[700] = "Caused by: early failure\n"
+    lines[1200] = "marker one\n"
+    lines[3900] = "MARKER two\n"
+    # Repeats spread over every range, so clusters have to be merged across workers
+    for i in range(100, 5000, 450):
+        lines[i] = f"Error: timeout after {i}ms (request {i * 7919:x}abcdef01)\n"
+    log_file = tmp_path / "big.log"
+    log_file.write_text("".join(lines))
+
+    serial = LogAnalyzer(parallel_threshold=None)
+    parallel = LogAnalyzer(parallel_threshold=1, workers=3)
+    for analyzer in (serial, parallel):
+        analyzer.BLOCK_SIZE = 1000
+    splits = []
+    parallel._split_ranges = lambda mm, count, *bounds: splits.append(count) or LogAnalyzer._split_ranges(mm, count, *bounds)
+
+    for query in [None, "marker", "not there"]:
+        assert parallel.analyze_file(str(log_file), query) == serial.analyze_file(str(log_file), query)
+    report = parallel.analyze(str(log_file))
+    assert report.clusters == serial.analyze(str(log_file)).clusters
+    assert [cluster.count for cluster in report.clusters] == [1, 11]
+    assert (report.clusters[1].first_line, report.clusters[1].last_line) == (101, 4601)
+    # Without the digest, the last error is found near the end
+    assert "timeout after 4600ms" in parallel.analyze(str(log_file), digest=False).chunk
+    # The queries and the full digest scans went through the process pool
+    assert splits == [3, 3, 3, 3, 3]
+
+
+def test_error_signature_masks_volatile_parts():
+    first = error_signature("2024-05-01T10:00:00.123Z ERROR req 3f2a9c81d0 failed in /srv/app/db.py after 30s (0x7f3a)")
+    second = error_signature("2024-05-02 11:22:33,999 ERROR req 99bb00aa11 failed in /opt/app/db.py after 45s (0xdead)")
+    assert first == second == "<TS> ERROR req <HEX> failed in <PATH> after <N>s (<HEX>)"
+    assert error_signature("Error: job 550e8400-e29b-41d4-a716-446655440000 at 12:00:01") == "Error: job <UUID> at <TS>"
+    # Words and the rest of the message are kept
+    assert error_signature("Error: connection refused") != error_signature("Error: permission denied")
+
+
+def test_digest_ranks_rare_root_cause_first(analyzer, tmp_path):
+    lines = []
+    for i in range(5000):
+        lines.append(f"2024-05-01 10:{i % 60:02d}:00 Error: upstream timeout after {i % 7 + 1}s\n")
+        if i == 1234:
+            lines.append("2024-05-01 10:34:00 Error: disk quota exceeded on /var/lib/db\n")
+    log_file = tmp_path / "noisy.log"
+    log_file.write_text("".join(lines))
+
+    report = analyzer.analyze(str(log_file))
+    assert [cluster.count for cluster in report.clusters] == [1, 5000]
+    root_cause = report.clusters[0]
+    assert "disk quota exceeded" in root_cause.sample
+    assert root_cause.first_line == 1236
+    assert "2 distinct error(s) in 5001 line(s)" in report.summary
+    assert report.digest.splitlines()[1].startswith("1. [error] x1, line 1236: ")
+    assert "[Error Digest]" in report.prompt
+    assert report.log_excerpt.startswith("[Error Digest]\n")
+    # The excerpt is still the last error
+    assert "upstream timeout" in report.chunk.splitlines()[-1]
+
+
+def test_digest_severity_outranks_rarity(analyzer):
+    report = analyzer.analyze_text("Error: a\nPanic: b\nPanic: b\nError: c\n")
+    assert [(cluster.severity, cluster.count) for cluster in report.clusters] == [
+        ("critical", 2), ("error", 1), ("error", 1)
+    ]
+    assert analyzer.analyze_text("Error: a\n", digest=False).digest == ""
+
+
+def test_unknown_severity_ranks_last():
+    from utils.log_analyzer import ErrorClusters
+    clusters = ErrorClusters()
+    clusters.add("Fehler: unknown", None, 1, 0)
+    clusters.add("Warning: low disk", "warning", 2, 16)
+    assert [cluster.severity for cluster in clusters.ranked()] == ["warning", None]
+    assert "Fehler: unknown" in clusters.digest()
+
+    # Merging reports across files ranks it the same way
+    unknown = clusters.ranked()[1]
+    assert LogAnalyzer._group_rank([unknown]) > LogAnalyzer._group_rank([clusters.ranked()[0]])
+
+
+@pytest.mark.parametrize("suffix,opener", [
+    (".bz2", "bz2"),
+    (".xz", "lzma"),
+    # Misleading name: the format comes from the magic bytes
+    (".log", "gzip"),
+])
+def test_compressed_logs(analyzer, tmp_path, suffix, opener):
+    import importlib
+    content = "INFO ok\n" * 1000 + "Exception: boom\n" + "INFO after\n" * 5
+    plain = tmp_path / "plain.log"
+    plain.write_text(content)
+    log_file = tmp_path / f"app{suffix}"
+    with importlib.import_module(opener).open(log_file, "wt") as f:
+        f.write(content)
+
+    report = analyzer.analyze(str(log_file))
+    assert report.chunk == analyzer.analyze(str(plain)).chunk
+    assert "Exception: boom" in report.chunk
+
+
+def test_zstd_log(analyzer, tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    log_file = tmp_path / "app.log.zst"
+    log_file.write_bytes(zstandard.ZstdCompressor().compress(b"INFO ok\n" * 1000 + b"Fatal: boom\n"))
+    assert "Fatal: boom" in analyzer.analyze(str(log_file)).chunk
+
+
+def test_zstd_without_zstandard(analyzer, tmp_path, monkeypatch):
+    import utils.log_analyzer as log_analyzer
+    monkeypatch.setattr(log_analyzer, "zstandard", None)
+    log_file = tmp_path / "app.log.zst"
+    log_file.write_bytes(b"\x28\xb5\x2f\xfd" + b"\x00" * 20)
+    summary = analyzer.analyze(str(log_file)).summary
+    assert summary.startswith("Error reading file:") and "zstandard" in summary
+
+
+def test_rotation_set_is_chronological(tmp_path):
+    from utils.log_analyzer import rotation_set
+    for name in ["app.log", "app.log.1", "app.log.2.gz", "app.log.10.gz", "app.log.bak", "other.log.1", "app.logger.1"]:
+        (tmp_path / name).write_text("")
+    names = [os.path.basename(path) for path in rotation_set(str(tmp_path / "app.log"))]
+    assert names == ["app.log.10.gz", "app.log.2.gz", "app.log.1", "app.log"]
+
+    for name in ["web.log", "web.log-20240502.gz", "web.log-20240501"]:
+        (tmp_path / name).write_text("")
+    names = [os.path.basename(path) for path in rotation_set(str(tmp_path / "web.log"))]
+    assert names == ["web.log-20240501", "web.log-20240502.gz", "web.log"]
+
+
+def test_analyze_rotated_as_one_stream(analyzer, tmp_path):
+    import bz2
+    import gzip
+    with gzip.open(tmp_path / "app.log.2.gz", "wt") as f:
+        f.write("INFO old\nError: disk full\n")
+    # No trailing newline: must not join with the next file's first line
+    with bz2.open(tmp_path / "app.log.1", "wt") as f:
+        f.write("Error: disk full\nINFO middle")
+    (tmp_path / "app.log").write_text("Error: cache miss\nINFO new\n")
+
+    report = analyzer.analyze_rotated(str(tmp_path / "app.log"))
+    by_sample = {cluster.sample: cluster for cluster in report.clusters}
+    disk = by_sample["Error: disk full"]
+    assert (disk.count, disk.first_line, disk.last_line) == (2, 2, 3)
+    assert by_sample["Error: cache miss"].first_line == 5
+    assert report.digest.startswith("3 file(s), oldest first: app.log.2.gz from line 1, app.log.1 from line 3, app.log from line 5")
+    assert "INFO middle\nError: cache miss" in report.chunk
+
+    assert analyzer.analyze_rotated(str(tmp_path / "missing.log")).summary.startswith("Error: File not found")
+
+
+def test_parse_timestamp():
+    from datetime import datetime
+    from utils.log_analyzer import parse_timestamp
+    assert parse_timestamp("2024-05-01 10:00:01,250 Error: x") == datetime(2024, 5, 1, 10, 0, 1, 250000)
+    # Offsets are normalized to UTC
+    assert parse_timestamp("[2024-05-01T12:00:00+02:00] Error") == datetime(2024, 5, 1, 10, 0, 0)
+    assert parse_timestamp("2024/05/01 10:00:00 Error") == datetime(2024, 5, 1, 10, 0, 0)
+    assert parse_timestamp("Error: no time here") is None
+    assert parse_timestamp("2024-13-45 10:00:00 Error") is None
+
+
+def test_expand_log_paths(tmp_path):
+    from utils.log_analyzer import expand_log_paths
+    (tmp_path / "sub").mkdir()
+    for name in ["b.log", "a.log", "notes.txt", ".hidden", "sub/c.log"]:
+        (tmp_path / name).write_text("")
+    names = lambda paths: [os.path.relpath(path, tmp_path) for path in paths]
+    assert names(expand_log_paths(str(tmp_path / "*.log"))) == ["a.log", "b.log"]
+    assert names(expand_log_paths(str(tmp_path / "**" / "*.log"))) == ["a.log", "b.log", os.path.join("sub", "c.log")]
+    assert names(expand_log_paths(str(tmp_path))) == ["a.log", "b.log", "notes.txt"]
+    assert expand_log_paths("plain.log") == ["plain.log"]
+
+
+def test_analyze_many_merges_and_ranks(analyzer, tmp_path):
+    for worker in range(4):
+        lines = [f"2024-05-01 10:00:{i:02d} Error: upstream timeout after {i}s\n" for i in range(worker * 10, worker * 10 + 10)]
+        if worker == 2:
+            lines.insert(4, "2024-05-01 09:59:00 Error: connection pool exhausted\n")
+        if worker == 3:
+            lines.append("2024-05-01 10:05:00 Fatal: out of memory\n")
+        (tmp_path / f"worker-{worker}.log").write_text("".join(lines))
+    (tmp_path / "quiet.log").write_text("INFO fine\n")
+    (tmp_path / "broken.log").mkdir()
+    paths = sorted(str(path) for path in tmp_path.iterdir())
+
+    report = analyzer.analyze_many(paths, source_name="logs/*")
+    assert report.summary.startswith("Analysis complete. Found potential issues in 4 of 6 file(s) (severity: critical).")
+    assert "3 distinct error(s) in 42 line(s)." in report.summary
+    assert "Could not read broken.log" in report.summary
+
+    digest = report.digest.splitlines()
+    assert digest[0] == "3 distinct error(s) in 42 matching line(s) across 4 of 6 file(s), most severe and rarest first:"
+    assert digest[1] == "1. [critical] x1, worker-3.log line 11: 2024-05-01 10:05:00 Fatal: out of memory"
+    assert digest[2] == "2. [error] x1, worker-2.log line 5: 2024-05-01 09:59:00 Error: connection pool exhausted"
+    assert digest[3].startswith("3. [error] x40, worker-0.log lines 1-10, worker-1.log lines 1-10, worker-2.log lines 1-11, +1 more file(s): ")
+    # Timeline: the pool exhaustion came first
+    timeline = digest[digest.index("First occurrences by time:") + 1:]
+    assert timeline[0] == "- worker-2.log: 2024-05-01 09:59:00 Error: connection pool exhausted"
+    assert timeline[-1] == "- worker-3.log: 2024-05-01 10:05:00 Fatal: out of memory"
+
+    # The excerpt is from the file with the top-ranked error
+    assert report.chunk.startswith("==> worker-3.log <==\n")
+    assert "Fatal: out of memory" in report.chunk
+    assert "logs/*" in report.prompt
+    assert {cluster.source for cluster in report.clusters} == {path for path in paths if "worker" in path}
+
+
+def test_analyze_many_without_matches(analyzer, tmp_path):
+    (tmp_path / "a.log").write_text("INFO ok\n")
+    (tmp_path / "b.log").write_text("INFO ok\n")
+    report = analyzer.analyze_many([str(tmp_path / "a.log"), str(tmp_path / "b.log")])
+    assert report.summary == "No obvious errors or matching lines found in 2 file(s)."
+    assert analyzer.analyze_many([], source_name="*.log").summary == "Error: No files match *.log"
+
+def test_estimate_tokens_and_truncate_middle():
+    from utils.log_analyzer import estimate_tokens, truncate_middle
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    # Non-ASCII characters count one token each
+    assert estimate_tokens("日本語ab") == 4
+
+    assert truncate_middle("short", 10) == "short"
+    cut = truncate_middle("a" * 50 + "b" * 50, 20)
+    assert cut.startswith("a" * 10) and cut.endswith("b" * 10)
+    assert "[80 chars cut]" in cut
+
+def test_prompt_budget_cuts_long_lines(tmp_path):
+    from utils.log_analyzer import estimate_tokens
+    budget = 2000
+    analyzer = LogAnalyzer(prompt_budget=budget)
+    log_file = tmp_path / "json.log"
+    payload = '{"data": "' + "x" * 50000 + '"}'
+    lines = [f"INFO request {i} {payload}\n" for i in range(30)]
+    lines.insert(20, "Error: upstream returned 502 for /api/orders\n")
+    log_file.write_text("".join(lines))
+
+    report = analyzer.analyze(str(log_file))
+    assert "Error: upstream returned 502" in report.chunk
+    assert "chars cut]" in report.chunk
+    assert estimate_tokens(report.log_excerpt) <= budget
+    assert len(report.prompt) < 4 * budget + 2000
+
+def test_prompt_budget_grows_context(tmp_path):
+    log_file = tmp_path / "trace.log"
+    frames = "".join(f'  File "app/module{i}.py", line {i}, in handler{i}\n    step{i}()\n' for i in range(30))
+    log_file.write_text("INFO boot\n" * 100 + "Traceback (most recent call last):\n" + frames + "ValueError: bad input\nINFO after\n")
+
+    fixed = LogAnalyzer().analyze(str(log_file))
+    assert "Traceback" not in fixed.chunk
+    budgeted = LogAnalyzer(prompt_budget=4000).analyze(str(log_file))
+    # The whole traceback fits, and the error line is still there
+    assert "Traceback (most recent call last):" in budgeted.chunk
+    assert "ValueError: bad input" in budgeted.chunk
+    assert "INFO after" in budgeted.chunk
+    # Small budgets keep the error line and the lines just before it
+    small = LogAnalyzer(prompt_budget=500).analyze(str(log_file))
+    assert "ValueError: bad input" in small.chunk
+    assert "step29()" in small.chunk
+    assert len(small.chunk) < len(budgeted.chunk)
+
+def test_prompt_budget_covers_merged_report(tmp_path):
+    from utils.log_analyzer import estimate_tokens
+    budget = 2000
+    analyzer = LogAnalyzer(prompt_budget=budget, parallel_threshold=None)
+    paths = []
+    for worker in range(6):
+        lines = [f"INFO worker {worker} handled request {i} " + "k=v " * 40 + "\n" for i in range(300)]
+        for i in range(8):
+            lines.insert(i * 30 + 10, f"2024-05-01 10:0{i}:00 Error: worker {worker} failed step {i} " + "detail " * 30 + "\n")
+        lines.insert(250, f"Fatal: worker {worker} out of memory\n")
+        path = tmp_path / f"worker-{worker}.log"
+        path.write_text("".join(lines))
+        paths.append(str(path))
+
+    report = analyzer.analyze_many(paths, source_name="logs/*")
+    assert estimate_tokens(report.log_excerpt) <= budget - LogAnalyzer.PROMPT_OVERHEAD_TOKENS
+    # The top-ranked errors and the excerpt's error line survive the cut
+    assert report.digest.splitlines()[1].startswith("1. [critical]")
+    assert "Fatal: worker" in report.chunk.splitlines()[report.focus]
@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from utils.log_analyzer import LogAnalyzer
+from utils.log_follower import InotifyWatcher, LogFollower, PollingWatcher, make_watcher
+
+
+class Recorder:
+    def __init__(self):
+        self.incidents = []
+        self.repeats = 0
+        self.summaries = []
+        self.notices = []
+
+    def on_incidents(self, clusters, repeats):
+        self.incidents.extend((cluster.first_line, cluster.sample) for cluster in clusters)
+        self.repeats += repeats
+
+    def on_summary(self, digest, excerpt):
+        self.summaries.append((digest, excerpt))
+
+    def on_notice(self, message):
+        self.notices.append(message)
+
+
+def make_follower(path, recorder, **kwargs):
+    return LogFollower(
+        str(path),
+        LogAnalyzer(parallel_threshold=None),
+        recorder.on_incidents,
+        on_summary=recorder.on_summary,
+        on_notice=recorder.on_notice,
+        **kwargs,
+    )
+
+
+def append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def test_reports_only_new_lines(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("INFO start\nError: old failure\n")
+    recorder = Recorder()
+    follower = make_follower(log_file, recorder)
+    follower.poll()
+    assert recorder.incidents == []
+
+    append(log_file, "INFO ok\nError: disk full on /dev/sda1\nError: disk full on /dev/sdb1\n")
+    assert follower.poll()
+    # Same signature: one incident, one repeat
+    assert recorder.incidents == [(4, "Error: disk full on /dev/sda1")]
+    assert recorder.repeats == 1
+
+    assert not follower.poll()
+    append(log_file, "Error: disk full on /dev/sdc1\nPanic: kernel")
+    follower.poll()
+    assert recorder.repeats == 2
+    # The unterminated line is only matched once it is complete
+    assert len(recorder.incidents) == 1
+    append(log_file, " oops\n")
+    follower.poll()
+    assert recorder.incidents[-1] == (7, "Panic: kernel oops")
+
+
+def test_rotation_and_truncation(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("INFO start\n")
+    recorder = Recorder()
+    follower = make_follower(log_file, recorder)
+    follower.poll()
+
+    # Lines written just before the rotation are still read from the old file
+    append(log_file, "Error: before rotation\n")
+    os.rename(log_file, tmp_path / "app.log.1")
+    log_file.write_text("Error: after rotation\n")
+    follower.poll()
+    assert recorder.incidents == [(2, "Error: before rotation"), (1, "Error: after rotation")]
+    assert "rotated" in recorder.notices[0]
+
+    log_file.write_text("")
+    follower.poll()
+    append(log_file, "Fatal: after truncation\n")
+    follower.poll()
+    assert recorder.incidents[-1] == (1, "Fatal: after truncation")
+    assert "truncated" in recorder.notices[-1]
+
+
+def test_file_created_later_is_read_from_start(tmp_path):
+    log_file = tmp_path / "late.log"
+    recorder = Recorder()
+    follower = make_follower(log_file, recorder)
+    assert not follower.poll()
+    log_file.write_text("Error: first line\n")
+    follower.poll()
+    assert recorder.incidents == [(1, "Error: first line")]
+
+
+def test_burst_of_errors_gives_one_summary(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("")
+    recorder = Recorder()
+    follower = make_follower(log_file, recorder, debounce=0.3, max_delay=5.0, poll_interval=0.05)
+    thread = threading.Thread(target=follower.run)
+    thread.start()
+    try:
+        time.sleep(0.1)
+        for i in range(20):
+            append(log_file, f"Error: request {i} failed\nException: handler {i} crashed\n")
+            time.sleep(0.01)
+        deadline = time.monotonic() + 3
+        while not recorder.summaries and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.4)
+    finally:
+        follower.stop()
+        thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(recorder.summaries) == 1
+    digest, excerpt = recorder.summaries[0]
+    assert "2 distinct error(s)" in digest
+    # Context of where the incidents appeared
+    assert "handler 0 crashed" in excerpt
+    assert recorder.repeats == 38
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_watcher(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("")
+    watcher = make_watcher(str(log_file))
+    assert isinstance(watcher, InotifyWatcher)
+    try:
+        assert not watcher.wait(0.05)
+        # Other files in the directory don't wake it
+        (tmp_path / "other.log").write_text("x\n")
+        assert not watcher.wait(0.05)
+        append(log_file, "line\n")
+        assert watcher.wait(1.0)
+        assert not watcher.wait(0.05)
+    finally:
+        watcher.close()
+
+
+def test_polling_watcher_always_reports_change():
+    watcher = PollingWatcher(interval=0.01)
+    start = time.monotonic()
+    assert watcher.wait(5.0)
+    assert time.monotonic() - start < 1.0
+
+
+def test_signature_memory_is_bounded_lru(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text("")
+    recorder = Recorder()
+    follower = make_follower(log_file, recorder)
+    follower.MAX_SIGNATURES = 5
+    follower.poll()
+
+    append(log_file, "Error: hot path failed\n")
+    follower.poll()
+    for i in range(20):
+        # A new kind of error each time, with the recurring one in between
+        append(log_file, f"Error: {'abcdefghijklmnopqrst'[i]} subsystem down\nError: hot path failed\n")
+        follower.poll()
+    assert len(follower._seen) == 5
+    # The recurring error is never reported as new, however many others came
+    assert [sample for _, sample in recorder.incidents].count("Error: hot path failed") == 1
+    assert recorder.repeats == 20
@@ -0,0 +1,143 @@
+import os
+
+import pytest
+
+from utils.log_analyzer import LogAnalyzer
+from utils.log_index import LogIndex
+
+
+def make_log(start, count):
+    lines = []
+    for i in range(start, start + count):
+        if i % 10 == 3:
+            lines.append(f"2024-05-01 10:00:{i % 60:02d} Error: timeout after {i}ms\n")
+        elif i % 250 == 7:
+            lines.append(f"Panic: worker {i} crashed\n")
+        else:
+            lines.append(f"INFO step {i}\n")
+    return "".join(lines)
+
+
+@pytest.fixture
+def indexed(tmp_path):
+    analyzer = LogAnalyzer(parallel_threshold=None, index=LogIndex(str(tmp_path / "index")))
+    analyzer.BLOCK_SIZE = 512
+    # Offsets where forward scans started
+    analyzer.scans = []
+    forward_scan = analyzer._forward_scan
+
+    def spy(blocks, query, clusters=None, offset=0):
+        analyzer.scans.append(offset)
+        return forward_scan(blocks, query, clusters, offset)
+
+    analyzer._forward_scan = spy
+    return analyzer
+
+
+def assert_matches_full_scan(report, log_file):
+    full = LogAnalyzer(parallel_threshold=None).analyze(str(log_file))
+    assert report.summary == full.summary
+    assert report.chunk == full.chunk
+    assert report.clusters == full.clusters
+
+
+def test_reanalysis_scans_only_appended_bytes(indexed, tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(make_log(0, 1000))
+    assert_matches_full_scan(indexed.analyze(str(log_file)), log_file)
+    assert indexed.scans == [0]
+
+    # Unchanged file: nothing is scanned
+    indexed.scans.clear()
+    assert_matches_full_scan(indexed.analyze(str(log_file)), log_file)
+    assert indexed.scans == []
+
+    size = log_file.stat().st_size
+    with open(log_file, "a") as f:
+        f.write(make_log(1000, 500))
+    indexed.scans.clear()
+    report = indexed.analyze(str(log_file))
+    assert_matches_full_scan(report, log_file)
+    assert indexed.scans == [size]
+    timeouts = [cluster for cluster in report.clusters if "timeout" in cluster.sample][0]
+    assert (timeouts.count, timeouts.first_line, timeouts.last_line) == (150, 4, 1494)
+
+
+def test_unterminated_last_line_is_not_indexed(indexed, tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(make_log(0, 100) + "Error: half written")
+    assert "half written" in indexed.analyze(str(log_file)).chunk
+
+    with open(log_file, "a") as f:
+        f.write(" line\nINFO done\n")
+    report = indexed.analyze(str(log_file))
+    assert_matches_full_scan(report, log_file)
+    assert "Error: half written line" in report.digest
+
+
+def test_truncation_and_rotation_rebuild_the_index(indexed, tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(make_log(0, 1000))
+    indexed.analyze(str(log_file))
+
+    # Truncated (copytruncate) and rewritten
+    log_file.write_text(make_log(5000, 100))
+    indexed.scans.clear()
+    assert_matches_full_scan(indexed.analyze(str(log_file)), log_file)
+    assert indexed.scans == [0]
+
+    # Rotated: a new file, bigger than the old one, takes its place
+    os.rename(log_file, tmp_path / "app.log.1")
+    log_file.write_text(make_log(9000, 2000))
+    indexed.scans.clear()
+    assert_matches_full_scan(indexed.analyze(str(log_file)), log_file)
+    assert indexed.scans == [0]
+
+
+def test_rewritten_past_old_size_is_detected(indexed, tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(make_log(0, 100))
+    indexed.analyze(str(log_file))
+
+    # Same inode, grew past the indexed size, but the indexed bytes changed
+    with open(log_file, "r+") as f:
+        f.write("Fatal: rewritten\n" + make_log(0, 200))
+    indexed.scans.clear()
+    report = indexed.analyze(str(log_file))
+    assert_matches_full_scan(report, log_file)
+    assert indexed.scans == [0]
+    assert "Fatal: rewritten" in report.digest
+
+
+def test_index_entry_survives_restart_and_keyword_change(tmp_path):
+    log_file = tmp_path / "app.log"
+    log_file.write_text(make_log(0, 300))
+    index_dir = str(tmp_path / "index")
+    LogAnalyzer(parallel_threshold=None, index=LogIndex(index_dir)).analyze(str(log_file))
+    assert len(os.listdir(index_dir)) == 1
+
+    with open(log_file, "a") as f:
+        f.write("WARN: disk almost full\n")
+    custom = LogAnalyzer({"Error": "error", "WARN": "warning"}, parallel_threshold=None, index=LogIndex(index_dir))
+    report = custom.analyze(str(log_file))
+    # Built with other keywords, so the entry was rebuilt rather than extended
+    assert report.clusters == LogAnalyzer({"Error": "error", "WARN": "warning"}, parallel_threshold=None).analyze(str(log_file)).clusters
+    assert not any("Panic" in cluster.sample for cluster in report.clusters)
+
+
+def test_excluded_dirs_are_not_indexed(tmp_path):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    index = LogIndex(str(tmp_path / "index"), exclude_dirs=[str(spill_dir)])
+    analyzer = LogAnalyzer(parallel_threshold=None, index=index)
+    spilled = spill_dir / "output-1.log"
+    spilled.write_text(make_log(0, 100))
+    kept = tmp_path / "app.log"
+    kept.write_text(make_log(0, 100))
+
+    assert_matches_full_scan(analyzer.analyze(str(spilled)), spilled)
+    assert not (tmp_path / "index").exists()
+    analyzer.analyze(str(kept))
+    assert len(os.listdir(tmp_path / "index")) == 1
+    # A sibling directory sharing the prefix is not excluded
+    assert not index.excluded(str(tmp_path / "spill2" / "x.log"))
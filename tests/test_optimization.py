@@ -3,6 +3,7 @@ import asyncio
 import os
 from utils.commander import execute_command
 from utils.log_analyzer import LogAnalyzer
+from utils.capture import OutputBuffer
 
 @pytest.mark.asyncio
 async def test_execute_command_truncation():
@@ -20,6 +21,59 @@ async def test_execute_command_truncation():
     # We expect the end of the string to be preserved
     assert output.strip().endswith("67890")
 
+@pytest.mark.asyncio
+async def test_execute_command_truncation_counts_bytes():
+    # 6 two-byte characters = 12 bytes, more than the 10 byte limit
+    cmd = "printf 'éééééé'"
+
+    async def noop(text):
+        pass
+
+    exit_code, output = await execute_command(cmd, noop, max_buffer_size=10)
+    assert len(output.encode("utf-8")) <= 10
+    assert output == "ééééé"
+
+def test_output_buffer_tiny():
+    buffer = OutputBuffer(max_bytes=10)
+    for ch in "abcdefghijklmnopqrstuvwxyz":
+        buffer.append(ch)
+    assert buffer.getvalue() == "qrstuvwxyz"
+    assert buffer.truncated
+    assert len(buffer) == 10
+    assert buffer.total_bytes == 26
+
+def test_output_buffer_not_truncated():
+    buffer = OutputBuffer(max_bytes=10)
+    buffer.append("hello")
+    assert buffer.getvalue() == "hello"
+    assert not buffer.truncated
+
+def test_output_buffer_single_chunk_larger_than_window():
+    buffer = OutputBuffer(max_bytes=4)
+    buffer.append("ab")
+    buffer.append("0123456789")
+    assert buffer.getvalue() == "6789"
+    buffer.append("x")
+    assert buffer.getvalue() == "789x"
+
+def test_output_buffer_multibyte_boundary():
+    buffer = OutputBuffer(max_bytes=5)
+    buffer.append("€€")  # 6 bytes; the window starts inside the first €
+    assert buffer.getvalue() == "€"
+
+def test_output_buffer_default_size():
+    buffer = OutputBuffer()
+    assert buffer.max_bytes == 1024 * 1024
+    line = "x" * 99 + "\n"
+    for i in range(30000):  # ~3 MB total
+        buffer.append(line)
+    buffer.append("END\n")
+    value = buffer.getvalue()
+    assert len(value.encode("utf-8")) == 1024 * 1024
+    assert value.endswith("END\n")
+    # Whole chunks outside the window are dropped as we go
+    assert len(buffer._chunks) <= 1024 * 1024 // len(line) + 2
+
 def test_analyze_large_file(tmp_path):
     analyzer = LogAnalyzer()
     large_file = tmp_path / "large.log"
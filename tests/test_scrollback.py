@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from rich.text import Text
+from tui.scrollback import LineBuffer
+
+def plain_lines(buffer):
+    return [buffer[i].plain for i in range(len(buffer))]
+
+def test_write_splits_lines():
+    buffer = LineBuffer()
+    buffer.write(Text("one\ntwo\n"))
+    assert plain_lines(buffer) == ["one", "two"]
+    assert not buffer.open
+
+def test_partial_line_is_extended():
+    buffer = LineBuffer()
+    buffer.write(Text("progress: "))
+    assert buffer.open
+    first_changed, evicted = buffer.write(Text("done\nnext"))
+    assert plain_lines(buffer) == ["progress: done", "next"]
+    assert first_changed == 0
+    assert evicted == 0
+
+def test_terminate_starts_fresh_line():
+    buffer = LineBuffer()
+    buffer.write(Text("no newline"))
+    buffer.terminate()
+    buffer.write(Text("banner\n"))
+    assert plain_lines(buffer) == ["no newline", "banner"]
+
+def test_line_cap_evicts_oldest():
+    buffer = LineBuffer(max_lines=3)
+    for i in range(10):
+        buffer.write(Text(f"line {i}\n"))
+    assert plain_lines(buffer) == ["line 7", "line 8", "line 9"]
+    assert buffer.dropped == 7
+
+def test_byte_cap_evicts_oldest():
+    buffer = LineBuffer(max_bytes=10)
+    buffer.write(Text("aaaa\nbbbb\ncccc\n"))
+    assert plain_lines(buffer) == ["bbbb", "cccc"]
+    assert buffer.total_bytes == 8
+
+def test_byte_cap_counts_utf8_bytes():
+    buffer = LineBuffer(max_bytes=8)
+    buffer.write(Text("ééé\nab\n"))  # 6 bytes + 2 bytes
+    assert buffer.total_bytes == 8
+    buffer.write(Text("c\n"))
+    assert plain_lines(buffer) == ["ab", "c"]
+
+def test_line_over_cap_is_wrapped_and_evicted():
+    buffer = LineBuffer(max_bytes=4)
+    buffer.write(Text("x" * 100))
+    assert plain_lines(buffer) == ["xxxx"]
+    assert buffer.total_bytes == 4
+
+def test_long_line_wraps_at_character_boundary():
+    buffer = LineBuffer(max_line_bytes=5)
+    buffer.write(Text("ab"))
+    buffer.write(Text("éééé\n"))  # 2 bytes each
+    assert plain_lines(buffer) == ["abé", "éé", "é"]
+    assert buffer.total_bytes == 10
+
+def test_unterminated_stream_stays_within_cap():
+    max_bytes = 1024 * 1024
+    buffer = LineBuffer(max_bytes=max_bytes)
+    chunk = Text("eyJrZXkiOiAidmFsdWUifQ" * 3000)  # ~64 KiB of base64, no newline
+    start = time.perf_counter()
+    for _ in range(256):  # ~16 MiB
+        buffer.write(chunk)
+    elapsed = time.perf_counter() - start
+    assert buffer.total_bytes <= max_bytes
+    assert sum(len(buffer[i].plain) for i in range(len(buffer))) <= max_bytes
+    assert elapsed < 5.0
+
+def test_carriage_return_overwrites_line():
+    buffer = LineBuffer()
+    buffer.write(Text("progress 10%"))
+    buffer.carriage_return()
+    assert plain_lines(buffer) == ["progress 10%"]
+    buffer.write(Text("progress 90%"))
+    assert plain_lines(buffer) == ["progress 90%"]
+    buffer.carriage_return()
+    buffer.write(Text("done\n"))
+    assert plain_lines(buffer) == ["done"]
+    assert buffer.total_bytes == 4
+
+def test_carriage_return_before_newline_keeps_line():
+    buffer = LineBuffer()
+    buffer.write(Text("finished"))
+    buffer.carriage_return()
+    buffer.write(Text("\nnext\n"))
+    assert plain_lines(buffer) == ["finished", "next"]
+
+def test_carriage_return_without_open_line_is_ignored():
+    buffer = LineBuffer()
+    buffer.write(Text("one\n"))
+    buffer.carriage_return()
+    buffer.write(Text("two\n"))
+    assert plain_lines(buffer) == ["one", "two"]
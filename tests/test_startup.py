@@ -0,0 +1,17 @@
+import statistics
+
+from benchmarks.bench_startup import import_times
+
+# Generous, so slow CI machines pass; importing the AI SDK alone used to take longer
+IMPORT_BUDGET = 1.5
+
+
+def test_heavy_modules_load_lazily():
+    imported = import_times()
+    for module in ("google.generativeai", "requests", "httpx", "yaml", "pyperclip", "dotenv"):
+        assert module not in imported
+
+
+def test_import_main_within_budget():
+    total = statistics.median(import_times()["main"] for _ in range(3))
+    assert total < IMPORT_BUDGET
@@ -0,0 +1,49 @@
+import time
+from typing import Callable, List, Optional
+
+from textual.message_pump import MessagePump
+from textual.timer import Timer
+
+
+class RenderScheduler:
+    """
+    Coalesces streamed output chunks and flushes them at most once per frame.
+
+    Commands can emit thousands of lines per second. Instead of touching the
+    widget for every line, chunks are collected in a pending list and handed
+    to the flush callback as a single string on the next frame tick.
+    """
+
+    def __init__(self, pump: MessagePump, flush_callback: Callable[[str], None], fps: int = 60):
+        self.pump = pump
+        self.flush_callback = flush_callback
+        self.interval = 1.0 / max(1, fps)
+        self._pending: List[str] = []
+        self._timer: Optional[Timer] = None
+        self._last_flush = 0.0
+
+    def write(self, text: str) -> None:
+        """Queue text for the next frame."""
+        if not text:
+            return
+        self._pending.append(text)
+        if self._timer is None:
+            # Flush immediately if the last frame is old enough, otherwise wait for the next slot
+            delay = max(0.0, self._last_flush + self.interval - time.monotonic())
+            self._timer = self.pump.set_timer(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Push all pending text to the widget right now."""
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._last_flush = time.monotonic()
+        self.flush_callback(text)
@@ -0,0 +1,156 @@
+from collections import deque
+from typing import Deque, Tuple
+
+from rich.cells import cell_len
+from rich.text import Text
+
+
+class LineBuffer:
+    """
+    Bounded ring buffer of output lines.
+
+    Keeps at most max_lines lines and max_bytes bytes of text, evicting the
+    oldest lines first. `dropped` counts every line evicted so far, so
+    `dropped + index` is a stable id for a line for the lifetime of the buffer.
+
+    A line longer than max_line_bytes (minified JSON, base64) is wrapped onto
+    new lines, so the byte cap also holds for output without newlines.
+    """
+
+    def __init__(self, max_lines: int = 10000, max_bytes: int = 8 * 1024 * 1024, max_line_bytes: int = 64 * 1024):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.max_line_bytes = max(1, min(max_line_bytes, max_bytes))
+        self._lines: Deque[Text] = deque()
+        self._sizes: Deque[int] = deque()
+        self.total_bytes = 0
+        self.dropped = 0
+        self.max_width = 0
+        # Cell width of the last line, kept up to date as it is extended
+        self._last_width = 0
+        # True while the last line has not been terminated by a newline yet
+        self.open = False
+        # True after a trailing carriage return: the next text overwrites the open line
+        self._carriage_return = False
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __getitem__(self, index: int) -> Text:
+        return self._lines[index]
+
+    def write(self, text: Text) -> Tuple[int, int]:
+        """
+        Appends text, splitting it into lines.
+        Returns (index of the first changed line, number of lines evicted).
+        """
+        first_changed = len(self._lines)
+        if not text.plain:
+            return first_changed, 0
+
+        pieces = text.split("\n", allow_blank=True)
+
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            if last and not piece.plain:
+                # Text ended with a newline; nothing left open
+                self.open = False
+                self._carriage_return = False
+                break
+            if i == 0 and self.open:
+                first_changed -= 1
+            else:
+                self._append(Text())
+                self._carriage_return = False
+            self._write_line(piece)
+            self.open = last
+
+        evicted = self._evict()
+        return max(0, first_changed - evicted), evicted
+
+    def carriage_return(self) -> None:
+        """Moves back to the start of the open line: the next text written replaces it."""
+        if self.open:
+            self._carriage_return = True
+
+    def terminate(self) -> None:
+        """Closes the open line so the next write starts on a fresh line."""
+        self.open = False
+        self._carriage_return = False
+
+    def clear(self) -> None:
+        self.dropped += len(self._lines)
+        self._lines.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+        self.terminate()
+
+    def _append(self, line: Text) -> None:
+        size = len(line.plain.encode("utf-8", errors="replace"))
+        self._lines.append(line)
+        self._sizes.append(size)
+        self.total_bytes += size
+        self._last_width = cell_len(line.plain)
+        self.max_width = max(self.max_width, self._last_width)
+
+    def _write_line(self, piece: Text) -> None:
+        """Writes one newline-free piece to the last line, wrapping it at max_line_bytes."""
+        if not piece.plain:
+            return
+        if self._carriage_return:
+            self._lines[-1] = Text()
+            self.total_bytes -= self._sizes[-1]
+            self._sizes[-1] = 0
+            self._last_width = 0
+            self._carriage_return = False
+        plain = piece.plain
+        data = plain.encode("utf-8", errors="replace")
+        # (characters, bytes, starts a new line) of each part the piece is wrapped into
+        parts = []
+        used = self._sizes[-1]
+        start = chars = 0
+        new_line = False
+        while start < len(data):
+            count = len(data[start:start + max(self.max_line_bytes - used, 0)].decode("utf-8", errors="ignore"))
+            if count == 0:
+                if used:
+                    used = 0
+                    new_line = True
+                    continue
+                # A single character wider than a line
+                count = 1
+            size = len(plain[chars:chars + count].encode("utf-8", errors="replace"))
+            parts.append((count, size, new_line))
+            chars += count
+            start += size
+            used = 0
+            new_line = True
+
+        offsets = []
+        for count, _, _ in parts[:-1]:
+            offsets.append((offsets[-1] if offsets else 0) + count)
+        for text, (_, size, new_line) in zip(piece.divide(offsets) if offsets else [piece], parts):
+            if new_line:
+                self._append(Text())
+            self._extend_last(text, size)
+
+    def _extend_last(self, piece: Text, size: int) -> None:
+        """Appends piece (size bytes) to the last line, counting only the piece."""
+        self._lines[-1].append_text(piece)
+        self._sizes[-1] += size
+        self.total_bytes += size
+        self._last_width += cell_len(piece.plain)
+        self.max_width = max(self.max_width, self._last_width)
+
+    def _evict(self) -> int:
+        """Drops the oldest lines until both caps are satisfied. Returns the number dropped."""
+        evicted = 0
+        # Always keep the newest line (wrapping keeps it within max_line_bytes)
+        while len(self._lines) > 1 and (
+            len(self._lines) > self.max_lines or self.total_bytes > self.max_bytes
+        ):
+            self._lines.popleft()
+            self.total_bytes -= self._sizes.popleft()
+            evicted += 1
+        self.dropped += evicted
+        return evicted
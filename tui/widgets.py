@@ -1,40 +1,143 @@
+import re
+from typing import Callable, List, Optional, Sequence
+
+from rich.ansi import AnsiDecoder
+from rich.text import Text
+from textual.actions import SkipAction
 from textual.widgets import Input
 from textual.binding import Binding
 from textual.events import Key
+from textual.geometry import Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from tui.scrollback import LineBuffer
+
+# Control codes that would corrupt the layout (tab, newline, carriage return and ESC are handled separately)
+_sub_control = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1a\x1c-\x1f\x7f]").sub
+
+# An escape sequence cut off at the end of a chunk
+_incomplete_escape = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*)?$")
 
 class HistoryInput(Input):
-    """Input widget with history navigation."""
+    """
+    Input widget with history navigation.
+
+    Ctrl+R starts a reverse search: the input holds the query and the newest
+    matching command is shown in the border title. Ctrl+R again steps to
+    older matches, Enter accepts the match and Escape restores the input.
+    """
     
     BINDINGS = [
         Binding("up", "history_up", "History Up"),
         Binding("down", "history_down", "History Down"),
         Binding("ctrl+f", "fix_last_error", "Fix Error"),
         Binding("ctrl+e", "explain_last_command", "Explain Command"),
+        Binding("ctrl+r", "reverse_search", "Search History"),
+        Binding("escape", "cancel_search", "Cancel Search", show=False),
     ]
 
+    # Matches fetched per query; Ctrl+R cycles through these
+    SEARCH_LIMIT = 50
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.history = []
         self.history_index = -1
         self.current_input = ""
+        # Returns matching commands, newest first
+        self.search_provider: Optional[Callable[[str], List[str]]] = None
+        self.searching = False
+        self.search_results: List[str] = []
+        self.search_index = 0
+        self._search_saved_input = ""
 
-    def set_history(self, history: list[str]):
-        """Set the history list (newest first)."""
+    def set_history(self, history: Sequence[str]):
+        """
+        Set the history (newest first): a list, or a HistoryCache that pages
+        older entries in as navigation reaches them.
+        """
         self.history = history
         self.history_index = -1
 
     def action_history_up(self):
         """Navigate back in history."""
+        if self.searching:
+            self._end_search(self.search_match or self.value)
+            return
         if not self.history:
             return
 
+        # Index instead of checking len(): a HistoryCache only knows its length once fully loaded
+        try:
+            command = self.history[self.history_index + 1]
+        except IndexError:
+            return
+
         if self.history_index == -1:
             self.current_input = self.value
-        
-        if self.history_index < len(self.history) - 1:
-            self.history_index += 1
-            self.value = self.history[self.history_index]
-            self.cursor_position = len(self.value)
+
+        self.history_index += 1
+        self.value = command
+        self.cursor_position = len(self.value)
+
+    def action_reverse_search(self):
+        """Start a reverse search, or step to the next older match."""
+        if self.search_provider is None:
+            return
+        if not self.searching:
+            self.searching = True
+            self._search_saved_input = self.value
+            self.search_results = []
+            self.search_index = 0
+            self.value = ""
+        elif self.search_index < len(self.search_results) - 1:
+            self.search_index += 1
+        self._update_search_title()
+
+    def action_cancel_search(self):
+        """Leave reverse search and restore what was typed before it."""
+        if not self.searching:
+            # Let the app's Escape binding (cancel the AI request) run instead
+            raise SkipAction()
+        self._end_search(self._search_saved_input)
+
+    def _on_input_changed(self, event: Input.Changed) -> None:
+        if not self.searching or event.input is not self:
+            return
+        # Collapse repeats so Ctrl+R steps through distinct commands
+        matches = self.search_provider(self.value) if self.value else []
+        self.search_results = list(dict.fromkeys(matches))
+        self.search_index = 0
+        self._update_search_title()
+
+    async def action_submit(self) -> None:
+        if self.searching:
+            # Enter accepts the match for editing rather than running it
+            self._end_search(self.search_match or self.value)
+            return
+        await super().action_submit()
+
+    @property
+    def search_match(self) -> str:
+        if self.search_index < len(self.search_results):
+            return self.search_results[self.search_index]
+        return ""
+
+    def _update_search_title(self):
+        # Plain Text so brackets in commands aren't parsed as markup
+        if self.value and not self.search_results:
+            self.border_title = Text(f"(failed reverse-i-search)`{self.value}'")
+        else:
+            self.border_title = Text(f"(reverse-i-search)`{self.value}': {self.search_match}")
+
+    def _end_search(self, value: str):
+        self.searching = False
+        self.search_results = []
+        self.border_title = None
+        self.history_index = -1
+        self.value = value
+        self.cursor_position = len(self.value)
 
     def action_history_down(self):
         """Navigate forward in history."""
@@ -46,3 +149,147 @@ class HistoryInput(Input):
             self.history_index = -1
             self.value = self.current_input
             self.cursor_position = len(self.value)
+
+
+class OutputLog(ScrollView, can_focus=True):
+    """
+    Virtualized scrollback for command output and app messages.
+
+    Lines live in a bounded LineBuffer; only the viewport plus an overscan
+    margin is ever rendered to strips, so memory and frame time stay flat
+    regardless of how long the session runs.
+    """
+
+    DEFAULT_CSS = """
+    OutputLog {
+        background: $surface;
+        color: $text;
+        overflow: auto;
+    }
+    """
+
+    def __init__(
+        self,
+        max_lines: int = 10000,
+        max_bytes: int = 8 * 1024 * 1024,
+        overscan: int = 50,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.buffer = LineBuffer(max_lines=max_lines, max_bytes=max_bytes)
+        self.overscan = overscan
+        # Rendered strips keyed by absolute line id (buffer.dropped + index)
+        self._strips: dict[int, Strip] = {}
+        # SGR state carries across chunks, so one decoder is kept per block of output
+        self._ansi = AnsiDecoder()
+        self._pending_escape = ""
+
+    def write(self, data: str) -> None:
+        """Appends raw program output (not interpreted as markup)."""
+        data = self._pending_escape + data
+        self._pending_escape = ""
+        if "\x1b" in data:
+            match = _incomplete_escape.search(data)
+            if match:
+                self._pending_escape = data[match.start():]
+                data = data[:match.start()]
+        if not data:
+            return
+
+        data = _sub_control("\ufffd", data)
+        if "\r" not in data:
+            self._write(self._to_text(data))
+            return
+        # Rich strips CR from Text, so carriage returns are applied here: text after a
+        # CR overwrites the open line, which is how progress bars redraw in place
+        for i, part in enumerate(data.split("\r")):
+            if i:
+                self.buffer.carriage_return()
+            self._write(self._to_text(part))
+
+    def _to_text(self, data: str) -> Text:
+        if "\x1b" not in data:
+            return Text(data)
+        return Text("\n").join(self._ansi.decode_line(line) for line in data.split("\n"))
+
+    def write_markup(self, markup: str) -> None:
+        """Writes a block of Rich markup starting on a fresh line."""
+        self.buffer.terminate()
+        self._ansi = AnsiDecoder()
+        self._pending_escape = ""
+        if not markup.endswith("\n"):
+            markup += "\n"
+        self._write(Text.from_markup(markup))
+
+    def clear(self) -> None:
+        self.buffer.clear()
+        self._strips.clear()
+        self.virtual_size = Size(0, 0)
+        self.refresh()
+
+    def _write(self, text: Text) -> None:
+        at_end = self.is_vertical_scroll_end
+        previous_count = len(self.buffer)
+
+        first_changed, evicted = self.buffer.write(text)
+
+        # Lines that were modified in place need to be re-rendered
+        base = self.buffer.dropped
+        for index in range(first_changed, min(previous_count - evicted, len(self.buffer))):
+            self._strips.pop(base + index, None)
+
+        self.virtual_size = Size(self.buffer.max_width, len(self.buffer))
+
+        if at_end:
+            self.scroll_end(animate=False, immediate=True, x_axis=False)
+        elif evicted:
+            # Keep the lines the user is looking at in place while the top is trimmed
+            self.scroll_to(y=max(0, self.scroll_offset.y - evicted), animate=False, immediate=True)
+
+        if evicted:
+            self.refresh()
+        else:
+            self.refresh_lines(first_changed, len(self.buffer) - first_changed)
+
+    def notify_style_update(self) -> None:
+        super().notify_style_update()
+        self._strips.clear()
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        width = self.size.width
+        rich_style = self.rich_style
+
+        if index >= len(self.buffer):
+            return Strip.blank(width, rich_style)
+
+        strip = self._strips.get(self.buffer.dropped + index)
+        if strip is None:
+            self._render_window()
+            strip = self._strips[self.buffer.dropped + index]
+
+        return strip.crop_extend(scroll_x, scroll_x + width, rich_style).apply_offsets(scroll_x, index)
+
+    def _render_window(self) -> None:
+        """Renders the viewport plus the overscan margin and drops every strip outside it."""
+        scroll_y = self.scroll_offset.y
+        top = max(0, scroll_y - self.overscan)
+        bottom = min(len(self.buffer), scroll_y + self.size.height + self.overscan)
+        base = self.buffer.dropped
+
+        window = {}
+        for index in range(top, bottom):
+            key = base + index
+            strip = self._strips.get(key)
+            if strip is None:
+                strip = self._render_strip(self.buffer[index])
+            window[key] = strip
+        self._strips = window
+
+    def _render_strip(self, line: Text) -> Strip:
+        text = line.copy()
+        text.expand_tabs()
+        text.no_wrap = True
+        text.style = self.rich_style
+        return Strip(text.render(self.app.console), text.cell_len)
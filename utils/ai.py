@@ -1,14 +1,97 @@
 from abc import ABC, abstractmethod
+import asyncio
+import json
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-import requests
+import random
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
 from utils.logger import get_logger
 
-load_dotenv()
 logger = get_logger("ai")
 
+# The SDKs take most of the startup time, so they are imported by the
+# provider that uses them (see _import_genai, _import_requests and _import_httpx)
+genai = None
+requests = None
+httpx = None
+
+
+def _import_genai():
+    global genai
+    if genai is None:
+        from dotenv import load_dotenv
+        import google.generativeai
+        load_dotenv()
+        genai = google.generativeai
+    return genai
+
+
+def _import_requests():
+    global requests
+    if requests is None:
+        import requests as requests_module
+        requests = requests_module
+    return requests
+
+
+def _import_httpx():
+    global httpx
+    if httpx is None:
+        import httpx as httpx_module
+        httpx = httpx_module
+    return httpx
+
+
+def suggestion_prompt(query: str) -> str:
+    return (
+        "You are a shell command expert. Translate the user's request into a single, "
+        "executable shell command for Linux. Return ONLY the command, no markdown, "
+        "no explanations, no code blocks. "
+        f"Request: {query}"
+    )
+
+
+def fix_prompt(command: str, error_output: str) -> str:
+    return (
+        f"The command `{command}` failed with the following error:\n"
+        f"{error_output}\n"
+        "Provide a corrected shell command to fix this error. "
+        "Return ONLY the corrected command, no markdown, no explanations."
+    )
+
+
+def explain_prompt(command: str) -> str:
+    return (
+        f"Explain the following shell command concisely:\n"
+        f"`{command}`\n"
+        "Explain what it does and what the flags mean."
+    )
+
+
+def analyze_log_prompt(log_content: str, query: str = "") -> str:
+    return (
+        f"Analyze the following log excerpt and identify the root cause of the error.\n"
+        f"Query: {query}\n\n"
+        f"Log Content:\n{log_content}\n\n"
+        "Provide a concise summary of the error and a potential fix."
+    )
+
+
 class AIProvider(ABC):
+    """
+    Interface of the AI backends. Each request has a blocking method that
+    returns the whole response, and explanations and log summaries also
+    have a stream_ variant yielding text chunks as they are generated.
+
+    The a-prefixed variants are awaited on the app's event loop, where
+    cancelling the awaiting task aborts the request. Their defaults run the
+    blocking methods in a worker thread instead, which can't be interrupted:
+    a cancelled request still finishes in the background.
+    """
+
+    # Seconds from the last streamed request to its first chunk
+    last_ttft: Optional[float] = None
+
     @abstractmethod
     def get_command_suggestion(self, query: str, context: str = "") -> str:
         pass
@@ -25,14 +108,81 @@ class AIProvider(ABC):
     def analyze_log(self, log_content: str, query: str = "") -> str:
         pass
 
+    def stream_explain_command(self, command: str, context: str = "") -> Iterator[str]:
+        """Like explain_command, yielding the response in chunks. Providers without streaming yield it whole."""
+        return self._timed("explain_command", iter([self.explain_command(command, context)]))
+
+    def stream_analyze_log(self, log_content: str, query: str = "") -> Iterator[str]:
+        """Like analyze_log, yielding the response in chunks."""
+        return self._timed("analyze_log", iter([self.analyze_log(log_content, query)]))
+
+    def _timed(self, label: str, chunks: Iterable[str]) -> Iterator[str]:
+        """Passes chunks through, recording the time to the first one in last_ttft."""
+        start = time.perf_counter()
+        first = None
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+                self.last_ttft = first
+                logger.info(f"{type(self).__name__} {label}: first token after {first:.2f}s")
+            yield chunk
+        logger.info(f"{type(self).__name__} {label}: done in {time.perf_counter() - start:.2f}s")
+
+    async def _atimed(self, label: str, chunks: AsyncIterable[str]) -> AsyncIterator[str]:
+        """Async version of _timed."""
+        start = time.perf_counter()
+        first = None
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+                self.last_ttft = first
+                logger.info(f"{type(self).__name__} {label}: first token after {first:.2f}s")
+            yield chunk
+        logger.info(f"{type(self).__name__} {label}: done in {time.perf_counter() - start:.2f}s")
+
+    def warm_up(self) -> bool:
+        """Prepares the backend for the first request (e.g. loads a local model). Returns False if that failed."""
+        return True
+
+    async def aget_command_suggestion(self, query: str, context: str = "") -> str:
+        return await asyncio.to_thread(self.get_command_suggestion, query, context)
+
+    async def afix_command(self, command: str, error_output: str, context: str = "") -> str:
+        return await asyncio.to_thread(self.fix_command, command, error_output, context)
+
+    async def aexplain_command(self, command: str, context: str = "") -> str:
+        return await asyncio.to_thread(self.explain_command, command, context)
+
+    async def aanalyze_log(self, log_content: str, query: str = "") -> str:
+        return await asyncio.to_thread(self.analyze_log, log_content, query)
+
+    def astream_explain_command(self, command: str, context: str = "") -> AsyncIterator[str]:
+        return self._atimed("explain_command", self._in_thread(self.explain_command, command, context))
+
+    def astream_analyze_log(self, log_content: str, query: str = "") -> AsyncIterator[str]:
+        return self._atimed("analyze_log", self._in_thread(self.analyze_log, log_content, query))
+
+    async def aclose(self) -> None:
+        """Releases connections held for the async methods."""
+
+    @staticmethod
+    async def _in_thread(method, *args) -> AsyncIterator[str]:
+        yield await asyncio.to_thread(method, *args)
+
 class GeminiProvider(AIProvider):
-    def __init__(self):
+    def __init__(self, model_name="gemini-flash-latest"):
+        self.model_name = model_name
+        genai = _import_genai()
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             logger.warning("GEMINI_API_KEY not found in .env")
         else:
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-flash-latest')
+            self.model = genai.GenerativeModel(self.model_name)
 
     def _build_prompt(self, base_prompt: str, context: str) -> str:
         if context:
@@ -43,13 +193,7 @@ class GeminiProvider(AIProvider):
         if not hasattr(self, 'model'):
             return "Error: Gemini API key not configured."
             
-        base_prompt = (
-            "You are a shell command expert. Translate the user's request into a single, "
-            "executable shell command for Linux. Return ONLY the command, no markdown, "
-            "no explanations, no code blocks. "
-            f"Request: {query}"
-        )
-        prompt = self._build_prompt(base_prompt, context)
+        prompt = self._build_prompt(suggestion_prompt(query), context)
         
         try:
             logger.info(f"Gemini suggestion requested for: {query}")
@@ -63,13 +207,7 @@ class GeminiProvider(AIProvider):
         if not hasattr(self, 'model'):
             return "Error: Gemini API key not configured."
 
-        base_prompt = (
-            f"The command `{command}` failed with the following error:\n"
-            f"{error_output}\n"
-            "Provide a corrected shell command to fix this error. "
-            "Return ONLY the corrected command, no markdown, no explanations."
-        )
-        prompt = self._build_prompt(base_prompt, context)
+        prompt = self._build_prompt(fix_prompt(command, error_output), context)
 
         try:
             logger.info(f"Gemini fix requested for command: {command}")
@@ -83,12 +221,7 @@ class GeminiProvider(AIProvider):
         if not hasattr(self, 'model'):
             return "Error: Gemini API key not configured."
 
-        base_prompt = (
-            f"Explain the following shell command concisely:\n"
-            f"`{command}`\n"
-            "Explain what it does and what the flags mean."
-        )
-        prompt = self._build_prompt(base_prompt, context)
+        prompt = self._build_prompt(explain_prompt(command), context)
 
         try:
             logger.info(f"Gemini explanation requested for command: {command}")
@@ -102,12 +235,7 @@ class GeminiProvider(AIProvider):
         if not hasattr(self, 'model'):
             return "Error: Gemini API key not configured."
 
-        prompt = (
-            f"Analyze the following log excerpt and identify the root cause of the error.\n"
-            f"Query: {query}\n\n"
-            f"Log Content:\n{log_content}\n\n"
-            "Provide a concise summary of the error and a potential fix."
-        )
+        prompt = analyze_log_prompt(log_content, query)
         try:
             logger.info(f"Gemini log analysis requested")
             response = self.model.generate_content(prompt)
@@ -116,19 +244,190 @@ class GeminiProvider(AIProvider):
             logger.error(f"Gemini error: {e}")
             return f"Error calling Gemini API: {str(e)}"
 
+    def stream_explain_command(self, command: str, context: str = "") -> Iterator[str]:
+        logger.info(f"Gemini streamed explanation requested for command: {command}")
+        return self._timed("explain_command", self._stream(self._build_prompt(explain_prompt(command), context)))
+
+    def stream_analyze_log(self, log_content: str, query: str = "") -> Iterator[str]:
+        logger.info(f"Gemini streamed log analysis requested")
+        return self._timed("analyze_log", self._stream(analyze_log_prompt(log_content, query)))
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        if not hasattr(self, 'model'):
+            yield "Error: Gemini API key not configured."
+            return
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                yield chunk.text
+        except Exception as e:
+            logger.error(f"Gemini error: {e}")
+            yield f"Error calling Gemini API: {str(e)}"
+
+    async def aget_command_suggestion(self, query: str, context: str = "") -> str:
+        logger.info(f"Gemini suggestion requested for: {query}")
+        return await self._agenerate(self._build_prompt(suggestion_prompt(query), context))
+
+    async def afix_command(self, command: str, error_output: str, context: str = "") -> str:
+        logger.info(f"Gemini fix requested for command: {command}")
+        return await self._agenerate(self._build_prompt(fix_prompt(command, error_output), context))
+
+    async def aexplain_command(self, command: str, context: str = "") -> str:
+        logger.info(f"Gemini explanation requested for command: {command}")
+        return await self._agenerate(self._build_prompt(explain_prompt(command), context))
+
+    async def aanalyze_log(self, log_content: str, query: str = "") -> str:
+        logger.info(f"Gemini log analysis requested")
+        return await self._agenerate(analyze_log_prompt(log_content, query))
+
+    def astream_explain_command(self, command: str, context: str = "") -> AsyncIterator[str]:
+        logger.info(f"Gemini streamed explanation requested for command: {command}")
+        return self._atimed("explain_command", self._astream(self._build_prompt(explain_prompt(command), context)))
+
+    def astream_analyze_log(self, log_content: str, query: str = "") -> AsyncIterator[str]:
+        logger.info(f"Gemini streamed log analysis requested")
+        return self._atimed("analyze_log", self._astream(analyze_log_prompt(log_content, query)))
+
+    async def _agenerate(self, prompt: str) -> str:
+        if not hasattr(self, 'model'):
+            return "Error: Gemini API key not configured."
+        try:
+            response = await self.model.generate_content_async(prompt)
+            return response.text.strip()
+        except Exception as e:
+            logger.error(f"Gemini error: {e}")
+            return f"Error calling Gemini API: {str(e)}"
+
+    async def _astream(self, prompt: str) -> AsyncIterator[str]:
+        if not hasattr(self, 'model'):
+            yield "Error: Gemini API key not configured."
+            return
+        try:
+            async for chunk in await self.model.generate_content_async(prompt, stream=True):
+                yield chunk.text
+        except Exception as e:
+            logger.error(f"Gemini error: {e}")
+            yield f"Error calling Gemini API: {str(e)}"
+
+class _StatusError(Exception):
+    """A response with a status other than 200."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP status {status}")
+        self.status = status
+
+
 class OllamaProvider(AIProvider):
-    def __init__(self, model_name="llama3"):
+    """
+    Client for a local Ollama server.
+
+    Requests go through one pooled Session, so the TCP connection is kept
+    alive between them. Connecting gives up after connect_timeout seconds and
+    a response (or, when streaming, the next chunk) after read_timeout.
+    Failed connections and 502/503/504 responses (e.g. while the server is
+    starting) are retried up to retries times, with jittered exponential
+    backoff. keep_alive tells Ollama how long to keep the model loaded
+    after a request (e.g. "10m", or -1 for as long as it runs).
+
+    The async methods use an httpx AsyncClient on the event loop, with its
+    own keep-alive pool and the same timeouts and retries, always streaming
+    the response. Cancelling one closes its connection at once, whether it
+    is still connecting, waiting for the response (e.g. while the model
+    loads) or reading it, which tells Ollama to stop generating.
+    """
+
+    # Statuses worth retrying: the server is up but not ready yet
+    RETRY_STATUSES = (502, 503, 504)
+    # Seconds before the first retry of the async client; doubles each time, plus jitter
+    RETRY_BACKOFF = 0.25
+
+    def __init__(
+        self,
+        model_name="llama3",
+        base_url="http://localhost:11434",
+        connect_timeout=3.05,
+        read_timeout=120.0,
+        retries=2,
+        keep_alive="10m",
+    ):
         self.model_name = model_name
-        self.api_url = "http://localhost:11434/api/generate"
+        self.base_url = base_url.rstrip('/')
+        self.api_url = f"{self.base_url}/api/generate"
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.keep_alive = keep_alive
+
+        requests = _import_requests()
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            # A request that reached the model isn't sent again, so it never generates twice
+            read=0,
+            status=retries,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            backoff_factor=0.25,
+            backoff_jitter=0.25,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        httpx = _import_httpx()
+        self.async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+            # Retries failed connections; statuses are retried by _alines
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+
+    def _body(self, body: dict) -> dict:
+        return {"model": self.model_name, "keep_alive": self.keep_alive, **body}
+
+    def _post(self, body: dict, stream: bool = False) -> "requests.Response":
+        return self.session.post(self.api_url, json=self._body(body), timeout=self.timeout, stream=stream)
+
+    async def _alines(self, body: dict) -> AsyncIterator[dict]:
+        """POSTs body and yields each line of the streamed response. Raises _StatusError unless it is 200."""
+        for attempt in range(self.retries + 1):
+            async with self.async_client.stream("POST", self.api_url, json=self._body(body)) as response:
+                if response.status_code in self.RETRY_STATUSES and attempt < self.retries:
+                    await response.aread()
+                else:
+                    if response.status_code != 200:
+                        raise _StatusError(response.status_code)
+                    # Leaving the block early (an error or cancellation) closes the connection
+                    async for line in response.aiter_lines():
+                        if line:
+                            yield json.loads(line)
+                    return
+            delay = self.RETRY_BACKOFF * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def aclose(self) -> None:
+        await self.async_client.aclose()
+        self.session.close()
+
+    def warm_up(self) -> bool:
+        """Loads the model into memory (a request without a prompt), so the first real request doesn't wait for it."""
+        try:
+            start = time.perf_counter()
+            response = self._post({"stream": False})
+            if response.status_code == 200:
+                logger.info(f"Ollama model {self.model_name} loaded in {time.perf_counter() - start:.2f}s")
+                return True
+            logger.warning(f"Ollama warm-up returned status {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Ollama warm-up failed: {e}")
+        return False
 
     def _generate(self, prompt: str) -> str:
         try:
             logger.info(f"Ollama request (model={self.model_name})")
-            response = requests.post(self.api_url, json={
-                "model": self.model_name,
-                "prompt": prompt,
-                "stream": False
-            })
+            response = self._post({"prompt": prompt, "stream": False})
             if response.status_code == 200:
                 return response.json().get("response", "").strip()
             
@@ -138,47 +437,106 @@ class OllamaProvider(AIProvider):
             logger.error(f"Ollama exception: {e}")
             return f"Error calling Ollama: {str(e)}"
 
+    def _stream(self, prompt: str) -> Iterator[str]:
+        """Yields the response as Ollama generates it (one JSON object per line)."""
+        try:
+            logger.info(f"Ollama streamed request (model={self.model_name})")
+            response = self._post({"prompt": prompt, "stream": True}, stream=True)
+            with response:
+                if response.status_code != 200:
+                    logger.error(f"Ollama error status: {response.status_code}")
+                    yield f"Error: Ollama returned status {response.status_code}"
+                    return
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        yield f"Error from Ollama: {data['error']}"
+                        return
+                    yield data.get("response", "")
+                    if data.get("done"):
+                        return
+        except Exception as e:
+            logger.error(f"Ollama exception: {e}")
+            yield f"Error calling Ollama: {str(e)}"
+
+    async def _agenerate(self, prompt: str) -> str:
+        # Streamed, so a cancelled request can be aborted while the model is generating
+        try:
+            logger.info(f"Ollama async request (model={self.model_name})")
+            parts = []
+            async for data in self._alines({"prompt": prompt, "stream": True}):
+                if data.get("error"):
+                    return f"Error from Ollama: {data['error']}"
+                parts.append(data.get("response", ""))
+            return "".join(parts).strip()
+        except _StatusError as e:
+            logger.error(f"Ollama error status: {e.status}")
+            return f"Error: Ollama returned status {e.status}"
+        except Exception as e:
+            logger.error(f"Ollama exception: {e!r}")
+            return f"Error calling Ollama: {str(e) or type(e).__name__}"
+
+    async def _astream(self, prompt: str) -> AsyncIterator[str]:
+        try:
+            logger.info(f"Ollama async streamed request (model={self.model_name})")
+            async for data in self._alines({"prompt": prompt, "stream": True}):
+                if data.get("error"):
+                    yield f"Error from Ollama: {data['error']}"
+                    return
+                # Read on past "done" to the end of the body, so the connection can be reused
+                yield data.get("response", "")
+        except _StatusError as e:
+            logger.error(f"Ollama error status: {e.status}")
+            yield f"Error: Ollama returned status {e.status}"
+        except Exception as e:
+            logger.error(f"Ollama exception: {e!r}")
+            yield f"Error calling Ollama: {str(e) or type(e).__name__}"
+
     def _build_prompt(self, base_prompt: str, context: str) -> str:
         if context:
             return f"[Context]\n{context}\n\n[Request]\n{base_prompt}"
         return base_prompt
 
     def get_command_suggestion(self, query: str, context: str = "") -> str:
-        base_prompt = (
-            "You are a shell command expert. Translate the user's request into a single, "
-            "executable shell command for Linux. Return ONLY the command, no markdown, "
-            "no explanations, no code blocks. "
-            f"Request: {query}"
-        )
-        return self._generate(self._build_prompt(base_prompt, context))
+        return self._generate(self._build_prompt(suggestion_prompt(query), context))
 
     def fix_command(self, command: str, error_output: str, context: str = "") -> str:
-        base_prompt = (
-            f"The command `{command}` failed with the following error:\n"
-            f"{error_output}\n"
-            "Provide a corrected shell command to fix this error. "
-            "Return ONLY the corrected command, no markdown, no explanations."
-        )
-        return self._generate(self._build_prompt(base_prompt, context))
+        return self._generate(self._build_prompt(fix_prompt(command, error_output), context))
 
     def explain_command(self, command: str, context: str = "") -> str:
-        base_prompt = (
-            f"Explain the following shell command concisely:\n"
-            f"`{command}`\n"
-            "Explain what it does and what the flags mean."
-        )
-        return self._generate(self._build_prompt(base_prompt, context))
+        return self._generate(self._build_prompt(explain_prompt(command), context))
 
     def analyze_log(self, log_content: str, query: str = "") -> str:
-        prompt = (
-            f"Analyze the following log excerpt and identify the root cause of the error.\n"
-            f"Query: {query}\n\n"
-            f"Log Content:\n{log_content}\n\n"
-            "Provide a concise summary of the error and a potential fix."
-        )
-        return self._generate(prompt)
+        return self._generate(analyze_log_prompt(log_content, query))
+
+    def stream_explain_command(self, command: str, context: str = "") -> Iterator[str]:
+        return self._timed("explain_command", self._stream(self._build_prompt(explain_prompt(command), context)))
+
+    def stream_analyze_log(self, log_content: str, query: str = "") -> Iterator[str]:
+        return self._timed("analyze_log", self._stream(analyze_log_prompt(log_content, query)))
+
+    async def aget_command_suggestion(self, query: str, context: str = "") -> str:
+        return await self._agenerate(self._build_prompt(suggestion_prompt(query), context))
+
+    async def afix_command(self, command: str, error_output: str, context: str = "") -> str:
+        return await self._agenerate(self._build_prompt(fix_prompt(command, error_output), context))
+
+    async def aexplain_command(self, command: str, context: str = "") -> str:
+        return await self._agenerate(self._build_prompt(explain_prompt(command), context))
+
+    async def aanalyze_log(self, log_content: str, query: str = "") -> str:
+        return await self._agenerate(analyze_log_prompt(log_content, query))
+
+    def astream_explain_command(self, command: str, context: str = "") -> AsyncIterator[str]:
+        return self._atimed("explain_command", self._astream(self._build_prompt(explain_prompt(command), context)))
+
+    def astream_analyze_log(self, log_content: str, query: str = "") -> AsyncIterator[str]:
+        return self._atimed("analyze_log", self._astream(analyze_log_prompt(log_content, query)))
 
-def get_provider(provider_name: str) -> AIProvider:
+def get_provider(provider_name: str, options: Optional[dict] = None) -> AIProvider:
+    """The provider named provider_name (Gemini by default), built with options as its arguments."""
     if provider_name.lower() == "ollama":
-        return OllamaProvider()
-    return GeminiProvider()
+        return OllamaProvider(**(options or {}))
+    return GeminiProvider(**(options or {}))
@@ -0,0 +1,316 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from utils.ai import AIProvider
+from utils.logger import get_logger
+
+logger = get_logger("ai_cache")
+
+
+class ResponseCache:
+    """
+    Two-tier cache of AI responses.
+
+    Recent responses are kept in an in-memory LRU of max_memory_entries.
+    Everything is also stored in SQLite (db_path, None for memory only), so
+    answers survive restarts and are shared by instances using the same
+    file. Each method has its own TTL in seconds (ttls, keyed by the
+    AIProvider method name; a missing or null TTL never expires). Beyond
+    max_bytes of stored responses the least recently used rows are evicted.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_memory_entries: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttls: Optional[Dict[str, Optional[float]]] = None,
+        busy_timeout: float = 5.0,
+    ):
+        self.max_memory_entries = max_memory_entries
+        self.max_bytes = max_bytes
+        self.ttls = ttls or {}
+        # Key -> (stored at, method, response)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                self._conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                with self._conn:
+                    self._conn.execute("""
+                        CREATE TABLE IF NOT EXISTS responses (
+                            key TEXT PRIMARY KEY,
+                            method TEXT NOT NULL,
+                            response TEXT NOT NULL,
+                            size INTEGER NOT NULL,
+                            created REAL NOT NULL,
+                            accessed REAL NOT NULL
+                        )
+                    """)
+                    self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"AI cache database unavailable, caching in memory only: {e}")
+                self._conn = None
+
+    @staticmethod
+    def make_key(provider: str, model: str, method: str, prompt: str, context: str = "") -> str:
+        """
+        Cache key for a request. Whitespace in the prompt is normalized, and
+        the project context is hashed so the same question asked in another
+        kind of project is a different entry.
+        """
+        normalized = " ".join(prompt.split())
+        context_hash = hashlib.sha256(context.encode("utf-8", errors="replace")).hexdigest()
+        return hashlib.sha256("\0".join((provider, model, method, normalized, context_hash)).encode("utf-8", errors="replace")).hexdigest()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def get(self, key: str, method: str) -> Optional[str]:
+        """The cached response for key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, _, response = entry
+                if not self._expired(method, created, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            row = None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute("SELECT created, response FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row is not None and self._expired(method, row[0], now):
+                        with self._conn:
+                            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        row = None
+                    elif row is not None:
+                        with self._conn:
+                            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                except sqlite3.Error as e:
+                    logger.warning(f"AI cache read failed: {e}")
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, (row[0], method, row[1]))
+            return row[1]
+
+    def put(self, key: str, method: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, (now, method, response))
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, method, response, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, method, response, len(response.encode("utf-8", errors="replace")), now, now)
+                    )
+                    self._evict()
+            except sqlite3.Error as e:
+                logger.warning(f"AI cache write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        logger.info(f"AI cache: {self.memory_hits} memory hit(s), {self.disk_hits} disk hit(s), {self.misses} miss(es)")
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _expired(self, method: str, created: float, now: float) -> bool:
+        ttl = self.ttls.get(method)
+        return ttl is not None and now - created > ttl
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Removes expired rows, then the least recently used ones beyond max_bytes."""
+        now = time.time()
+        for method, ttl in self.ttls.items():
+            if ttl is not None:
+                self._conn.execute("DELETE FROM responses WHERE method = ? AND created < ?", (method, now - ttl))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed, rowid"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        for (key,) in stale:
+            self._memory.pop(key, None)
+
+
+class CachedProvider(AIProvider):
+    """
+    AIProvider that answers repeated requests from a ResponseCache and
+    forwards the rest to the wrapped provider. Error responses are not cached.
+    """
+
+    def __init__(self, provider: AIProvider, cache: ResponseCache, provider_name: str = ""):
+        self.provider = provider
+        self.cache = cache
+        self.provider_name = provider_name or type(provider).__name__
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.provider, "model_name", "")
+
+    @property
+    def last_ttft(self) -> Optional[float]:
+        return self.provider.last_ttft
+
+    def warm_up(self) -> bool:
+        return self.provider.warm_up()
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+    def get_command_suggestion(self, query: str, context: str = "") -> str:
+        return self._cached("get_command_suggestion", query, context, lambda: self.provider.get_command_suggestion(query, context))
+
+    def fix_command(self, command: str, error_output: str, context: str = "") -> str:
+        return self._cached(
+            "fix_command", f"{command}\0{error_output}", context,
+            lambda: self.provider.fix_command(command, error_output, context)
+        )
+
+    def explain_command(self, command: str, context: str = "") -> str:
+        return self._cached("explain_command", command, context, lambda: self.provider.explain_command(command, context))
+
+    def analyze_log(self, log_content: str, query: str = "") -> str:
+        return self._cached("analyze_log", f"{query}\0{log_content}", "", lambda: self.provider.analyze_log(log_content, query))
+
+    def stream_explain_command(self, command: str, context: str = "") -> Iterator[str]:
+        return self._cached_stream(
+            "explain_command", command, context, lambda: self.provider.stream_explain_command(command, context)
+        )
+
+    def stream_analyze_log(self, log_content: str, query: str = "") -> Iterator[str]:
+        return self._cached_stream(
+            "analyze_log", f"{query}\0{log_content}", "", lambda: self.provider.stream_analyze_log(log_content, query)
+        )
+
+    async def aget_command_suggestion(self, query: str, context: str = "") -> str:
+        return await self._acached(
+            "get_command_suggestion", query, context, lambda: self.provider.aget_command_suggestion(query, context)
+        )
+
+    async def afix_command(self, command: str, error_output: str, context: str = "") -> str:
+        return await self._acached(
+            "fix_command", f"{command}\0{error_output}", context,
+            lambda: self.provider.afix_command(command, error_output, context)
+        )
+
+    async def aexplain_command(self, command: str, context: str = "") -> str:
+        return await self._acached("explain_command", command, context, lambda: self.provider.aexplain_command(command, context))
+
+    async def aanalyze_log(self, log_content: str, query: str = "") -> str:
+        return await self._acached(
+            "analyze_log", f"{query}\0{log_content}", "", lambda: self.provider.aanalyze_log(log_content, query)
+        )
+
+    def astream_explain_command(self, command: str, context: str = "") -> AsyncIterator[str]:
+        return self._acached_stream(
+            "explain_command", command, context, lambda: self.provider.astream_explain_command(command, context)
+        )
+
+    def astream_analyze_log(self, log_content: str, query: str = "") -> AsyncIterator[str]:
+        return self._acached_stream(
+            "analyze_log", f"{query}\0{log_content}", "", lambda: self.provider.astream_analyze_log(log_content, query)
+        )
+
+    def _cached_stream(self, method: str, prompt: str, context: str, call) -> Iterator[str]:
+        """A cached response in one chunk, or the provider's stream, stored once it completes."""
+        key = self.cache.make_key(self.provider_name, self.model_name, method, prompt, context)
+        response = self.cache.get(key, method)
+        if response is not None:
+            logger.info(f"AI cache hit for {method}")
+            yield response
+            return
+        chunks = []
+        failed = False
+        for chunk in call():
+            # Providers report failures as a chunk of their own
+            failed = failed or chunk.startswith("Error")
+            chunks.append(chunk)
+            yield chunk
+        response = "".join(chunks).strip()
+        if response and not failed:
+            self.cache.put(key, method, response)
+
+    def _cached(self, method: str, prompt: str, context: str, call) -> str:
+        key = self.cache.make_key(self.provider_name, self.model_name, method, prompt, context)
+        response = self.cache.get(key, method)
+        if response is not None:
+            logger.info(f"AI cache hit for {method}")
+            return response
+        response = call()
+        if response and not response.startswith("Error"):
+            self.cache.put(key, method, response)
+        return response
+
+    async def _acached(self, method: str, prompt: str, context: str, call) -> str:
+        """Async version of _cached; the cache itself is read and written inline (SQLite lookups are fast)."""
+        key = self.cache.make_key(self.provider_name, self.model_name, method, prompt, context)
+        response = self.cache.get(key, method)
+        if response is not None:
+            logger.info(f"AI cache hit for {method}")
+            return response
+        response = await call()
+        if response and not response.startswith("Error"):
+            self.cache.put(key, method, response)
+        return response
+
+    async def _acached_stream(self, method: str, prompt: str, context: str, call) -> AsyncIterator[str]:
+        """Async version of _cached_stream. A cancelled stream is not stored."""
+        key = self.cache.make_key(self.provider_name, self.model_name, method, prompt, context)
+        response = self.cache.get(key, method)
+        if response is not None:
+            logger.info(f"AI cache hit for {method}")
+            yield response
+            return
+        chunks = []
+        failed = False
+        async for chunk in call():
+            failed = failed or chunk.startswith("Error")
+            chunks.append(chunk)
+            yield chunk
+        response = "".join(chunks).strip()
+        if response and not failed:
+            self.cache.put(key, method, response)
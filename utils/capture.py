@@ -0,0 +1,177 @@
+import gzip
+import os
+import tempfile
+from collections import deque
+from typing import BinaryIO, Deque, Optional
+
+# Default size limit of a spill file (the spill_max_bytes setting)
+MAX_SPILL_BYTES = 256 * 1024 * 1024
+
+class OutputBuffer:
+    """
+    Keeps the last max_bytes bytes of a command's output.
+
+    Chunks are stored UTF-8 encoded in a deque with a running byte total.
+    Chunks that fall completely outside the window are dropped as new ones
+    arrive, so each append is amortized O(1); the partially covered head
+    chunk is only trimmed once, when the tail is read back.
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._chunks: Deque[bytes] = deque()
+        self._size = 0
+        # Total bytes ever appended, including what has been dropped
+        self.total_bytes = 0
+
+    def append(self, text: str) -> None:
+        self.append_bytes(text.encode("utf-8", errors="replace"))
+
+    def append_bytes(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total_bytes += len(data)
+
+        if len(data) >= self.max_bytes:
+            # This chunk alone covers the whole window
+            self._chunks.clear()
+            data = data[-self.max_bytes:]
+            self._size = 0
+
+        self._chunks.append(data)
+        self._size += len(data)
+
+        while len(self._chunks) > 1 and self._size - len(self._chunks[0]) >= self.max_bytes:
+            self._size -= len(self._chunks.popleft())
+
+    @property
+    def truncated(self) -> bool:
+        """True if older output has been discarded."""
+        return self.total_bytes > self.max_bytes
+
+    def __len__(self) -> int:
+        """Number of bytes currently held (at most max_bytes)."""
+        return min(self._size, self.max_bytes)
+
+    def getbuffer(self) -> memoryview:
+        """Returns the retained tail of the output as raw bytes."""
+        data = b"".join(self._chunks)
+        start = max(0, len(data) - self.max_bytes)
+        # Don't start in the middle of a multibyte character
+        while start < len(data) and data[start] & 0xC0 == 0x80:
+            start += 1
+        return memoryview(data)[start:]
+
+    def getvalue(self) -> str:
+        """Returns the retained tail of the output as text."""
+        return str(self.getbuffer(), "utf-8", "replace")
+
+    def clear(self) -> None:
+        self._chunks.clear()
+        self._size = 0
+        self.total_bytes = 0
+
+
+class OutputCapture:
+    """
+    Captures a command's complete output with bounded memory.
+
+    The last max_bytes stay in an OutputBuffer for display and history. As
+    soon as the output outgrows that window, everything (from the first
+    byte) is streamed into a per-command temp file in spill_dir, so /analyze
+    can scan the whole output instead of just its tail. The spill file is
+    append-only and optionally gzip-compressed. Past max_spill_bytes it stops
+    growing, and on close the in-memory tail is appended after a marker line,
+    so the file keeps both the start and the end of the output (where errors
+    usually are).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        max_spill_bytes: int = MAX_SPILL_BYTES,
+        compress: bool = False,
+    ):
+        self.buffer = OutputBuffer(max_bytes)
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.compress = compress
+        self.spill_path: Optional[str] = None
+        self.spilled_bytes = 0
+        # True if the spill file hit max_spill_bytes and stopped growing
+        self.spill_truncated = False
+        self._spill: Optional[BinaryIO] = None
+
+    def append(self, text: str) -> None:
+        data = text.encode("utf-8", errors="replace")
+        if not data:
+            return
+
+        if (
+            self.spill_path is None
+            and self.spill_dir is not None
+            and self.buffer.total_bytes + len(data) > self.buffer.max_bytes
+        ):
+            # Nothing has been evicted yet, so the buffer still holds the complete output
+            self._open_spill()
+            self._write_spill(self.buffer.getbuffer())
+
+        self.buffer.append_bytes(data)
+        if self._spill is not None:
+            self._write_spill(data)
+
+    def getvalue(self) -> str:
+        """Returns the in-memory tail of the output."""
+        return self.buffer.getvalue()
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_path is not None
+
+    def close(self) -> None:
+        """Finishes writing the spill file; it stays on disk until cleanup()."""
+        if self._spill is not None:
+            if self.spill_truncated:
+                self._write_tail()
+            self._spill.close()
+            self._spill = None
+
+    def cleanup(self) -> None:
+        """Closes and deletes the spill file."""
+        self.close()
+        if self.spill_path is not None:
+            try:
+                os.remove(self.spill_path)
+            except FileNotFoundError:
+                pass
+            self.spill_path = None
+
+    def _open_spill(self) -> None:
+        suffix = ".log.gz" if self.compress else ".log"
+        fd, self.spill_path = tempfile.mkstemp(prefix="output-", suffix=suffix, dir=self.spill_dir)
+        if self.compress:
+            os.close(fd)
+            # Level 1 keeps compression cheap enough to run inline with streaming output
+            self._spill = gzip.open(self.spill_path, "wb", compresslevel=1)
+        else:
+            self._spill = os.fdopen(fd, "wb")
+
+    def _write_tail(self) -> None:
+        """Appends the part of the in-memory tail that the capped spill file is missing."""
+        tail = self.buffer.getbuffer()
+        tail_start = self.buffer.total_bytes - len(tail)
+        skipped = tail_start - self.spilled_bytes
+        if skipped > 0:
+            self._spill.write(f"\n... [{skipped} bytes of output omitted] ...\n".encode())
+        self._spill.write(tail[max(0, -skipped):])
+
+    def _write_spill(self, data) -> None:
+        if self.spill_truncated:
+            return
+        room = self.max_spill_bytes - self.spilled_bytes
+        if len(data) > room:
+            data = data[:room]
+            self.spill_truncated = True
+        self._spill.write(data)
+        self.spilled_bytes += len(data)
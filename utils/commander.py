@@ -1,37 +1,139 @@
 import asyncio
+import codecs
+import errno
+import fcntl
 import os
+import pty
+import re
 import shlex
-from typing import Callable, Awaitable
+import shutil
+import struct
+import termios
+from typing import Callable, Awaitable, Optional
+from utils.capture import OutputCapture
 
-async def execute_command(command: str, output_callback: Callable[[str], Awaitable[None]], max_buffer_size: int = 1024 * 1024) -> tuple[int, str]:
+# Default size of a single read from the child's output pipe
+READ_CHUNK_SIZE = 64 * 1024
+
+# ANSI escape sequences (colors, cursor movement, OSC titles); stripped from captured output
+ANSI_ESCAPE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])")
+# The start of an escape sequence at the end of a chunk, cut off before its final byte or terminator
+ANSI_PARTIAL = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?)?\Z")
+
+class StreamDecoder:
+    """
+    Incrementally decodes UTF-8 output chunks.
+    Multibyte characters split across chunks are held back until complete,
+    and CRLF pairs are normalized to LF even when split across chunks.
+    A lone CR is passed through so the UI can redraw progress bars in place.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending_cr = False
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        text = self._decoder.decode(data, final)
+        if self._pending_cr:
+            text = "\r" + text
+            self._pending_cr = False
+        # A trailing CR might be the first half of a CRLF; wait for the next chunk
+        if text.endswith("\r") and not final:
+            text = text[:-1]
+            self._pending_cr = True
+        return text.replace("\r\n", "\n")
+
+class AnsiStripper:
+    """
+    Incrementally removes ANSI escape sequences from decoded output chunks.
+    A sequence split across chunks is held back until the next one, so no
+    fragment of it is left behind. An unterminated sequence longer than
+    MAX_PENDING characters is not held, and is stripped as far as possible.
+    """
+
+    MAX_PENDING = 4096
+
+    def __init__(self):
+        self._pending = ""
+
+    def strip(self, text: str, final: bool = False) -> str:
+        text = self._pending + text
+        self._pending = ""
+        if "\x1b" not in text:
+            return text
+        if not final:
+            partial = ANSI_PARTIAL.search(text, max(0, len(text) - self.MAX_PENDING))
+            if partial:
+                self._pending = partial.group()
+                text = text[:partial.start()]
+        return ANSI_ESCAPE.sub("", text)
+
+async def _open_pty_reader(master_fd: int) -> asyncio.StreamReader:
+    """Wraps the master side of a PTY in an asyncio StreamReader."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader, loop=loop),
+        os.fdopen(master_fd, "rb", buffering=0),
+    )
+    return reader
+
+async def _spawn_pty(command: str) -> tuple[asyncio.subprocess.Process, asyncio.StreamReader]:
+    """
+    Starts the command on a pseudo-terminal.
+    Programs see a TTY, so they line-buffer their output and keep colors enabled.
+    """
+    master_fd, slave_fd = pty.openpty()
+    columns, lines = shutil.get_terminal_size()
+    fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, struct.pack("HHHH", lines, columns, 0, 0))
+    try:
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            start_new_session=True,
+        )
+    except Exception:
+        os.close(master_fd)
+        raise
+    finally:
+        # The child holds its own copy; ours must be closed so EOF is seen when it exits
+        os.close(slave_fd)
+    return process, await _open_pty_reader(master_fd)
+
+async def _read_chunk(stream: asyncio.StreamReader, chunk_size: int) -> bytes:
+    try:
+        return await stream.read(chunk_size)
+    except OSError as e:
+        # Linux reports EIO on the PTY master once the child side is closed
+        if e.errno == errno.EIO:
+            return b""
+        raise
+
+async def execute_command(command: str, output_callback: Callable[[str], Awaitable[None]], max_buffer_size: int = 1024 * 1024, chunk_size: int = READ_CHUNK_SIZE, use_pty: bool = False, capture: Optional[OutputCapture] = None) -> tuple[int, str]:
     """
     Executes a shell command and streams the output to the callback.
+    Output is read in chunks of up to chunk_size bytes, with one callback per chunk.
+    With use_pty the command runs on a pseudo-terminal instead of pipes.
     Handles built-in commands like 'cd' and 'exit'.
     Returns (exit_code, full_output).
-    full_output is truncated to the last max_buffer_size bytes if it exceeds the limit.
+    full_output is truncated to the last max_buffer_size bytes if it exceeds the limit,
+    and has ANSI escape sequences removed.
+    Pass an OutputCapture to keep the complete output on disk; its own size limit
+    then replaces max_buffer_size. The caller is responsible for closing it.
     """
     command = command.strip()
     if not command:
         return 0, ""
 
-    full_output = []
-    current_size = 0
+    if capture is None:
+        capture = OutputCapture(max_buffer_size)
+
+    stripper = AnsiStripper()
 
     async def wrapped_callback(text: str):
-        nonlocal current_size
-        full_output.append(text)
-        current_size += len(text)
-        
-        # Simple truncation strategy: if we exceed 2x buffer, slice to 1x buffer
-        # This avoids slicing on every append
-        if current_size > max_buffer_size * 2:
-            # Reconstruct string to slice correctly
-            temp_str = "".join(full_output)
-            temp_str = temp_str[-max_buffer_size:]
-            full_output.clear()
-            full_output.append(temp_str)
-            current_size = len(temp_str)
-            
+        capture.append(stripper.strip(text))
         await output_callback(text)
 
     # Handle built-in commands
@@ -59,35 +161,31 @@ async def execute_command(command: str, output_callback: Callable[[str], Awaitab
 
     # Run external commands
     try:
-        process = await asyncio.create_subprocess_shell(
-            command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
+        if use_pty:
+            process, stream = await _spawn_pty(command)
+        else:
+            # stderr is merged into stdout so chunks keep the order the child wrote them in
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            stream = process.stdout
 
-        # Helper to read stream
-        async def read_stream(stream):
-            while True:
-                line = await stream.readline()
-                if not line:
-                    break
-                decoded_line = line.decode('utf-8', errors='replace')
-                await wrapped_callback(decoded_line)
-
-        # Run both readers concurrently
-        await asyncio.gather(
-            read_stream(process.stdout),
-            read_stream(process.stderr)
-        )
+        # read() returns as soon as any data is available, so chunking adds no latency
+        # and isn't bound by the StreamReader line limit
+        decoder = StreamDecoder()
+        while True:
+            chunk = await _read_chunk(stream, chunk_size)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                await wrapped_callback(text)
+            if not chunk:
+                break
+        capture.append(stripper.strip("", final=True))
 
         await process.wait()
-        
-        # Final truncation check
-        final_str = "".join(full_output)
-        if len(final_str) > max_buffer_size:
-            final_str = final_str[-max_buffer_size:]
-            
-        return process.returncode, final_str
+        return process.returncode, capture.getvalue()
 
     except Exception as e:
         msg = f"Error executing command: {str(e)}\n"
@@ -1,12 +1,67 @@
 import os
-import yaml
 from typing import Any, Dict
+from utils.capture import MAX_SPILL_BYTES
 
 DEFAULT_CONFIG = {
     "theme": "default",
     "ai_provider": "gemini",
+    # Model used when ai_provider is gemini
+    "gemini_model": "gemini-flash-latest",
     "history_file": os.path.expanduser("~/.imartty_history.db"),
-    "auto_scroll": True
+    # Oldest commands are pruned beyond this many (null keeps them all)
+    "history_max_entries": None,
+    "history_max_output_bytes": 64 * 1024 * 1024,
+    "auto_scroll": True,
+    "execution_backend": "pipe",
+    "output_buffer_size": 1024 * 1024,
+    "spill_output": True,
+    "spill_max_bytes": MAX_SPILL_BYTES,
+    "spill_compress": False,
+    "render_fps": 60,
+    "scrollback_lines": 10000,
+    "scrollback_bytes": 8 * 1024 * 1024,
+    "scrollback_overscan": 50,
+    # Keyword -> severity (warning, error, critical) for /analyze; None uses the built-in list
+    "log_keywords": None,
+    # Logs at least this big are scanned on all cores (null disables it)
+    "log_parallel_threshold": 256 * 1024 * 1024,
+    "log_parallel_workers": None,
+    # Group every error in the log by signature and rank them (needs a full scan)
+    "analyze_digest": True,
+    # Scan state of analyzed logs, so re-analyzing only reads appended lines (null disables it)
+    "log_index_dir": os.path.expanduser("~/.cache/imartty/log-index"),
+    # /analyze --follow: seconds without new incidents before the AI summary, its upper bound,
+    # and how often the file is checked when change notifications are unavailable or missed
+    "follow_debounce": 2.0,
+    "follow_max_delay": 10.0,
+    "follow_poll_interval": 1.0,
+    # Token budget for the digest and excerpt /analyze sends to the AI, by "provider/model",
+    # then provider, then "default"; context around the error grows until it is filled
+    # (null keeps a fixed 20-line window)
+    "prompt_token_budget": {"gemini": 8000, "ollama": 2000, "default": 4000},
+    # Identical AI requests are answered from this cache (null keeps it in memory only)
+    "ai_cache_file": os.path.expanduser("~/.cache/imartty/ai-cache.db"),
+    "ai_cache_memory_entries": 256,
+    "ai_cache_max_bytes": 16 * 1024 * 1024,
+    # Seconds a cached answer stays valid, per request type (null never expires)
+    "ai_cache_ttl": {
+        "get_command_suggestion": 7 * 24 * 3600,
+        "explain_command": 30 * 24 * 3600,
+        "fix_command": 24 * 3600,
+        "analyze_log": 3600,
+    },
+    # false sends every request to the provider
+    "ai_cache_enabled": True,
+    # Ollama server and model; seconds to wait for a connection and for each response chunk,
+    # retries for unreachable or starting servers, and how long Ollama keeps the model loaded
+    "ollama_url": "http://localhost:11434",
+    "ollama_model": "llama3",
+    "ollama_connect_timeout": 3.05,
+    "ollama_read_timeout": 120.0,
+    "ollama_retries": 2,
+    "ollama_keep_alive": "10m",
+    # Load the model in the background at startup so the first request doesn't wait for it
+    "ai_warm_up": True
 }
 
 class ConfigManager:
@@ -20,6 +75,8 @@ class ConfigManager:
             return DEFAULT_CONFIG.copy()
         
         try:
+            # Imported here: without a config file it isn't needed at startup
+            import yaml
             with open(self.config_path, 'r') as f:
                 user_config = yaml.safe_load(f) or {}
                 # Merge with defaults
@@ -42,6 +99,7 @@ class ConfigManager:
     def _save_config(self):
         """Save current config to file."""
         try:
+            import yaml
             with open(self.config_path, 'w') as f:
                 yaml.dump(self.config, f)
         except Exception as e:
@@ -1,63 +1,463 @@
+import hashlib
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import threading
+import zlib
+from datetime import datetime, timezone
 from typing import List, Tuple, Optional
+from utils.logger import get_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = get_logger("history")
 
 class HistoryManager:
-    def __init__(self, db_path: str = "history.db"):
+    """
+    Command history stored in SQLite.
+
+    The database runs in WAL mode, so several ImarTTY instances can share it
+    without blocking each other's reads. Inserts are queued and written in
+    batches by a background thread, so add_entry never waits on disk I/O.
+    Reads don't wait for it either: entries still queued are merged into the
+    results of get_recent and search (with None as their id).
+
+    Command output is kept out of the history table: it is compressed into an
+    `outputs` table keyed by its SHA-256, so identical outputs are stored once,
+    and only loaded by get_output. Old entries and outputs are pruned to stay
+    within max_entries and max_output_bytes (checked every retention_interval
+    write batches and on close), and the freed pages are returned to the
+    filesystem with incremental vacuum.
+    """
+
+    # Maximum number of queued inserts committed in one transaction
+    WRITE_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        db_path: str = "history.db",
+        busy_timeout: float = 5.0,
+        max_entries: Optional[int] = None,
+        max_output_bytes: Optional[int] = None,
+        retention_interval: int = 50,
+    ):
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        # Retention limits; None means unlimited
+        self.max_entries = max_entries
+        self.max_output_bytes = max_output_bytes
+        # Measuring the stored outputs scans the whole table, so it isn't done on every batch
+        self.retention_interval = max(1, retention_interval)
+
+        # Long-lived connection for reads; the writer thread has its own
+        self._conn = self._connect()
+        self._lock = threading.Lock()
         self._init_db()
+        self.fts_enabled = self._init_fts()
+
+        self._queue: "queue.Queue[Optional[Tuple[str, int, str]]]" = queue.Queue()
+        # (command, timestamp, exit_code) of queued entries, oldest first. Guarded by _lock,
+        # which the writer also holds to commit, so a read sees each entry exactly once
+        self._pending: List[Tuple[str, str, int]] = []
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        # Only takes effect on a new database, so it must come before anything writes to it
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints; a crash can lose the last few
+        # commands but never corrupts the database
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
 
     def _init_db(self):
         """Initialize the database table if it doesn't exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                command TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                exit_code INTEGER,
-                output_snippet TEXT
-            )
-        """)
-        conn.commit()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    command TEXT NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    exit_code INTEGER,
+                    output_snippet TEXT
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outputs (
+                    hash TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BLOB NOT NULL
+                )
+            """)
+            # output_snippet held the raw output in older databases; new rows reference outputs instead
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(history)")]
+            if "output_hash" not in columns:
+                self._conn.execute("ALTER TABLE history ADD COLUMN output_hash TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_output_hash ON history(output_hash)")
+
+    def _init_fts(self) -> bool:
+        """
+        Mirror commands into an FTS5 trigram index kept in sync by triggers.
+        Returns False (and search falls back to LIKE) if SQLite lacks FTS5/trigram.
+        """
+        try:
+            with self._lock, self._conn:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+                ).fetchone()
+                self._conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                        command, content='history', content_rowid='id', tokenize='trigram'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                        INSERT INTO history_fts(rowid, command) VALUES (new.id, new.command);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                        INSERT INTO history_fts(history_fts, rowid, command) VALUES ('delete', old.id, old.command);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF command ON history BEGIN
+                        INSERT INTO history_fts(history_fts, rowid, command) VALUES ('delete', old.id, old.command);
+                        INSERT INTO history_fts(rowid, command) VALUES (new.id, new.command);
+                    END;
+                """)
+                if not exists:
+                    # Index commands recorded before the FTS table existed
+                    self._conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 trigram index unavailable, using LIKE search: {e}")
+            return False
+
+    def _write_loop(self):
+        """Writer thread: drains the queue and commits inserts in batches."""
+        conn = self._connect()
+        try:
+            self._migrate(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to migrate history outputs: {e}")
+        running = True
+        # Starts due, so limits lowered since the last run apply to the first batch
+        batches = self.retention_interval
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None is the shutdown sentinel
+            rows = [item for item in batch if item is not None]
+            running = len(rows) == len(batch)
+            try:
+                pruned = False
+                try:
+                    if rows:
+                        conn.executemany(
+                            "INSERT INTO history (command, exit_code, output_hash) VALUES (?, ?, ?)",
+                            [(command, exit_code, self._store_output(conn, output)) for command, exit_code, output in rows]
+                        )
+                        batches += 1
+                    if batches and (batches >= self.retention_interval or not running):
+                        pruned = self._apply_retention(conn)
+                        batches = 0
+                    with self._lock:
+                        conn.commit()
+                        del self._pending[:len(rows)]
+                except sqlite3.Error:
+                    conn.rollback()
+                    # The entries are lost; stop reporting them as queued
+                    with self._lock:
+                        del self._pending[:len(rows)]
+                    raise
+                if pruned:
+                    # Runs outside the transaction; hands freed pages back to the filesystem
+                    conn.executescript("PRAGMA incremental_vacuum")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(rows)} history entries: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
         conn.close()
 
-    def add_entry(self, command: str, exit_code: int = 0, output_snippet: str = ""):
-        """Add a new command entry to history."""
+    def _migrate(self, conn: sqlite3.Connection):
+        """Moves outputs stored inline by older versions into the outputs table."""
+        while True:
+            rows = conn.execute(
+                "SELECT id, output_snippet FROM history WHERE output_snippet IS NOT NULL LIMIT ?",
+                (self.WRITE_BATCH_SIZE,)
+            ).fetchall()
+            if not rows:
+                break
+            with conn:
+                conn.executemany(
+                    "UPDATE history SET output_hash = ?, output_snippet = NULL WHERE id = ?",
+                    [(self._store_output(conn, output), entry_id) for entry_id, output in rows]
+                )
+
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Databases created before incremental vacuum need one full VACUUM to switch modes
+            try:
+                conn.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not enable incremental vacuum: {e}")
+
+    def _store_output(self, conn: sqlite3.Connection, output: str) -> Optional[str]:
+        """Stores output once per distinct content. Returns its hash, or None if empty."""
+        if not output:
+            return None
+        data = output.encode("utf-8", errors="replace")
+        digest = hashlib.sha256(data).hexdigest()
+        if conn.execute("SELECT 1 FROM outputs WHERE hash = ?", (digest,)).fetchone() is None:
+            if zstandard is not None:
+                codec, blob = "zstd", zstandard.ZstdCompressor(level=3).compress(data)
+            else:
+                codec, blob = "zlib", zlib.compress(data, 6)
+            # Another instance sharing the database may have stored it since the check
+            conn.execute(
+                "INSERT OR IGNORE INTO outputs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                (digest, codec, len(data), blob)
+            )
+        return digest
+
+    def _apply_retention(self, conn: sqlite3.Connection) -> bool:
+        """Prunes history to the configured limits. Returns True if anything was deleted."""
+        pruned = False
+        if self.max_entries is not None:
+            cursor = conn.execute(
+                "DELETE FROM history WHERE id <= (SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            if cursor.rowcount > 0:
+                # Outputs only referenced by the deleted entries
+                conn.execute(
+                    "DELETE FROM outputs WHERE NOT EXISTS (SELECT 1 FROM history WHERE output_hash = outputs.hash)"
+                )
+                pruned = True
+
+        if self.max_output_bytes is not None:
+            total = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM outputs").fetchone()[0]
+            if total > self.max_output_bytes:
+                # Evict the outputs whose most recent use is oldest; the commands themselves are kept
+                stale = []
+                for digest, stored in conn.execute("""
+                    SELECT hash, LENGTH(data) FROM outputs
+                    ORDER BY (SELECT MAX(id) FROM history WHERE output_hash = outputs.hash)
+                """):
+                    if total <= self.max_output_bytes:
+                        break
+                    stale.append((digest,))
+                    total -= stored
+                conn.executemany("UPDATE history SET output_hash = NULL WHERE output_hash = ?", stale)
+                conn.executemany("DELETE FROM outputs WHERE hash = ?", stale)
+                pruned = True
+        return pruned
+
+    def add_entry(self, command: str, exit_code: int = 0, output: str = ""):
+        """Queue a new command entry; it is written by the background thread."""
         if not command.strip():
             return
-            
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO history (command, exit_code, output_snippet) VALUES (?, ?, ?)",
-            (command, exit_code, output_snippet)
-        )
-        conn.commit()
-        conn.close()
+        # Same format as SQLite's CURRENT_TIMESTAMP
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._pending.append((command, timestamp, exit_code))
+            self._queue.put((command, exit_code, output))
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Write pending entries and close the database."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params: tuple) -> List[Tuple[int, str, str, int]]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _query_with_pending(self, sql: str, params: tuple, limit: int, match=None) -> List[Tuple[Optional[int], str, str, int]]:
+        """
+        Runs sql (newest first) and puts the queued entries accepted by match
+        (all if None) in front of its rows, without waiting for the writer.
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            pending = self._pending_rows(match)
+        return self._merge(pending, rows, limit)
 
-    def get_recent(self, limit: int = 50) -> List[Tuple[int, str, str, int]]:
-        """Get recent commands."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
+    def _pending_rows(self, match=None) -> List[Tuple[None, str, str, int]]:
+        """Queued entries accepted by match, newest first. Call with _lock held."""
+        return [
+            (None, command, timestamp, exit_code)
+            for command, timestamp, exit_code in reversed(self._pending)
+            if match is None or match(command)
+        ]
+
+    def _merge(self, pending: list, rows: list, limit: int) -> list:
+        if self.max_entries is not None:
+            # Retention hasn't pruned for the queued entries yet
+            limit = min(limit, self.max_entries)
+        return (pending + rows)[:limit]
+
+    def get_recent(self, limit: int = 50) -> List[Tuple[Optional[int], str, str, int]]:
+        """Get recent commands, including queued ones."""
+        return self._query_with_pending(
             "SELECT id, command, timestamp, exit_code FROM history ORDER BY id DESC LIMIT ?",
-            (limit,)
+            (limit,), limit
         )
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
-
-    def search(self, query: str) -> List[Tuple[int, str, str, int]]:
-        """Search history for a command."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, command, timestamp, exit_code FROM history WHERE command LIKE ? ORDER BY id DESC LIMIT 20",
-            (f"%{query}%",)
+
+    def get_recent_page(self, limit: int = 50) -> Tuple[List[Tuple[Optional[int], str, str, int]], int]:
+        """
+        Every queued entry and up to limit written ones, newest first, plus
+        the before_id to pass to get_before for the entries after them (which
+        also leaves out the queued entries: they get larger ids once written).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, command, timestamp, exit_code FROM history ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+            pending = self._pending_rows()
+            next_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM history").fetchone()[0]
+        page = self._merge(pending, rows, len(pending) + limit)
+        written = [entry_id for entry_id, _, _, _ in page if entry_id is not None]
+        return page, written[-1] if written else next_id
+
+    def get_before(self, before_id: Optional[int], limit: int = 50) -> List[Tuple[Optional[int], str, str, int]]:
+        """
+        Get the commands older than before_id, the id of a written entry (all,
+        including queued ones, if None), newest first.
+        """
+        if before_id is None:
+            return self.get_recent(limit)
+        # Keyset paging: walks the primary key index, so deep pages cost the same as the first
+        return self._query(
+            "SELECT id, command, timestamp, exit_code FROM history WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (before_id, limit)
         )
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+
+    def get_output(self, entry_id: Optional[int]) -> Optional[str]:
+        """Loads the output recorded for a history entry, or None if there is none (or it is still queued)."""
+        if entry_id is None:
+            return None
+        rows = self._query(
+            """
+            SELECT outputs.codec, outputs.data, history.output_snippet FROM history
+            LEFT JOIN outputs ON outputs.hash = history.output_hash
+            WHERE history.id = ?
+            """,
+            (entry_id,)
+        )
+        if not rows:
+            return None
+        codec, blob, legacy = rows[0]
+        if blob is None:
+            # Entry written by an older version and not migrated yet
+            return legacy
+        if codec == "zlib":
+            return zlib.decompress(blob).decode("utf-8", errors="replace")
+        if codec == "zstd" and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8", errors="replace")
+        logger.error(f"Cannot decode history output {entry_id}: codec {codec!r} is not available")
+        return None
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[Optional[int], str, str, int]]:
+        """Search history for commands containing query (case-insensitive), newest first, including queued ones."""
+        if not query:
+            return []
+        folded = query.casefold()
+
+        def match(command: str) -> bool:
+            return folded in command.casefold()
+
+        # Trigrams need at least 3 characters; shorter queries scan from the newest entry
+        if self.fts_enabled and len(query) >= 3:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return self._query_with_pending(
+                """
+                SELECT id, command, timestamp, exit_code FROM history
+                WHERE id IN (
+                    SELECT rowid FROM history_fts WHERE history_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+                )
+                ORDER BY id DESC
+                """,
+                (phrase, limit), limit, match
+            )
+
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._query_with_pending(
+            "SELECT id, command, timestamp, exit_code FROM history WHERE command LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?",
+            (pattern, limit), limit, match
+        )
+
+
+class HistoryCache:
+    """
+    Newest-first list of commands backing the input's history navigation.
+
+    Commands run in this session are pushed in memory; older ones are paged
+    in from the database on demand, one keyset query at a time, when
+    navigation runs past what is loaded. Consecutive duplicates are collapsed.
+    Indexing is O(1) apart from those page loads.
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, manager: HistoryManager, page_size: int = PAGE_SIZE):
+        self.manager = manager
+        self.page_size = page_size
+        # Pushed this session, oldest first
+        self._newer: List[str] = []
+        # Loaded from the database, newest first
+        self._older: List[str] = []
+        self._oldest_id: Optional[int] = None
+        self.exhausted = False
+        # The first page is loaded up front so pushes can never overlap a later page
+        self._load_page()
+
+    def __len__(self) -> int:
+        """Number of commands loaded so far."""
+        return len(self._newer) + len(self._older)
+
+    def __getitem__(self, index: int) -> str:
+        """Command at index (0 is the newest), loading older pages as needed."""
+        if index < 0:
+            raise IndexError(index)
+        while index >= len(self) and not self.exhausted:
+            self._load_page()
+        if index < len(self._newer):
+            return self._newer[-1 - index]
+        if index < len(self):
+            return self._older[index - len(self._newer)]
+        raise IndexError(index)
+
+    def push(self, command: str):
+        """Adds a command just run; it becomes index 0."""
+        if not command.strip():
+            return
+        if len(self) and self[0] == command:
+            return
+        self._newer.append(command)
+
+    def _load_page(self):
+        if self._oldest_id is None:
+            rows, self._oldest_id = self.manager.get_recent_page(self.page_size)
+        else:
+            rows = self.manager.get_before(self._oldest_id, self.page_size)
+            if rows:
+                self._oldest_id = rows[-1][0]
+        if sum(entry_id is not None for entry_id, _, _, _ in rows) < self.page_size:
+            self.exhausted = True
+        for _, command, _, _ in rows:
+            if self._older and self._older[-1] == command:
+                continue
+            self._older.append(command)
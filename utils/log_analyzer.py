@@ -1,116 +1,1359 @@
+import bz2
+import glob
+import gzip
+import hashlib
+import heapq
+import io
+import lzma
+import mmap
+import multiprocessing
 import os
-from typing import Optional, List, Tuple
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import BinaryIO, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from utils.log_index import LogIndex, LogIndexEntry
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Known severities, lowest first
+SEVERITY_LEVELS = ("warning", "error", "critical")
+
+
+def severity_rank(severity: Optional[str]) -> int:
+    """Position of severity in SEVERITY_LEVELS; -1 (below warning) if it is unknown or None."""
+    return SEVERITY_LEVELS.index(severity) if severity in SEVERITY_LEVELS else -1
+
+# Leading bytes of the compressed formats that are decompressed while scanning
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
+# app.log.1, app.log.2.gz (numbered) or app.log-20240501.gz (dateext), after the log's own name
+_ROTATED_SUFFIX = re.compile(r"[.-](\d+)(?:\.(?:gz|bz2|xz|zst))?")
+
+
+def detect_compression(file_path: str) -> Optional[str]:
+    """The compression format of file_path ("gzip", "bz2", "xz" or "zstd"), by magic bytes, or None."""
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for magic, codec in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def open_log(file_path: str, codec: Optional[str] = None) -> BinaryIO:
+    """Opens file_path for binary reading, decompressing codec (see detect_compression) as it is read."""
+    if codec is None:
+        return open(file_path, 'rb')
+    if codec == "gzip":
+        return gzip.open(file_path, 'rb')
+    if codec == "bz2":
+        return bz2.open(file_path, 'rb')
+    if codec == "xz":
+        return lzma.open(file_path, 'rb')
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed log; install the zstandard package to analyze it")
+        # Rotated logs are often several concatenated frames
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), read_across_frames=True, closefd=True)
+    raise ValueError(f"Unknown compression: {codec}")
+
+
+def rotation_set(file_path: str) -> List[str]:
+    """
+    file_path and its rotated generations that exist, oldest first:
+    app.log.3.gz, app.log.2.gz, app.log.1, app.log (numbered, logrotate's
+    default) or app.log-20240501.gz, app.log-20240502, app.log (dateext).
+    """
+    directory, base = os.path.split(os.path.abspath(file_path))
+    numbered = []
+    dated = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        names = []
+    for name in names:
+        if not name.startswith(base):
+            continue
+        match = _ROTATED_SUFFIX.fullmatch(name, len(base))
+        if match is None:
+            continue
+        path = os.path.join(os.path.dirname(file_path), name)
+        number = match.group(1)
+        if len(number) >= 8:
+            dated.append((number, path))
+        else:
+            numbered.append((int(number), path))
+    paths = [path for _, path in sorted(dated)] + [path for _, path in sorted(numbered, reverse=True)]
+    if os.path.exists(file_path):
+        paths.append(file_path)
+    return paths
+
+
+def expand_log_paths(pattern: str) -> List[str]:
+    """
+    The files named by a glob pattern (`**` matches subdirectories) or
+    directly inside a directory, sorted. A plain file path is returned as is.
+    """
+    expanded = os.path.expanduser(pattern)
+    if os.path.isdir(expanded):
+        paths = [entry.path for entry in os.scandir(expanded) if entry.is_file() and not entry.name.startswith(".")]
+    elif glob.has_magic(expanded):
+        paths = [path for path in glob.glob(expanded, recursive=True) if os.path.isfile(path)]
+    else:
+        return [pattern]
+    return sorted(paths)
+
+
+class LogChain:
+    """
+    Several logs read as one stream, in order, each decompressed on the fly.
+    A file that doesn't end with a newline gets one, so lines never join
+    across files. `starts` records the line each file begins at.
+    """
+
+    def __init__(self, paths: List[str]):
+        self._paths = list(paths)
+        self._current: Optional[BinaryIO] = None
+        self._last = b"\n"
+        self._lines = 1
+        self.starts: List[Tuple[str, int]] = []
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return b""
+                path = self._paths.pop(0)
+                self._current = open_log(path, detect_compression(path))
+                self.starts.append((path, self._lines))
+            data = self._current.read(size)
+            if data:
+                self._last = data[-1:]
+                self._lines += data.count(b"\n")
+                return data
+            self._current.close()
+            self._current = None
+            if self._last != b"\n":
+                self._last = b"\n"
+                self._lines += 1
+                return b"\n"
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def __enter__(self) -> "LogChain":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class KeywordMatcher:
+    """
+    Case-insensitive search for a set of keywords, each with a severity.
+
+    Keywords are lowercased once when the matcher is built. Callers lowercase
+    a whole block at a time (bytes.lower() runs in C), and each keyword is then
+    found with find/rfind, so lines that can't match are never split out or
+    decoded. With raw bytes only ASCII letters are case-folded.
+    """
+
+    def __init__(self, keywords: Dict[str, str]):
+        for keyword, severity in keywords.items():
+            if severity not in SEVERITY_LEVELS:
+                raise ValueError(f"Unknown severity {severity!r} for keyword {keyword!r}")
+        self.keywords = {keyword.lower(): severity for keyword, severity in keywords.items() if keyword}
+        self._needles = {
+            str: list(self.keywords),
+            bytes: [keyword.encode() for keyword in self.keywords],
+        }
+
+    def find(self, lowered: Union[str, bytes], start: int = 0, end: Optional[int] = None) -> int:
+        """Offset of the first keyword in an already-lowercased block, or -1. Matches start before end."""
+        hits = [
+            hit for hit in (lowered.find(needle, start, self._stop(lowered, needle, end)) for needle in self._needles[type(lowered)])
+            if hit != -1
+        ]
+        return min(hits, default=-1)
+
+    def rfind(self, lowered: Union[str, bytes], start: int = 0, end: Optional[int] = None) -> int:
+        """Offset of the last keyword in an already-lowercased block, or -1. Matches start before end."""
+        return max(
+            (lowered.rfind(needle, start, self._stop(lowered, needle, end)) for needle in self._needles[type(lowered)]),
+            default=-1
+        )
+
+    def finditer(self, lowered: Union[str, bytes], start: int = 0) -> Iterator[int]:
+        """Offsets of every keyword occurrence in an already-lowercased block, in order."""
+        needles = self._needles[type(lowered)]
+        # Next occurrence of each keyword; a keyword is only searched again once it is passed
+        heads = [(hit, i) for i, hit in enumerate(lowered.find(needle, start) for needle in needles) if hit != -1]
+        heapq.heapify(heads)
+        while heads:
+            hit, i = heads[0]
+            yield hit
+            following = lowered.find(needles[i], hit + 1)
+            if following == -1:
+                heapq.heappop(heads)
+            else:
+                heapq.heapreplace(heads, (following, i))
+
+    @staticmethod
+    def _stop(lowered, needle, end: Optional[int]) -> int:
+        return len(lowered) if end is None else end + len(needle) - 1
+
+    @property
+    def max_length(self) -> int:
+        """Length in bytes of the longest keyword."""
+        return max(map(len, self._needles[bytes]), default=0)
+
+    def severity(self, line: Union[str, bytes]) -> Optional[str]:
+        """Highest severity among the keywords on a line."""
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.lower()
+        found = [severity for keyword, severity in self.keywords.items() if keyword in line]
+        return max(found, key=SEVERITY_LEVELS.index, default=None)
+
+
+# Volatile parts of an error line, replaced in order to get its signature
+_SIGNATURE_PATTERNS = [
+    # 2026-01-01T12:00:00.123Z, 2026-01-01 12:00:00,123 +0200, 12:00:00
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2})?(?:[.,]\d+)?(?: ?(?:Z|[+-]\d{2}:?\d{2}))?"), "<TS>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<TS>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<UUID>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE), "<HEX>"),
+    # Hashes and request IDs (long numbers too, as some IDs happen to have no letters);
+    # requiring a digit leaves words like "deadline" alone
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{6,}\b", re.IGNORECASE), "<HEX>"),
+    (re.compile(r"(?<![\w/])(?:[A-Za-z]:\\|~?\.{0,2}/)[\w.@+-]+(?:[\\/][\w.@+-]+)*"), "<PATH>"),
+    (re.compile(r"\d+"), "<N>"),
+    (re.compile(r"\s+"), " "),
+]
+
+# Only the start of very long lines counts towards their signature
+SIGNATURE_MAX_CHARS = 500
+
+# Longest sample line kept per cluster
+SAMPLE_MAX_CHARS = 300
+
+
+# 2024-05-01T10:00:00.123+02:00, 2024-05-01 10:00:00,123, 2024/05/01 10:00:00
+_TIMESTAMP = re.compile(
+    r"(\d{4})[-/](\d{2})[-/](\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6})\d*)?(?: ?(Z|[+-]\d{2}:?\d{2}))?"
+)
+
+
+def parse_timestamp(line: str) -> Optional[datetime]:
+    """The first ISO-like timestamp in line (UTC if it has an offset, else as written), or None."""
+    match = _TIMESTAMP.search(line[:SIGNATURE_MAX_CHARS])
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    try:
+        parsed = datetime(
+            int(year), int(month), int(day), int(hour), int(minute), int(second),
+            int(fraction.ljust(6, "0")) if fraction else 0,
+        )
+        if zone and zone != "Z":
+            zone = zone.replace(":", "")
+            offset = (int(zone[1:3]) * 60 + int(zone[3:5])) * (1 if zone[0] == "+" else -1)
+            parsed -= timedelta(minutes=offset)
+        return parsed
+    except ValueError:
+        return None
+
+
+def error_signature(line: str) -> str:
+    """Normalizes an error line so occurrences differing only in timestamps, IDs, paths or numbers match."""
+    signature = line[:SIGNATURE_MAX_CHARS]
+    for pattern, replacement in _SIGNATURE_PATTERNS:
+        signature = pattern.sub(replacement, signature)
+    return signature.strip()
+
+
+# Rough number of ASCII characters per token for English text, code and logs
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast local estimate of the token count of text: one token per
+    CHARS_PER_TOKEN ASCII characters, and one per non-ASCII character
+    (conservative for CJK and symbols).
+    """
+    if text.isascii():
+        return -(-len(text) // CHARS_PER_TOKEN)
+    ascii_length = len(text.encode("ascii", errors="ignore"))
+    return -(-ascii_length // CHARS_PER_TOKEN) + len(text) - ascii_length
+
+
+def truncate_middle(line: str, max_chars: int) -> str:
+    """line cut to about max_chars by dropping its middle, which keeps both the start and the end."""
+    if len(line) <= max_chars:
+        return line
+    keep = max_chars // 2
+    return f"{line[:keep]} ...[{len(line) - 2 * keep} chars cut]... {line[len(line) - keep:]}"
+
+
+@dataclass
+class ErrorCluster:
+    """Every occurrence of one error signature."""
+    signature: str
+    severity: Optional[str]
+    # First occurrence, verbatim
+    sample: str
+    first_line: int
+    first_offset: int
+    last_line: int
+    last_offset: int
+    count: int = 1
+    # File the lines are in, when several files were analyzed together
+    source: Optional[str] = None
+
+
+class ErrorClusters:
+    """
+    Groups error lines by signature, keeping counts and the first and last
+    position of each. Memory is bounded by max_clusters: after that, lines
+    with new signatures are only counted in `overflow`.
+    """
+
+    def __init__(self, max_clusters: int = 1000):
+        self.max_clusters = max_clusters
+        self.clusters: Dict[str, ErrorCluster] = {}
+        self.total = 0
+        self.overflow = 0
+
+    def add(self, line: str, severity: Optional[str], line_number: int, offset: int):
+        self.total += 1
+        signature = error_signature(line)
+        cluster = self.clusters.get(signature)
+        if cluster is not None:
+            cluster.count += 1
+            cluster.last_line = line_number
+            cluster.last_offset = offset
+        elif len(self.clusters) < self.max_clusters:
+            sample = line.strip()[:SAMPLE_MAX_CHARS]
+            self.clusters[signature] = ErrorCluster(signature, severity, sample, line_number, offset, line_number, offset)
+        else:
+            self.overflow += 1
+
+    def merge(self, other: "ErrorClusters", line_shift: int = 0):
+        """Adds the clusters of the next part of the same file, whose line numbers restart after line_shift lines."""
+        self.total += other.total
+        self.overflow += other.overflow
+        for signature, theirs in other.clusters.items():
+            ours = self.clusters.get(signature)
+            if ours is not None:
+                ours.count += theirs.count
+                ours.last_line = theirs.last_line + line_shift
+                ours.last_offset = theirs.last_offset
+            elif len(self.clusters) < self.max_clusters:
+                theirs.first_line += line_shift
+                theirs.last_line += line_shift
+                self.clusters[signature] = theirs
+            else:
+                self.overflow += theirs.count
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form, for the log index."""
+        return {
+            "max_clusters": self.max_clusters,
+            "total": self.total,
+            "overflow": self.overflow,
+            "clusters": [asdict(cluster) for cluster in self.clusters.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ErrorClusters":
+        clusters = cls(data["max_clusters"])
+        clusters.total = data["total"]
+        clusters.overflow = data["overflow"]
+        for cluster in data["clusters"]:
+            clusters.clusters[cluster["signature"]] = ErrorCluster(**cluster)
+        return clusters
+
+    def ranked(self) -> List[ErrorCluster]:
+        """Most severe first; within a severity the rarest, then the earliest (likely root causes)."""
+        return sorted(
+            self.clusters.values(),
+            key=lambda cluster: (-severity_rank(cluster.severity), cluster.count, cluster.first_line)
+        )
+
+    def digest(self, limit: int = 10) -> str:
+        """Compact listing of the top clusters, one line each."""
+        if not self.clusters:
+            return ""
+        ranked = self.ranked()
+        lines = [f"{len(ranked)} distinct error(s) in {self.total} matching line(s), most severe and rarest first:"]
+        for i, cluster in enumerate(ranked[:limit], 1):
+            where = f"line {cluster.first_line}" if cluster.count == 1 else f"lines {cluster.first_line}-{cluster.last_line}"
+            lines.append(f"{i}. [{cluster.severity}] x{cluster.count}, {where}: {cluster.sample}")
+        if len(ranked) > limit:
+            lines.append(f"... and {len(ranked) - limit} more distinct error(s)")
+        if self.overflow:
+            lines.append(f"... and {self.overflow} more line(s) with other signatures")
+        return "\n".join(lines)
+
+
+@dataclass
+class AnalysisReport:
+    """Result of analyzing a log."""
+    summary: str
+    # Context window around the most relevant line
+    chunk: str = ""
+    severity: Optional[str] = None
+    # Index of the matched line in chunk
+    focus: int = 0
+    clusters: List[ErrorCluster] = field(default_factory=list)
+    digest: str = ""
+    # Handoff prompt for another agent
+    prompt: str = ""
+    # Set if the log couldn't be read
+    error: Optional[str] = None
+
+    @property
+    def log_excerpt(self) -> str:
+        """What to send to the AI: the digest (if any) and the chunk."""
+        if not self.digest:
+            return self.chunk
+        return f"[Error Digest]\n{self.digest}\n\n[Log Excerpt]\n{self.chunk}"
+
+
+class _Excerpt(NamedTuple):
+    """Context window text, the severity of its line and that line's index in the window."""
+    chunk: str
+    severity: Optional[str]
+    focus: int = 0
+
+
+@dataclass
+class _ScanResult:
+    """Outcome of a forward scan. Lines are (start, end) byte offsets in the file."""
+    window: List = field(default_factory=list)
+    # Index of the matched line in window
+    focus: int = 0
+    severity: Optional[str] = None
+    query_line: Optional[Tuple[int, int]] = None
+    keyword_line: Optional[Tuple[int, int]] = None
+    newlines: int = 0
+
+
+def _scan_range(
+    path: str,
+    start: int,
+    end: int,
+    keywords: Dict[str, str],
+    query: Optional[str],
+    block_size: int,
+    collect: bool,
+    context_lines: int,
+) -> Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]], int, Optional[ErrorClusters]]:
+    """
+    Process pool worker: forward-scans the whole lines in [start, end) of path.
+    Returns the first query line, the last keyword line, the number of newlines
+    in the range and, if collect is set, its clusters (line numbers relative to the range).
+    """
+    analyzer = LogAnalyzer(keywords, parallel_threshold=None)
+    analyzer.BLOCK_SIZE = block_size
+    analyzer.context_lines = context_lines
+    clusters = ErrorClusters() if collect else None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        result = analyzer._forward_scan(analyzer._iter_blocks(mm, end - start), query, clusters, offset=start)
+    return result.query_line, result.keyword_line, result.newlines, clusters
+
 
 class LogAnalyzer:
     """
     Analyzes log files to extract errors and generate agent-ready prompts.
+
+    Files are scanned in a single streaming pass over blocks of raw bytes,
+    keeping only the context window around the best match so far, so memory
+    use does not depend on the size of the log. Without a query, uncompressed
+    files are read backwards from the end instead, stopping at the newest
+    error, so the cost depends on how far back that error is rather than on
+    the file size.
+
+    With an index, the scan state of each file is kept on disk and a
+    re-analysis of a grown log only scans the appended bytes.
     """
     
-    # Keywords that suggest an error
-    ERROR_KEYWORDS = [
-        "Error", "Exception", "Traceback", "Panic", "Fatal", 
-        "CRITICAL", "FAIL", "Caused by"
-    ]
-    
-    # Max file size to process (10MB)
-    MAX_FILE_SIZE = 10 * 1024 * 1024
+    # Keywords that suggest an error, with their severity
+    ERROR_KEYWORDS = {
+        "Error": "error",
+        "Exception": "error",
+        "Traceback": "error",
+        "Panic": "critical",
+        "Fatal": "critical",
+        "CRITICAL": "critical",
+        "FAIL": "error",
+        "Caused by": "error",
+    }
     
     # Lines of context to capture around an error
     CONTEXT_LINES = 20
 
-    def analyze_file(self, file_path: str, query: Optional[str] = None) -> Tuple[str, str]:
+    # With a prompt budget, context is captured up to this many lines around
+    # an error, and as much of it as fits the budget is kept
+    BUDGET_CONTEXT_LINES = 200
+
+    # Tokens for the prompt text around the digest and excerpt
+    PROMPT_OVERHEAD_TOKENS = 150
+
+    # The excerpt gets at least this many tokens, however long the digest is
+    MIN_EXCERPT_TOKENS = 256
+
+    # Longer lines are split into pieces of this size, bounding memory per line
+    MAX_LINE_BYTES = 64 * 1024
+
+    # Read size for scanning, forwards or backwards
+    BLOCK_SIZE = 256 * 1024
+
+    # Uncompressed files at least this big are scanned by a process pool
+    PARALLEL_THRESHOLD = 256 * 1024 * 1024
+
+    # Files analyzed at once by analyze_many
+    FILE_WORKERS = 8
+
+    def __init__(
+        self,
+        keywords: Optional[Dict[str, str]] = None,
+        parallel_threshold: Optional[int] = PARALLEL_THRESHOLD,
+        workers: Optional[int] = None,
+        index: Optional[LogIndex] = None,
+        prompt_budget: Optional[int] = None,
+    ):
+        """
+        keywords maps each keyword to its severity; defaults to ERROR_KEYWORDS.
+        Files of parallel_threshold bytes or more (None disables it) are split
+        across workers processes, one per core by default.
+        index stores the scan state of analyzed files (used for the digest without a query).
+        prompt_budget (tokens) sizes the digest and excerpt sent to the AI:
+        context grows around the match until it is used up, and over-long
+        lines are cut in the middle. None keeps CONTEXT_LINES of context.
+        """
+        self.matcher = KeywordMatcher(self.ERROR_KEYWORDS if keywords is None else keywords)
+        self.parallel_threshold = parallel_threshold
+        self.workers = workers or os.cpu_count() or 1
+        self.index = index
+        self.prompt_budget = prompt_budget
+        self.context_lines = self.CONTEXT_LINES if prompt_budget is None else self.BUDGET_CONTEXT_LINES
+
+    def analyze(
+        self,
+        file_path: str,
+        query: Optional[str] = None,
+        source_name: Optional[str] = None,
+        digest: bool = True,
+    ) -> AnalysisReport:
         """
-        Reads the file and returns a tuple (analysis_summary, handoff_prompt).
+        Scans the file and returns an AnalysisReport.
+        With digest, every error line is clustered by signature; that needs a
+        full pass, so the reverse scan's early exit isn't used. Without a query,
+        the index (if any) limits that pass to what was appended since the last run.
+        Compressed files (gzip, bz2, xz, zstd; detected by magic bytes) are
+        decompressed on the fly.
+        source_name replaces the file name in the prompt (e.g. for temp files).
         """
         if not os.path.exists(file_path):
-            return f"Error: File not found: {file_path}", ""
-            
-        if os.path.getsize(file_path) > self.MAX_FILE_SIZE:
-            # For large files, read only the last 1MB
-            try:
-                with open(file_path, 'rb') as f:
-                    f.seek(-1024 * 1024, 2) # Seek to 1MB before end
-                    content = f.read().decode('utf-8', errors='replace')
-                    # Discard first partial line
-                    lines = content.splitlines(keepends=True)[1:]
-                    # Discard first partial line
-                    lines = content.splitlines(keepends=True)[1:]
-            except Exception as e:
-                return f"Error reading large file: {str(e)}", ""
+            return AnalysisReport(f"Error: File not found: {file_path}", error="not found")
+
+        clusters = ErrorClusters() if digest else None
+        try:
+            codec = detect_compression(file_path)
+            compressed = codec is not None
+            with open_log(file_path, codec) as f:
+                if not compressed and not query and clusters is not None and self.index is not None:
+                    excerpt = self._scan_indexed(file_path, f, clusters)
+                elif not compressed and self._use_parallel(file_path, query):
+                    excerpt = self._scan_parallel(file_path, f, query, clusters)
+                else:
+                    # Seeking backwards in a compressed stream means decompressing from the start again
+                    excerpt = self._scan(f, query, reverse=not compressed, clusters=clusters)
+        except Exception as e:
+            return AnalysisReport(f"Error reading file: {str(e)}", error=str(e))
+        return self._report(excerpt, clusters, source_name or file_path, query)
+
+    def analyze_file(self, file_path: str, query: Optional[str] = None, source_name: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Scans the file and returns a tuple (analysis_summary, handoff_prompt).
+        """
+        report = self.analyze(file_path, query, source_name)
+        return report.summary, report.prompt
+
+    def analyze_rotated(self, file_path: str, query: Optional[str] = None, digest: bool = True) -> AnalysisReport:
+        """
+        Analyzes file_path and its rotated generations (see rotation_set) as
+        one stream, oldest first. Line numbers count from the start of the
+        oldest file; the digest lists where each file starts.
+        """
+        paths = rotation_set(file_path)
+        if not paths:
+            return AnalysisReport(f"Error: File not found: {file_path}", error="not found")
+
+        clusters = ErrorClusters() if digest else None
+        try:
+            with LogChain(paths) as chain:
+                excerpt = self._scan(chain, query, reverse=False, clusters=clusters)
+        except Exception as e:
+            return AnalysisReport(f"Error reading file: {str(e)}", error=str(e))
+
+        starts = ", ".join(f"{os.path.basename(path)} from line {line}" for path, line in chain.starts)
+        note = f"{len(paths)} file(s), oldest first: {starts}"
+        return self._report(excerpt, clusters, file_path, query, note=note)
+
+    def analyze_many(
+        self,
+        file_paths: List[str],
+        query: Optional[str] = None,
+        source_name: Optional[str] = None,
+        digest: bool = True,
+    ) -> AnalysisReport:
+        """
+        Analyzes several logs concurrently (up to FILE_WORKERS at a time) and
+        merges them into one report: errors with the same signature are
+        grouped across files and ranked like a single digest, and their first
+        occurrences are listed in timestamp order where timestamps parse.
+        source_name (e.g. the glob pattern) names the set in the prompt.
+        """
+        if not file_paths:
+            return AnalysisReport(f"Error: No files match {source_name or 'the given paths'}", error="no files")
+        if len(file_paths) == 1:
+            return self.analyze(file_paths[0], query, source_name, digest)
+
+        # Threads: decompression and file reads release the GIL, and files
+        # above parallel_threshold still get their own process pool
+        with ThreadPoolExecutor(max_workers=min(self.FILE_WORKERS, len(file_paths))) as pool:
+            reports = list(pool.map(lambda path: self.analyze(path, query, digest=digest), file_paths))
+        return self._merge_reports(file_paths, reports, query, source_name or f"{len(file_paths)} files")
+
+    def _merge_reports(
+        self,
+        file_paths: List[str],
+        reports: List[AnalysisReport],
+        query: Optional[str],
+        source_name: str,
+    ) -> AnalysisReport:
+        """Combines per-file reports (in file_paths order) into one."""
+        failed = [(path, report.error) for path, report in zip(file_paths, reports) if report.error]
+        found = [(path, report) for path, report in zip(file_paths, reports) if report.chunk]
+        failures = "".join(f" Could not read {os.path.basename(path)}: {error}." for path, error in failed)
+        if not found:
+            return AnalysisReport(f"No obvious errors or matching lines found in {len(file_paths)} file(s).{failures}")
+
+        # Signature -> the cluster of each file it occurs in
+        groups: Dict[str, List[ErrorCluster]] = {}
+        for path, report in found:
+            for cluster in report.clusters:
+                groups.setdefault(cluster.signature, []).append(replace(cluster, source=path))
+        ranked = sorted(groups.values(), key=self._group_rank)
+
+        # The excerpt comes from the file with the top-ranked error, or else
+        # (without a digest) the most severe file
+        if ranked:
+            top_source = ranked[0][0].source
+            path, report = next((path, report) for path, report in found if path == top_source)
         else:
-            try:
-                with open(file_path, 'r', errors='replace') as f:
-                    lines = f.readlines()
-            except Exception as e:
-                return f"Error reading file: {str(e)}", ""
+            path, report = max(found, key=lambda item: severity_rank(item[1].severity))
+        severity = report.severity if not ranked else max(
+            (cluster.severity for cluster in ranked[0]), key=severity_rank
+        )
 
-        return self._analyze_lines(lines, file_path, query)
+        digest = self._merged_digest(ranked, len(found), len(file_paths)) if ranked else ""
+        header = f"==> {os.path.basename(path)} <=="
+        excerpt = _Excerpt(report.chunk, report.severity, report.focus)
+        if self.prompt_budget is not None:
+            # Each file was fitted with its own digest; refit for the merged one
+            budget = self.prompt_budget - self.PROMPT_OVERHEAD_TOKENS - estimate_tokens(header) - 1
+            if digest and estimate_tokens(digest) > budget - self.MIN_EXCERPT_TOKENS:
+                # Leading lines of the digest: the top-ranked errors
+                digest = self._fit_budget(_Excerpt(digest, None), budget - self.MIN_EXCERPT_TOKENS).chunk
+            excerpt = self._fit_budget(excerpt, budget - estimate_tokens(digest))
+        chunk = f"{header}\n{excerpt.chunk}"
+        summary = f"Analysis complete. Found potential issues in {len(found)} of {len(file_paths)} file(s)"
+        if severity:
+            summary += f" (severity: {severity})"
+        summary += "."
+        if ranked:
+            total = sum(cluster.count for group in ranked for cluster in group)
+            summary += f" {len(ranked)} distinct error(s) in {total} line(s)."
+        summary += failures
+        return AnalysisReport(
+            summary,
+            chunk=chunk,
+            severity=severity,
+            focus=excerpt.focus + 1,
+            clusters=[cluster for group in ranked for cluster in group],
+            digest=digest,
+            prompt=self._generate_handoff_prompt(source_name, chunk, query, digest, multiple=True),
+        )
 
-    def analyze_string(self, content: str, source_name: str = "Output", query: Optional[str] = None) -> Tuple[str, str]:
+    @staticmethod
+    def _group_rank(group: List[ErrorCluster]):
+        """Like ErrorClusters.ranked(), over all files: most severe, rarest, then earliest."""
+        severity = max(severity_rank(cluster.severity) for cluster in group)
+        timestamps = [parse_timestamp(cluster.sample) for cluster in group]
+        earliest = min((timestamp for timestamp in timestamps if timestamp is not None), default=datetime.max)
+        return -severity, sum(cluster.count for cluster in group), earliest
+
+    @staticmethod
+    def _merged_digest(ranked: List[List[ErrorCluster]], files_with_errors: int, file_count: int, limit: int = 10) -> str:
+        total = sum(cluster.count for group in ranked for cluster in group)
+        lines = [
+            f"{len(ranked)} distinct error(s) in {total} matching line(s) across {files_with_errors} of "
+            f"{file_count} file(s), most severe and rarest first:"
+        ]
+        timeline = []
+        for i, group in enumerate(ranked[:limit], 1):
+            places = []
+            for cluster in group:
+                name = os.path.basename(cluster.source)
+                places.append(f"{name} line {cluster.first_line}" if cluster.count == 1
+                              else f"{name} lines {cluster.first_line}-{cluster.last_line}")
+                timestamp = parse_timestamp(cluster.sample)
+                if timestamp is not None:
+                    timeline.append((timestamp, name, cluster.sample))
+            if len(places) > 3:
+                places[3:] = [f"+{len(places) - 3} more file(s)"]
+            count = sum(cluster.count for cluster in group)
+            severity = max((cluster.severity for cluster in group), key=severity_rank)
+            lines.append(f"{i}. [{severity}] x{count}, {', '.join(places)}: {group[0].sample}")
+        if len(ranked) > limit:
+            lines.append(f"... and {len(ranked) - limit} more distinct error(s)")
+
+        if timeline:
+            lines.append("First occurrences by time:")
+            timeline.sort(key=lambda item: item[0])
+            for _, name, sample in timeline[:limit]:
+                lines.append(f"- {name}: {sample}")
+        return "\n".join(lines)
+
+    def analyze_text(self, content: str, source_name: str = "Output", query: Optional[str] = None, digest: bool = True) -> AnalysisReport:
         """
         Analyzes a raw string (e.g. command output).
         """
-        lines = content.splitlines(keepends=True)
-        return self._analyze_lines(lines, source_name, query)
+        clusters = ErrorClusters() if digest else None
+        f = io.BytesIO(content.encode('utf-8', errors='replace'))
+        excerpt = self._scan(f, query, reverse=True, clusters=clusters)
+        return self._report(excerpt, clusters, source_name, query)
 
-    def _analyze_lines(self, lines: List[str], source_name: str, query: Optional[str]) -> Tuple[str, str]:
+    def analyze_string(self, content: str, source_name: str = "Output", query: Optional[str] = None) -> Tuple[str, str]:
         """
-        Internal method to analyze a list of lines.
+        Analyzes a raw string and returns a tuple (analysis_summary, handoff_prompt).
         """
-        relevant_chunk = self._extract_relevant_chunk(lines, query)
-        
-        if not relevant_chunk:
-            return "No obvious errors or matching lines found.", ""
+        report = self.analyze_text(content, source_name, query)
+        return report.summary, report.prompt
+
+    def collect_errors(self, block: bytes, clusters: ErrorClusters, offset: int = 0, line_number: int = 1) -> Optional[Tuple[int, int]]:
+        """
+        Adds the error lines of block (whole lines, starting at file offset
+        offset and line line_number) to clusters. Returns the bounds of the
+        last one within block, if any.
+        """
+        return self._collect(block, block.lower(), clusters, offset, line_number)
 
+    def _scan(self, f: BinaryIO, query: Optional[str], reverse: bool, clusters: Optional[ErrorClusters] = None) -> _Excerpt:
+        """Returns the most relevant chunk of f (empty if nothing matched) and its severity."""
+        if not query and reverse and clusters is None:
+            return self._extract_last_error(f)
+        result = self._forward_scan(self._iter_blocks(f), query, clusters)
+        return _Excerpt(self._join(result.window), result.severity, result.focus)
+
+    def _report(
+        self,
+        excerpt: _Excerpt,
+        clusters: Optional[ErrorClusters],
+        source_name: str,
+        query: Optional[str],
+        note: str = "",
+    ) -> AnalysisReport:
+        """
+        Builds the report for an excerpt. note (e.g. which files were scanned) heads the digest.
+        """
+        if not excerpt.chunk:
+            return AnalysisReport("No obvious errors or matching lines found.")
+
+        digest = clusters.digest() if clusters is not None else ""
+        if note and digest:
+            digest = f"{note}\n{digest}"
+        if self.prompt_budget is not None:
+            budget = self.prompt_budget - estimate_tokens(digest) - self.PROMPT_OVERHEAD_TOKENS
+            excerpt = self._fit_budget(excerpt, budget)
+        relevant_chunk, severity, focus = excerpt
         # Construct the handoff prompt
-        handoff_prompt = self._generate_handoff_prompt(source_name, relevant_chunk, query)
-        
-        return "Analysis complete. Found potential issues.", handoff_prompt
+        handoff_prompt = self._generate_handoff_prompt(source_name, relevant_chunk, query, digest)
+
+        summary = "Analysis complete. Found potential issues"
+        if severity:
+            summary += f" (severity: {severity})"
+        summary += "."
+        if clusters is not None and clusters.clusters:
+            summary += f" {len(clusters.clusters)} distinct error(s) in {clusters.total} line(s)."
+        return AnalysisReport(
+            summary,
+            chunk=relevant_chunk,
+            severity=severity,
+            focus=focus,
+            clusters=clusters.ranked() if clusters is not None else [],
+            digest=digest,
+            prompt=handoff_prompt,
+        )
 
-    def _extract_relevant_chunk(self, lines: List[str], query: Optional[str]) -> str:
+    def _iter_blocks(self, f: BinaryIO, limit: Optional[int] = None) -> Iterator[bytes]:
+        """Reads f (up to limit bytes) in blocks that end on a line boundary (over-long lines are cut)."""
+        tail = b""
+        while True:
+            size = self.BLOCK_SIZE if limit is None else min(self.BLOCK_SIZE, limit)
+            data = f.read(size) if size else b""
+            if limit is not None:
+                limit -= len(data)
+            if not data:
+                if tail:
+                    yield tail
+                return
+            data = tail + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                if len(data) <= self.MAX_LINE_BYTES:
+                    tail = data
+                    continue
+                cut = len(data)
+            yield data[:cut]
+            tail = data[cut:]
+
+    def _extract_relevant_chunk(self, blocks: Iterable[bytes], query: Optional[str]) -> Tuple[str, Optional[str]]:
+        """Forward scan for the most relevant chunk and its severity."""
+        result = self._forward_scan(blocks, query)
+        return self._join(result.window), result.severity
+
+    def _forward_scan(
+        self,
+        blocks: Iterable[bytes],
+        query: Optional[str],
+        clusters: Optional[ErrorClusters] = None,
+        offset: int = 0,
+    ) -> _ScanResult:
         """
-        Finds the most relevant section of the log.
-        Prioritizes the query if present, otherwise looks for error keywords.
+        Finds the most relevant section of the log in one forward pass.
+        The first line matching the query wins; without a query (or if it never
+        matches) the last line containing an error keyword is used.
+        The section is context_lines before the line through context_lines - 1 after it.
+        With clusters, every error line is added to them, so the scan runs to
+        the end even after a query match. offset is where the blocks start in the file.
         """
-        target_line_index = -1
-        
-        # 1. Search for query if provided
+        blocks = iter(blocks)
+        needle = None
         if query:
-            for i, line in enumerate(lines):
-                if query.lower() in line.lower():
-                    target_line_index = i
-                    break
-        
-        # 2. If no query or not found, search for error keywords (reverse order to find most recent)
-        if target_line_index == -1:
-            for i in range(len(lines) - 1, -1, -1):
-                line = lines[i].lower()
-                if any(keyword.lower() in line for keyword in self.ERROR_KEYWORDS):
-                    target_line_index = i
+            needle = query.lower()
+            if needle.isascii():
+                needle = needle.encode()
+            else:
+                # bytes.lower() only folds ASCII, so search decoded text instead
+                blocks = (block.decode('utf-8', errors='replace') for block in blocks)
+
+        result = _ScanResult()
+        # Last lines of the blocks already scanned
+        before: Deque = deque(maxlen=self.context_lines)
+        # Context windows of the query match and of the latest keyword match,
+        # and how many following lines they still need
+        query_window: Optional[List] = None
+        query_remaining = 0
+        keyword_window: List = []
+        keyword_remaining = 0
+        keyword_line = None
+        query_focus = keyword_focus = 0
+        line_number = 1
+
+        for block in blocks:
+            lowered = block.lower()
+            if query_remaining:
+                following = self._lines_from(block, 0, query_remaining)
+                query_window.extend(following)
+                query_remaining -= len(following)
+            if keyword_remaining:
+                following = self._lines_from(block, 0, keyword_remaining)
+                keyword_window.extend(following)
+                keyword_remaining -= len(following)
+
+            if needle is not None and query_window is None:
+                hit = lowered.find(needle)
+                if hit != -1:
+                    start, end = self._line_bounds(block, hit)
+                    following = self._lines_from(block, end, self.context_lines - 1)
+                    context = self._context_before(before, block, start)
+                    query_focus = len(context)
+                    query_window = context + [block[start:end]] + following
+                    query_remaining = self.context_lines - 1 - len(following)
+                    result.query_line = self._file_offsets(block, offset, start, end)
+                    if clusters is None:
+                        result.window = query_window + self._take_lines(blocks, query_remaining)
+                        result.focus = query_focus
+                        return result
+
+            if clusters is not None:
+                found = self._collect(block, lowered, clusters, offset, line_number)
+            elif query_window is None:
+                hit = self.matcher.rfind(lowered)
+                found = self._line_bounds(block, hit) if hit != -1 else None
+            else:
+                found = None
+
+            # Once the query has matched, keyword matches no longer matter
+            if found is not None and query_window is None:
+                start, end = found
+                keyword_line = block[start:end]
+                following = self._lines_from(block, end, self.context_lines - 1)
+                context = self._context_before(before, block, start)
+                keyword_focus = len(context)
+                keyword_window = context + [keyword_line] + following
+                keyword_remaining = self.context_lines - 1 - len(following)
+                result.keyword_line = self._file_offsets(block, offset, start, end)
+
+            before.extend(self._lines_before(block, len(block), self.context_lines))
+            line_number += block.count(b"\n" if isinstance(block, bytes) else "\n")
+            offset += len(block) if isinstance(block, bytes) else len(block.encode('utf-8', errors='replace'))
+
+        result.newlines = line_number - 1
+        if query_window is not None:
+            result.window = query_window
+            result.focus = query_focus
+        else:
+            result.window = keyword_window
+            result.focus = keyword_focus
+            result.severity = self.matcher.severity(keyword_line) if keyword_line is not None else None
+        return result
+
+    def _collect(self, block, lowered, clusters: ErrorClusters, offset: int, line_number: int) -> Optional[Tuple[int, int]]:
+        """
+        Adds every error line in block to clusters; only these lines are decoded.
+        Returns the bounds of the last one, if any.
+        """
+        is_bytes = isinstance(block, bytes)
+        newline = b"\n" if is_bytes else "\n"
+        last = None
+        line_end = 0
+        # Position up to which line numbers (and, for text, byte offsets) have been counted
+        counted = 0
+        for hit in self.matcher.finditer(lowered):
+            if hit < line_end:
+                # Another keyword on a line already collected
+                continue
+            start, line_end = self._line_bounds(block, hit)
+            line_number += block.count(newline, counted, start)
+            if is_bytes:
+                line = block[start:line_end].decode('utf-8', errors='replace')
+                line_offset = offset + start
+            else:
+                line = block[start:line_end]
+                offset += len(block[counted:start].encode('utf-8', errors='replace'))
+                line_offset = offset
+            counted = start
+            clusters.add(line, self.matcher.severity(line), line_number, line_offset)
+            last = (start, line_end)
+        return last
+
+    @staticmethod
+    def _file_offsets(block, offset: int, start: int, end: int) -> Tuple[int, int]:
+        """File offsets of block[start:end], for a block starting at offset."""
+        if isinstance(block, bytes):
+            return offset + start, offset + end
+        start_offset = offset + len(block[:start].encode('utf-8', errors='replace'))
+        return start_offset, start_offset + len(block[start:end].encode('utf-8', errors='replace'))
+
+    def _use_parallel(self, file_path: str, query: Optional[str]) -> bool:
+        # Non-ASCII queries are matched on decoded text, which only the serial scan does
+        if query and not query.isascii():
+            return False
+        return self._parallel_size(os.path.getsize(file_path))
+
+    def _parallel_size(self, size: int) -> bool:
+        """True if scanning size bytes is worth a process pool."""
+        if self.parallel_threshold is None or self.workers < 2:
+            return False
+        return size >= self.parallel_threshold
+
+    def _scan_parallel(
+        self,
+        file_path: str,
+        f: BinaryIO,
+        query: Optional[str],
+        clusters: Optional[ErrorClusters] = None,
+    ) -> _Excerpt:
+        """
+        Same result as _scan, with the file split into newline-aligned byte
+        ranges that are forward-scanned over mmap by a process pool.
+        """
+        if not query and clusters is None:
+            # A recent error is usually near the end; only scan everything if it isn't
+            found = self._find_last_error(f, max_bytes=self.parallel_threshold)
+            if found is not None:
+                return self._chunk_at(f, *found)
+
+        results = self._scan_ranges(file_path, f, query, clusters is not None)
+        query_lines = []
+        keyword_lines = []
+        line_shift = 0
+        for query_line, keyword_line, newlines, range_clusters in results:
+            if query_line is not None:
+                query_lines.append(query_line)
+            if keyword_line is not None:
+                keyword_lines.append(keyword_line)
+            if clusters is not None:
+                clusters.merge(range_clusters, line_shift)
+            line_shift += newlines
+
+        if query_lines:
+            return self._chunk_at(f, *min(query_lines))._replace(severity=None)
+        if keyword_lines:
+            return self._chunk_at(f, *max(keyword_lines))
+        return _Excerpt("", None)
+
+    def _scan_ranges(
+        self,
+        file_path: str,
+        f: BinaryIO,
+        query: Optional[str],
+        collect: bool,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> List[tuple]:
+        """
+        Forward-scans [start, end) of f in a process pool. Returns the
+        _scan_range results of its newline-aligned ranges, in file order.
+        """
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ranges = self._split_ranges(mm, self.workers, start, end)
+        count = len(ranges)
+        # Spawned workers: forking here would copy the app's threads and locks
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=count, mp_context=context) as pool:
+            return list(pool.map(
+                _scan_range,
+                [file_path] * count,
+                [range_start for range_start, _ in ranges],
+                [range_end for _, range_end in ranges],
+                [self.matcher.keywords] * count,
+                [query] * count,
+                [self.BLOCK_SIZE] * count,
+                [collect] * count,
+                [self.context_lines] * count,
+            ))
+
+    @staticmethod
+    def _split_ranges(mm: mmap.mmap, count: int, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Splits [start, end) of mm into at most count byte ranges, each made of whole lines."""
+        end = len(mm) if end is None else end
+        bounds = [start]
+        for i in range(1, count):
+            cut = mm.find(b"\n", max(bounds[-1], start + (end - start) * i // count), end)
+            if cut == -1:
+                break
+            if cut + 1 < end:
+                bounds.append(cut + 1)
+        bounds.append(end)
+        return [(range_start, range_end) for range_start, range_end in zip(bounds, bounds[1:]) if range_start < range_end]
+
+    def _scan_indexed(self, file_path: str, f: BinaryIO, clusters: ErrorClusters) -> _Excerpt:
+        """
+        Same result as a full digest scan without a query, but resumed from the
+        file's index entry. The index is then advanced to the last complete
+        line; an unterminated last line may still be growing, so it is
+        scanned on every run but never indexed.
+        """
+        settings = self._index_settings()
+        entry = self.index.load(file_path, f, settings)
+        if entry is None:
+            entry = LogIndexEntry(0, 0, 0, 0, settings)
+        elif entry.clusters is not None:
+            clusters.merge(ErrorClusters.from_dict(entry.clusters))
+
+        size = os.fstat(f.fileno()).st_size
+        complete = self.complete_end(f, entry.offset, size)
+        last_error = entry.last_error
+        if complete > entry.offset or entry.clusters is None:
+            keyword_line, newlines = self._collect_range(file_path, f, entry.offset, complete, clusters, entry.lines)
+            last_error = keyword_line or last_error
+            entry.offset, entry.lines = complete, entry.lines + newlines
+            entry.last_error = list(last_error) if last_error else None
+            entry.clusters = clusters.to_dict()
+            self.index.save(file_path, f, entry)
+
+        if size > complete:
+            keyword_line, _ = self._collect_range(file_path, f, complete, size, clusters, entry.lines)
+            last_error = keyword_line or last_error
+
+        if last_error is None:
+            return _Excerpt("", None)
+        return self._chunk_at(f, *last_error)
+
+    def _collect_range(
+        self,
+        file_path: str,
+        f: BinaryIO,
+        start: int,
+        end: int,
+        clusters: ErrorClusters,
+        line_shift: int,
+    ) -> Tuple[Optional[Tuple[int, int]], int]:
+        """
+        Adds the error lines in [start, end) of f to clusters, numbering lines
+        from line_shift + 1. Returns the last error line and the number of newlines.
+        """
+        if self._parallel_size(end - start):
+            results = self._scan_ranges(file_path, f, None, True, start, end)
+        else:
+            f.seek(start)
+            range_clusters = ErrorClusters(clusters.max_clusters)
+            result = self._forward_scan(self._iter_blocks(f, end - start), None, range_clusters, offset=start)
+            results = [(None, result.keyword_line, result.newlines, range_clusters)]
+
+        last_error = None
+        newlines = 0
+        for _, keyword_line, range_newlines, range_clusters in results:
+            last_error = keyword_line or last_error
+            clusters.merge(range_clusters, line_shift + newlines)
+            newlines += range_newlines
+        return last_error, newlines
+
+    def complete_end(self, f: BinaryIO, start: int, size: int) -> int:
+        """Offset just past the last newline in [start, size) of f, or start if there is none."""
+        end = size
+        while end > start:
+            block_start = max(start, end - self.BLOCK_SIZE)
+            f.seek(block_start)
+            cut = f.read(end - block_start).rfind(b"\n")
+            if cut != -1:
+                return block_start + cut + 1
+            end = block_start
+        return start
+
+    def _index_settings(self) -> str:
+        """Identifies what index entries depend on, so they are rebuilt when it changes."""
+        settings = [sorted(self.matcher.keywords.items()), self.MAX_LINE_BYTES, [p.pattern for p, _ in _SIGNATURE_PATTERNS]]
+        return hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
+
+    def _extract_last_error(self, f: BinaryIO) -> _Excerpt:
+        """
+        Same result as _extract_relevant_chunk without a query, but found by
+        reading blocks backwards from the end of the (seekable) file.
+        """
+        found = self._find_last_error(f)
+        if found is None:
+            return _Excerpt("", None)
+        return self._chunk_at(f, *found)
+
+    def _chunk_at(self, f: BinaryIO, start: int, end: int) -> _Excerpt:
+        """The context window around the line at [start, end) of f, and its severity."""
+        before = [line for _, (_, line) in zip(range(self.context_lines), self._reverse_lines(f, start))]
+        before.reverse()
+        f.seek(start)
+        line = f.read(end - start)
+        following = self._take_lines(self._iter_blocks(f), self.context_lines - 1)
+        return _Excerpt(self._join(before + [line] + following), self.matcher.severity(line), len(before))
+
+    def _find_last_error(self, f: BinaryIO, max_bytes: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (start, end) offsets of the last line containing a keyword.
+        With max_bytes, gives up (returning None) after searching that much from the end.
+        """
+        file_size = pos = f.seek(0, os.SEEK_END)
+        # Start of the line that continues into the block read previously
+        tail = b""
+        while pos > 0:
+            if max_bytes is not None and file_size - pos >= max_bytes:
+                return None
+            size = min(self.BLOCK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            block = f.read(size) + tail
+
+            # The first line may continue in the block before; only complete lines are searched
+            newline = block.find(b"\n") if pos > 0 else -1
+            if newline == -1 and pos > 0 and len(block) <= self.MAX_LINE_BYTES:
+                tail = block
+                continue
+            hit = self.matcher.rfind(block.lower(), newline + 1)
+            if hit != -1:
+                start, end = self._line_bounds(block, hit)
+                return pos + start, pos + end
+            # An over-long partial line has been searched as it is, like the forward scan cuts it
+            tail = block[:newline + 1]
+        return None
+
+    def _reverse_lines(self, f: BinaryIO, end: int) -> Iterator[Tuple[int, bytes]]:
+        """Yields (offset, line) pairs for the lines of f before offset end, last first."""
+        pos = end
+        # Start of the line that continues into the block read previously
+        tail = b""
+        while pos > 0:
+            size = min(self.BLOCK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            block = f.read(size) + tail
+            end = len(block)
+            while True:
+                # Newline ending the line before block[:end]; a line's own newline is at end - 1
+                newline = block.rfind(b"\n", 0, end - 1)
+                if newline == -1:
                     break
-        
-        if target_line_index == -1:
-            return ""
+                yield pos + newline + 1, block[newline + 1:end]
+                end = newline + 1
+            tail = block[:end]
+            if len(tail) > self.MAX_LINE_BYTES:
+                # Bound memory on very long lines, like the forward scan does
+                yield pos, tail
+                tail = b""
+        if tail:
+            yield 0, tail
 
-        # Extract context
-        start = max(0, target_line_index - self.CONTEXT_LINES)
-        end = min(len(lines), target_line_index + self.CONTEXT_LINES)
-        
-        return "".join(lines[start:end])
+    # Line helpers; blocks are bytes, or str when searching for a non-ASCII query
+
+    @staticmethod
+    def _line_bounds(block, pos: int) -> Tuple[int, int]:
+        """Start and end (after the newline) of the line containing pos."""
+        newline = b"\n" if isinstance(block, bytes) else "\n"
+        start = block.rfind(newline, 0, pos) + 1
+        end = block.find(newline, pos)
+        return start, len(block) if end == -1 else end + 1
+
+    @staticmethod
+    def _lines_from(block, pos: int, count: int) -> List:
+        """Up to count lines starting at pos."""
+        newline = b"\n" if isinstance(block, bytes) else "\n"
+        lines = []
+        while len(lines) < count and pos < len(block):
+            end = block.find(newline, pos)
+            end = len(block) if end == -1 else end + 1
+            lines.append(block[pos:end])
+            pos = end
+        return lines
+
+    @staticmethod
+    def _lines_before(block, pos: int, count: int) -> List:
+        """Up to count lines ending at the line start pos, in order."""
+        newline = b"\n" if isinstance(block, bytes) else "\n"
+        lines = []
+        end = pos
+        while len(lines) < count and end > 0:
+            start = block.rfind(newline, 0, end - 1) + 1
+            lines.append(block[start:end])
+            end = start
+        lines.reverse()
+        return lines
+
+    def tail_lines(self, block: bytes, count: int) -> List[bytes]:
+        """The last count lines of block, in order."""
+        return self._lines_before(block, len(block), count)
+
+    @classmethod
+    def lines_text(cls, lines: List) -> str:
+        """Lines (bytes or str) joined into text, decoded as UTF-8 with CRLF turned into LF."""
+        return cls._join(lines)
+
+    def _context_before(self, before: Deque, block, start: int) -> List:
+        """The context_lines lines before the line starting at start."""
+        lines = list(before) + self._lines_before(block, start, self.context_lines)
+        return lines[-self.context_lines:]
+
+    def _take_lines(self, blocks: Iterator, count: int) -> List:
+        """Up to count lines from the start of the remaining blocks."""
+        lines = []
+        while len(lines) < count:
+            block = next(blocks, None)
+            if block is None:
+                break
+            lines.extend(self._lines_from(block, 0, count - len(lines)))
+        return lines
+
+    @staticmethod
+    def _join(lines: List) -> str:
+        if lines and isinstance(lines[0], bytes):
+            text = b"".join(lines).decode('utf-8', errors='replace')
+        else:
+            text = "".join(lines)
+        return text.replace("\r\n", "\n")
+
+    def _fit_budget(self, excerpt: _Excerpt, budget: int) -> _Excerpt:
+        """
+        The excerpt cut to the part of its chunk that fits in budget tokens: the focus
+        line, then lines around it (two before for each one after, since the
+        cause of an error usually precedes it) until the next line on either
+        side no longer fits. A line is cut in the middle to a quarter of the budget.
+        """
+        budget = max(budget, self.MIN_EXCERPT_TOKENS)
+        max_chars = budget * CHARS_PER_TOKEN // 4
+        lines = excerpt.chunk.split("\n")
+        ending = ""
+        if len(lines) > 1 and lines[-1] == "":
+            lines.pop()
+            ending = "\n"
+        focus = min(excerpt.focus, len(lines) - 1)
+
+        kept = {focus: truncate_middle(lines[focus], max_chars)}
+        # One token per line for the newline
+        used = estimate_tokens(kept[focus]) + 1
+        first = last = focus
+        open_before, open_after = first > 0, last < len(lines) - 1
+        step = 0
+        while open_before or open_after:
+            take_before = open_before and (step % 3 != 2 or not open_after)
+            step += 1
+            index = first - 1 if take_before else last + 1
+            line = truncate_middle(lines[index], max_chars)
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                if take_before:
+                    open_before = False
+                else:
+                    open_after = False
+                continue
+            used += cost
+            kept[index] = line
+            if take_before:
+                first = index
+                open_before = first > 0
+            else:
+                last = index
+                open_after = last < len(lines) - 1
+        chunk = "\n".join(kept[index] for index in range(first, last + 1)) + ending
+        return _Excerpt(chunk, excerpt.severity, focus - first)
 
-    def _generate_handoff_prompt(self, file_path: str, chunk: str, query: Optional[str]) -> str:
+    def _generate_handoff_prompt(
+        self, file_path: str, chunk: str, query: Optional[str], digest: str = "", multiple: bool = False
+    ) -> str:
         """
-        Creates the formatted prompt for the agent.
+        Creates the formatted prompt for the agent. With multiple, file_path
+        describes a set of files (e.g. a glob pattern) and is kept whole.
         """
-        filename = os.path.basename(file_path)
+        filename = file_path if multiple else os.path.basename(file_path)
+        subject = "log files" if multiple else "a log file"
+        digest_section = f"[Error Digest]\n{digest}\n\n" if digest else ""
         
-        prompt = f"""I am analyzing a log file `{filename}` and found an issue.
+        prompt = f"""I am analyzing {subject} `{filename}` and found an issue.
 
 [Context]
-File: {filename}
+{"Files" if multiple else "File"}: {filename}
 Query: {query if query else "Auto-detected error"}
 
-[Log Excerpt]
+{digest_section}[Log Excerpt]
 ```text
 {chunk}
 ```
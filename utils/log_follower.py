@@ -0,0 +1,320 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import BinaryIO, Callable, Deque, List, Optional
+
+from utils.log_analyzer import ErrorCluster, ErrorClusters, LogAnalyzer
+from utils.logger import get_logger
+
+logger = get_logger("log_follower")
+
+
+class PollingWatcher:
+    """Fallback change notification: wakes up every interval and lets the follower check the file."""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks up to timeout seconds. Returns True if the file may have changed."""
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Change notification through Linux inotify (called via ctypes).
+
+    The directory is watched rather than the file, so events keep coming
+    after the file is rotated (renamed away and recreated) or deleted.
+    Events for other files in the directory are ignored.
+    """
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    # struct inotify_event: int wd; uint32 mask, cookie, len; char name[len]
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks up to timeout seconds. Returns True if the file changed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        changed = False
+        # Drain everything queued, so a burst of writes wakes the follower once
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos < len(data):
+                _, _, _, length = self._EVENT.unpack_from(data, pos)
+                pos += self._EVENT.size
+                name = data[pos:pos + length].rstrip(b"\0")
+                pos += length
+                changed = changed or name == self.name
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_watcher(path: str, poll_interval: float = 1.0):
+    """An InotifyWatcher where available, else a PollingWatcher."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable, polling {path} instead: {e}")
+    return PollingWatcher(poll_interval)
+
+
+class LogFollower:
+    """
+    Follows a log file like `tail -F`, reporting error lines as they are appended.
+
+    Only new bytes are read and run through the analyzer's keyword matcher.
+    Each batch of reads reports the error signatures seen for the first time
+    (incidents) and how many known ones repeated. A rotated file is read to
+    its end before switching to the new file; a truncated one is reread
+    from the start.
+
+    The AI summary is debounced: it is requested once no new incident has
+    appeared for `debounce` seconds (or `max_delay` after the first one), so
+    a burst of errors results in one request.
+
+    Callbacks are called from the thread running run().
+
+    Up to MAX_SIGNATURES signatures are remembered, least recently seen
+    evicted first, so memory stays bounded on logs with endless distinct
+    errors while anything still recurring is never reported as new.
+    """
+
+    MAX_SIGNATURES = 10000
+
+    def __init__(
+        self,
+        path: str,
+        analyzer: LogAnalyzer,
+        on_incidents: Callable[[List[ErrorCluster], int], None],
+        on_summary: Optional[Callable[[str, str], None]] = None,
+        on_notice: Optional[Callable[[str], None]] = None,
+        debounce: float = 2.0,
+        max_delay: float = 10.0,
+        poll_interval: float = 1.0,
+        from_start: bool = False,
+    ):
+        """
+        on_incidents(new_clusters, repeats) is called for each batch with errors.
+        on_summary(digest, excerpt) gets the incidents since the last summary.
+        on_notice(message) reports rotation and truncation.
+        from_start reads the existing content first instead of only new lines.
+        """
+        self.path = path
+        self.analyzer = analyzer
+        self.on_incidents = on_incidents
+        self.on_summary = on_summary
+        self.on_notice = on_notice
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+        # Signatures seen while following, least recently seen first
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._stop = threading.Event()
+        self._file: Optional[BinaryIO] = None
+        self._identity = None
+        self._position = 0
+        self._line_number = 1
+        self._partial = b""
+        # True if the file didn't exist when following started
+        self._missing = False
+        # Last lines read, for the excerpt sent with the summary
+        self._recent: Deque[bytes] = deque(maxlen=analyzer.CONTEXT_LINES)
+        # Incidents waiting for the debounced summary
+        self._pending: Optional[ErrorClusters] = None
+        self._pending_excerpt = ""
+        self._first_pending = 0.0
+        self._last_pending = 0.0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def run(self) -> None:
+        """Follows the file until stop() is called."""
+        watcher = make_watcher(self.path, self.poll_interval)
+        try:
+            self.poll()
+            while not self._stop.is_set():
+                # Inotify can miss changes (e.g. on network filesystems), so the file is also checked periodically
+                timeout = self.poll_interval
+                if self._pending is not None:
+                    timeout = max(0.0, min(timeout, self._summary_due() - time.monotonic()))
+                watcher.wait(timeout)
+                if self._stop.is_set():
+                    break
+                self.poll()
+                if self._pending is not None and time.monotonic() >= self._summary_due():
+                    self.flush_summary()
+        finally:
+            watcher.close()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def poll(self) -> bool:
+        """Reads whatever was appended since the last call. Returns True if anything was read."""
+        if self._file is None:
+            # A file created after following started is read from its beginning
+            if not self._open(self.from_start or self._missing):
+                self._missing = True
+                return False
+
+        # Whatever was written to the old file before it was rotated still counts
+        read = self._read_new()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return read
+
+        if (stat.st_dev, stat.st_ino) != self._identity:
+            self._notice(f"{self.path} was rotated; following the new file")
+            self._file.close()
+            self._file = None
+            self._open(from_start=True)
+            read = self._read_new() or read
+        elif stat.st_size < self._position:
+            self._notice(f"{self.path} was truncated; reading from the start")
+            self._file.seek(0)
+            self._position = 0
+            self._line_number = 1
+            self._partial = b""
+            read = self._read_new() or read
+        return read
+
+    def flush_summary(self) -> None:
+        """Sends the pending incidents to on_summary now."""
+        pending, self._pending = self._pending, None
+        if pending is not None and self.on_summary is not None:
+            self.on_summary(pending.digest(), self._pending_excerpt)
+
+    def _summary_due(self) -> float:
+        return min(self._last_pending + self.debounce, self._first_pending + self.max_delay)
+
+    def _open(self, from_start: bool) -> bool:
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(self._file.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+        self._position = 0
+        self._line_number = 1
+        self._partial = b""
+        if not from_start:
+            # Start after the last complete line; line numbers of new lines count the existing ones
+            end = self.analyzer.complete_end(self._file, 0, stat.st_size)
+            self._file.seek(0)
+            while self._position < end:
+                data = self._file.read(min(self.analyzer.BLOCK_SIZE, end - self._position))
+                if not data:
+                    break
+                self._line_number += data.count(b"\n")
+                self._position += len(data)
+        return True
+
+    def _read_new(self) -> bool:
+        new_clusters = []
+        repeats = 0
+        read = False
+        while True:
+            data = self._file.read(self.analyzer.BLOCK_SIZE)
+            if not data:
+                break
+            read = True
+            data = self._partial + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0 and len(data) <= self.analyzer.MAX_LINE_BYTES:
+                # Wait for the rest of the line
+                self._partial = data
+                continue
+            cut = cut or len(data)
+            block, self._partial = data[:cut], data[cut:]
+            found, repeated = self._process(block)
+            new_clusters.extend(found)
+            repeats += repeated
+
+        if new_clusters or repeats:
+            self.on_incidents(new_clusters, repeats)
+        return read
+
+    def _process(self, block: bytes):
+        """Matches a block of whole lines. Returns (new clusters, number of repeated errors)."""
+        batch = ErrorClusters()
+        self.analyzer.collect_errors(block, batch, self._position, self._line_number)
+        self._recent.extend(self.analyzer.tail_lines(block, self.analyzer.CONTEXT_LINES))
+        self._position += len(block)
+        self._line_number += block.count(b"\n")
+        if not batch.total:
+            return [], 0
+
+        new_clusters = []
+        for signature, cluster in batch.clusters.items():
+            if signature in self._seen:
+                self._seen.move_to_end(signature)
+            else:
+                self._seen[signature] = None
+                new_clusters.append(cluster)
+        while len(self._seen) > self.MAX_SIGNATURES:
+            self._seen.popitem(last=False)
+        repeats = batch.total - len(new_clusters)
+        if new_clusters:
+            self._queue_summary(new_clusters)
+        return new_clusters, repeats
+
+    def _queue_summary(self, new_clusters: List[ErrorCluster]) -> None:
+        now = time.monotonic()
+        if self._pending is None:
+            self._pending = ErrorClusters()
+            self._first_pending = now
+        self._last_pending = now
+        for cluster in new_clusters:
+            self._pending.clusters.setdefault(cluster.signature, cluster)
+            self._pending.total += 1
+        self._pending_excerpt = self.analyzer.lines_text(list(self._recent))
+
+    def _notice(self, message: str) -> None:
+        logger.info(message)
+        if self.on_notice is not None:
+            self.on_notice(message)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Dict, List, Optional, Sequence
+
+from utils.logger import get_logger
+
+logger = get_logger("log_index")
+
+
+@dataclass
+class LogIndexEntry:
+    """What is known about one log file up to `offset`."""
+    device: int
+    inode: int
+    # Size and mtime when the entry was saved
+    size: int
+    mtime_ns: int
+    # Identifies the keywords and scan settings the entry was built with
+    settings: str
+    # End of the last complete line scanned, and the number of lines before it
+    offset: int = 0
+    lines: int = 0
+    # Fingerprints of the first bytes of the file and of the bytes just before offset
+    head: str = ""
+    tail: str = ""
+    # [start, end) of the last error line
+    last_error: Optional[List[int]] = None
+    # ErrorClusters.to_dict(): signatures, counts and offsets of every error line
+    clusters: Optional[Dict] = None
+
+
+class LogIndex:
+    """
+    Persistent scan state for analyzed log files, so re-analyzing a growing
+    log only reads the bytes appended since the last run.
+
+    Each log gets one JSON file in index_dir, named after a hash of its
+    absolute path. An entry is keyed by (device, inode, size, mtime): same
+    size and mtime means nothing changed. If the file grew, the entry is only
+    reused if the bytes it covers are unchanged (fingerprints of the head and
+    of the last scanned block). A new inode (rotation), a smaller size
+    (truncation) or a fingerprint mismatch means the file is rescanned.
+
+    Files under exclude_dirs (temporary files such as spilled command
+    output) are never indexed.
+    """
+
+    VERSION = 1
+    FINGERPRINT_BYTES = 4096
+    # Entries kept; the least recently saved are removed beyond this
+    MAX_ENTRIES = 200
+
+    def __init__(self, index_dir: str, exclude_dirs: Sequence[str] = ()):
+        self.index_dir = index_dir
+        self.exclude_dirs = [os.path.join(os.path.abspath(path), "") for path in exclude_dirs]
+
+    def load(self, file_path: str, f: BinaryIO, settings: str) -> Optional[LogIndexEntry]:
+        """Returns the entry for the open file f if it still applies, else None."""
+        if self.excluded(file_path):
+            return None
+        try:
+            with open(self._entry_path(file_path), 'r') as entry_file:
+                data = json.load(entry_file)
+            if data.pop("version", None) != self.VERSION:
+                return None
+            entry = LogIndexEntry(**data)
+        except (OSError, ValueError, TypeError):
+            return None
+
+        stat = os.fstat(f.fileno())
+        if (entry.device, entry.inode) != (stat.st_dev, stat.st_ino):
+            # Rotated: the path now names another file
+            return None
+        if stat.st_size < entry.size or entry.settings != settings:
+            return None
+        if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+            return entry
+        if (entry.head, entry.tail) != self._fingerprints(f, entry.offset):
+            # Rewritten in place, e.g. truncated and written past the old size again
+            return None
+        return entry
+
+    def save(self, file_path: str, f: BinaryIO, entry: LogIndexEntry) -> None:
+        """Stores entry for f (its stat and fingerprints are filled in here)."""
+        if self.excluded(file_path):
+            return
+        stat = os.fstat(f.fileno())
+        entry.device, entry.inode = stat.st_dev, stat.st_ino
+        entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+        entry.head, entry.tail = self._fingerprints(f, entry.offset)
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            # Written to a temp file and renamed, so a concurrent load never sees half an entry
+            fd, temp_path = tempfile.mkstemp(dir=self.index_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as entry_file:
+                    json.dump({"version": self.VERSION, **asdict(entry)}, entry_file)
+                os.replace(temp_path, self._entry_path(file_path))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Could not save log index for {file_path}: {e}")
+
+    def excluded(self, file_path: str) -> bool:
+        return os.path.abspath(file_path).startswith(tuple(self.exclude_dirs))
+
+    def _entry_path(self, file_path: str) -> str:
+        key = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()[:32]
+        return os.path.join(self.index_dir, key + ".json")
+
+    def _fingerprints(self, f: BinaryIO, offset: int):
+        size = min(self.FINGERPRINT_BYTES, offset)
+        f.seek(0)
+        head = hashlib.sha256(f.read(size)).hexdigest()
+        f.seek(offset - size)
+        tail = hashlib.sha256(f.read(size)).hexdigest()
+        return head, tail
+
+    def _prune(self) -> None:
+        entries = [entry for entry in os.scandir(self.index_dir) if entry.name.endswith(".json")]
+        if len(entries) <= self.MAX_ENTRIES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.MAX_ENTRIES]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass